@@ -2,20 +2,17 @@
 Adaptive Learning Engine - AI Core
 Hybrid: Rule-based AI + LLM untuk personalisasi pembelajaran
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 import random
 import re
 from app.llm_service import llm_service
 
 
-def clean_markdown_formatting(text: str) -> str:
+def _strip_markdown(text: str) -> str:
     """
-    Remove markdown formatting characters from text
-    Removes: ###, ***, ---, **, *, etc.
+    Pass regex clean_markdown_formatting tanpa normalisasi whitespace
+    (dipakai juga oleh MarkdownStreamCleaner)
     """
-    if not text:
-        return text
-    
     # Remove headers (###, ##, #)
     text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
     
@@ -30,6 +27,19 @@ def clean_markdown_formatting(text: str) -> str:
     text = re.sub(r'\*([^\*]+)\*', r'\1', text)
     text = re.sub(r'_([^_]+)_', r'\1', text)
     
+    return text
+
+
+def clean_markdown_formatting(text: str) -> str:
+    """
+    Remove markdown formatting characters from text
+    Removes: ###, ***, ---, **, *, etc.
+    """
+    if not text:
+        return text
+    
+    text = _strip_markdown(text)
+    
     # Remove multiple blank lines (keep max 2)
     text = re.sub(r'\n{3,}', '\n\n', text)
     
@@ -39,6 +49,97 @@ def clean_markdown_formatting(text: str) -> str:
     return text
 
 
+# Pengganti karakter di titik potong stream (private use area: bukan whitespace / karakter markdown)
+_STREAM_SENTINEL = '\ue000'
+_STREAM_MARKDOWN_CHARS = '*_#-'
+
+
+class MarkdownStreamCleaner:
+    """
+    Versi incremental clean_markdown_formatting untuk output LLM yang di-stream
+    
+    Teks masuk per chunk (potongan token bisa memotong ** atau ### di tengah).
+    Teks ditahan sampai ada titik potong yang aman: karakter biasa (bukan whitespace / *_#-)
+    sehingga regex yang sama pada bagian sebelum titik itu memberi hasil yang sama dengan
+    regex pada teks lengkap, dan tidak ada * / _ yang belum berpasangan (pasangannya bisa
+    datang di chunk berikutnya). Whitespace di akhir output ditahan supaya pemangkasan
+    blank line dan strip() juga sama dengan versi batch.
+    
+    Hasil gabungan feed() + flush() == clean_markdown_formatting(teks lengkap), kecuali
+    ada * / _ tanpa pasangan lebih dari max_pending karakter (teks tetap dikirim apa adanya).
+    """
+    
+    def __init__(self, max_pending: int = 2048):
+        self.max_pending = max_pending
+        self._pending = ''
+        self._held = ''  # whitespace di akhir output yang belum dikirim
+        self._started = False
+    
+    def feed(self, chunk: str) -> str:
+        """
+        Tambah satu chunk, return teks bersih yang sudah aman dikirim (bisa kosong)
+        """
+        if not chunk:
+            return ''
+        self._pending += chunk
+        
+        cut, cleaned = self._find_cut()
+        if cut is None:
+            return ''
+        self._pending = self._pending[cut:]
+        return self._emit(cleaned)
+    
+    def flush(self) -> str:
+        """
+        Akhir stream: bersihkan sisa teks yang ditahan
+        """
+        cleaned = _strip_markdown(self._pending)
+        self._pending = ''
+        text = self._emit(cleaned)
+        self._held = ''
+        return text
+    
+    def _clean_prefix(self, cut: int) -> str:
+        # Karakter di titik potong diganti sentinel: regex tidak bisa "melihat" lewat titik potong
+        return _strip_markdown(self._pending[:cut] + _STREAM_SENTINEL)[:-1]
+    
+    def _cut_before(self, end: int) -> Optional[int]:
+        for position in range(end - 1, 0, -1):
+            char = self._pending[position]
+            if not char.isspace() and char not in _STREAM_MARKDOWN_CHARS:
+                return position
+        return None
+    
+    def _find_cut(self):
+        latest = self._cut_before(len(self._pending))
+        if latest is None:
+            return None, None
+        
+        cleaned = self._clean_prefix(latest)
+        if '*' not in cleaned and '_' not in cleaned:
+            return latest, cleaned
+        
+        # Ada * / _ yang belum berpasangan: kirim teks sampai sebelum delimiter pertama
+        delimiters = [index for index in (self._pending.find('*'), self._pending.find('_')) if index >= 0]
+        earlier = self._cut_before(min(delimiters) + 1)
+        if earlier is not None and earlier < latest:
+            return earlier, self._clean_prefix(earlier)
+        
+        if len(self._pending) > self.max_pending:
+            return latest, cleaned
+        return None, None
+    
+    def _emit(self, cleaned: str) -> str:
+        text = self._held + cleaned
+        if not self._started:
+            text = text.lstrip()
+        body = text.rstrip()
+        self._held = text[len(body):]
+        if body:
+            self._started = True
+        return re.sub(r'\n{3,}', '\n\n', body)
+
+
 class AdaptiveLearningEngine:
     """
     AI Engine untuk adaptive learning
@@ -105,6 +206,79 @@ class AdaptiveLearningEngine:
         # Generate explanation based on learning style (LLM-powered if available)
         explanation = self._generate_explanation(topic, learning_style, adjusted_difficulty, emotion)
         
+        return self._build_content(topic, learning_style, emotion, level, previous_scores,
+                                   adjusted_difficulty, explanation)
+    
+    def stream_content(self,
+                       topic: str,
+                       learning_style: str,
+                       emotion: str,
+                       level: str,
+                       previous_scores: List[int] = None,
+                       user_query: str = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Versi streaming generate_content (untuk Server-Sent Events)
+        
+        Yields (event, data):
+            ('meta', {...})     - topik + difficulty, langsung di awal
+            ('delta', str)      - potongan penjelasan yang sudah dibersihkan dari markdown
+            ('done', {...})     - konten lengkap (sama seperti generate_content)
+        
+        Jika LLM gagal sebelum ada teks terkirim, penjelasan rule-based dikirim sebagai gantinya;
+        jika gagal di tengah stream, exception diteruskan (teks yang sudah terkirim tidak bisa ditarik).
+        """
+        adjusted_difficulty = self._adjust_difficulty(level, emotion, previous_scores)
+        yield 'meta', {
+            'topic': topic,
+            'topic_name': self.topics.get(topic, {}).get('name', topic),
+            'difficulty': adjusted_difficulty,
+            'learning_style': learning_style
+        }
+        
+        cleaner = MarkdownStreamCleaner()
+        parts = []
+        source = 'rule_based'
+        try:
+            for chunk in llm_service.stream_explanation(
+                topic=topic,
+                learning_style=learning_style,
+                difficulty=adjusted_difficulty,
+                emotion=emotion,
+                user_query=user_query
+            ):
+                source = 'llm'
+                text = cleaner.feed(chunk)
+                if text:
+                    parts.append(text)
+                    yield 'delta', text
+        except Exception as e:
+            if parts:
+                raise
+            print(f"   ❌ LLM streaming error: {e}")
+            source = 'rule_based'
+        
+        if source == 'llm':
+            text = cleaner.flush()
+            if text:
+                parts.append(text)
+                yield 'delta', text
+        
+        if not parts:
+            # LLM tidak tersedia / gagal / kosong: fallback rule-based dikirim sekaligus
+            source = 'rule_based'
+            parts = [self._generate_explanation(topic, learning_style, adjusted_difficulty, emotion,
+                                                user_query, use_llm=False)]
+            yield 'delta', parts[0]
+        
+        content = self._build_content(topic, learning_style, emotion, level, previous_scores,
+                                      adjusted_difficulty, ''.join(parts))
+        content['explanation_source'] = source
+        yield 'done', content
+    
+    def _build_content(self, topic: str, learning_style: str, emotion: str, level: str,
+                       previous_scores: List[int], adjusted_difficulty: str, explanation: str) -> Dict[str, Any]:
+        """Susun response konten adaptif di sekitar penjelasan"""
+        
         # Generate exercises
         exercises = self._generate_exercises(topic, adjusted_difficulty)
         
@@ -167,11 +341,11 @@ class AdaptiveLearningEngine:
         else:
             return 'mahir'
     
-    def _generate_explanation(self, topic: str, learning_style: str, difficulty: str, emotion: str = 'netral', user_query: str = None) -> str:
+    def _generate_explanation(self, topic: str, learning_style: str, difficulty: str, emotion: str = 'netral', user_query: str = None, use_llm: bool = True) -> str:
         """Generate penjelasan berdasarkan learning style - LLM + RAG first, fallback to rule-based"""
         
         # Try LLM + RAG first
-        if llm_service.is_available():
+        if use_llm and llm_service.is_available():
             llm_explanation = llm_service.generate_explanation(
                 topic=topic,
                 learning_style=learning_style,
@@ -0,0 +1,190 @@
+"""
+Chunking pipeline untuk RAG index
+Memecah buffer teks materi menjadi span (start, end) - generator, tanpa membuat string per chunk
+
+Strategi:
+1. paragraph - paragraf digabung sampai chunk_size (paragraf terlalu panjang dipecah per kalimat)
+2. sentence  - kalimat digabung sampai chunk_size
+3. window    - jendela karakter tetap, dipotong di batas kata
+
+Semua strategi:
+- chunk berikutnya mengulang maksimal chunk_overlap karakter terakhir chunk sebelumnya
+- panjang chunk TIDAK PERNAH melebihi max_length (hard limit)
+"""
+from typing import Iterator, Tuple
+import re
+
+STRATEGIES = ('paragraph', 'sentence', 'window')
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n+')
+_WHITESPACE = re.compile(r'\s')
+_NON_WHITESPACE = re.compile(r'\S')
+
+Span = Tuple[int, int]
+
+
+def _strip_span(text: str, start: int, end: int) -> Span:
+    """
+    Geser span supaya tidak diawali/diakhiri whitespace
+    """
+    match = _NON_WHITESPACE.search(text, start, end)
+    if match is None:
+        return start, start
+    start = match.start()
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_by(pattern, text: str, start: int, end: int) -> Iterator[Span]:
+    """
+    Span di antara separator `pattern` dalam [start, end), sudah di-strip
+    """
+    position = start
+    for match in pattern.finditer(text, start, end):
+        span = _strip_span(text, position, match.start())
+        if span[1] > span[0]:
+            yield span
+        position = match.end()
+    
+    span = _strip_span(text, position, end)
+    if span[1] > span[0]:
+        yield span
+
+
+def _word_end(text: str, start: int, limit: int) -> int:
+    """
+    Posisi akhir terbaik <= limit: whitespace terakhir di (start, limit) jika ada
+    """
+    if limit >= len(text) or text[limit].isspace():
+        return limit
+    cut = max(text.rfind(' ', start + 1, limit), text.rfind('\n', start + 1, limit))
+    return cut if cut > start else limit
+
+
+def _word_start(text: str, position: int, end: int) -> int:
+    """
+    Awal kata pertama di [position, end); position sendiri jika sudah di awal kata
+    """
+    if position == 0 or text[position - 1].isspace():
+        return position
+    match = _WHITESPACE.search(text, position, end)
+    if match is None:
+        return end
+    match = _NON_WHITESPACE.search(text, match.end(), end)
+    return match.start() if match else end
+
+
+def _windows(text: str, start: int, end: int, size: int, overlap: int) -> Iterator[Span]:
+    """
+    Jendela karakter <= size di [start, end), dipotong di batas kata
+    """
+    position = start
+    previous_end = start
+    yielded_end = start
+    while position < end:
+        # Jendela harus maju melewati jendela sebelumnya (kata yang sangat panjang dipotong paksa)
+        window_end = _word_end(text, previous_end, min(position + size, end))
+        previous_end = window_end
+        span = _strip_span(text, position, window_end)
+        if span[1] > span[0] and span[1] > yielded_end:
+            yielded_end = span[1]
+            yield span
+        if window_end >= end:
+            return
+        
+        # Overlap: mulai jendela berikutnya di awal kata dalam `overlap` karakter terakhir
+        next_position = _word_start(text, max(window_end - overlap, span[0] + 1), window_end) if overlap else window_end
+        position = next_position if next_position < window_end else window_end
+
+
+def _units(text: str, strategy: str, max_length: int) -> Iterator[Span]:
+    """
+    Unit terkecil per strategi; unit yang lebih panjang dari max_length dipecah lagi
+    (paragraf -> kalimat -> jendela kata)
+    """
+    if strategy == 'paragraph':
+        for para_start, para_end in _split_by(_PARAGRAPH_BREAK, text, 0, len(text)):
+            if para_end - para_start <= max_length:
+                yield para_start, para_end
+                continue
+            for span in _split_by(_SENTENCE_BREAK, text, para_start, para_end):
+                if span[1] - span[0] <= max_length:
+                    yield span
+                else:
+                    yield from _windows(text, span[0], span[1], max_length, 0)
+    else:
+        for span in _split_by(_SENTENCE_BREAK, text, 0, len(text)):
+            if span[1] - span[0] <= max_length:
+                yield span
+            else:
+                yield from _windows(text, span[0], span[1], max_length, 0)
+
+
+def iter_chunks(text: str, strategy: str = 'paragraph', chunk_size: int = 500,
+                chunk_overlap: int = 100, max_length: int = 1000) -> Iterator[Span]:
+    """
+    Generator span chunk (start, end) di `text`
+    
+    Args:
+        text: Buffer teks materi
+        strategy: 'paragraph', 'sentence' atau 'window'
+        chunk_size: Target panjang chunk (karakter)
+        chunk_overlap: Maksimal karakter yang diulang dari chunk sebelumnya
+        max_length: Hard limit panjang chunk
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
+    
+    max_length = max(max_length, 1)
+    chunk_size = min(chunk_size, max_length)
+    chunk_overlap = max(0, min(chunk_overlap, chunk_size - 1))
+    
+    if strategy == 'window':
+        yield from _windows(text, 0, len(text), chunk_size, chunk_overlap)
+        return
+    
+    chunk_start = None
+    chunk_end = None
+    chunk_length = 0  # panjang konten tanpa separator (kriteria yang sama dengan chunker lama)
+    unit_starts = []
+    
+    for unit_start, unit_end in _units(text, strategy, max_length):
+        if chunk_start is None:
+            chunk_start, chunk_end, chunk_length = unit_start, unit_end, unit_end - unit_start
+            unit_starts = [unit_start]
+            continue
+        
+        # If adding this unit exceeds chunk_size (atau hard limit)
+        if chunk_length + (unit_end - unit_start) > chunk_size or unit_end - chunk_start > max_length:
+            yield chunk_start, chunk_end
+            
+            # Overlap: unit utuh terakhir yang muat, atau awal kata dalam `chunk_overlap` karakter terakhir
+            overlap_start = unit_start
+            if chunk_overlap:
+                boundary = chunk_end - chunk_overlap
+                aligned = [start for start in unit_starts if start >= boundary and start > chunk_start]
+                overlap_start = aligned[0] if aligned else _word_start(text, max(boundary, chunk_start + 1), chunk_end)
+                if overlap_start >= chunk_end or unit_end - overlap_start > max_length:
+                    overlap_start = unit_start
+            
+            chunk_start = overlap_start
+            unit_starts = [start for start in unit_starts if start >= overlap_start] + [unit_start]
+            chunk_length = (chunk_end - overlap_start) if overlap_start < unit_start else 0
+            chunk_length += unit_end - unit_start
+        else:
+            chunk_length += unit_end - unit_start
+            unit_starts.append(unit_start)
+        chunk_end = unit_end
+    
+    # Add remaining chunk
+    if chunk_start is not None:
+        yield chunk_start, chunk_end
+
+
+def sentence_spans(text: str) -> Iterator[Span]:
+    """
+    Span kalimat (start, end) di `text`, dengan batas kalimat yang sama seperti chunker
+    """
+    return _split_by(_SENTENCE_BREAK, text, 0, len(text))
@@ -0,0 +1,109 @@
+"""
+Context packing untuk prompt LLM (batas token)
+
+Prinsip:
+1. Jumlah token diestimasi offline (tanpa tokenizer model / network), sengaja sedikit berlebih
+2. Chunk diproses urut skor tertinggi; chunk yang muat dimasukkan utuh
+3. Chunk yang tidak muat dipotong di batas kalimat (kata, jika satu kalimat pun tidak muat)
+   selama sisa budget >= MIN_TRIM_TOKENS, selain itu dibuang
+4. Karena urut skor, budget habis di chunk berskor rendah: merekalah yang pertama dipotong / dibuang
+5. Report mencatat chunk yang dipotong / dibuang dan jumlah tokennya
+"""
+from typing import Any, Dict, List, Tuple
+import re
+
+from app.chunking import sentence_spans
+
+CHARS_PER_TOKEN = 4  # kata panjang Bahasa Indonesia (imbuhan) dipecah jadi beberapa subword
+CONTEXT_OVERHEAD_TOKENS = 24  # header per chunk di prompt: [Materi i], topik/level, pembuat, separator
+MIN_TRIM_TOKENS = 32  # sisa budget lebih kecil dari ini: chunk dibuang, tidak dipotong
+TRIM_MARKER = ' …'
+
+_PIECE = re.compile(r'\w+|[^\w\s]')
+_WORD_END = re.compile(r'\S+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimasi jumlah token: tiap kata ceil(len / CHARS_PER_TOKEN), tiap simbol/tanda baca 1
+    """
+    total = 0
+    for piece in _PIECE.findall(text):
+        total += (len(piece) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return total
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Awal `text` yang muat dalam max_tokens, dipotong di akhir kalimat terakhir yang muat
+    Jika kalimat pertama pun tidak muat, dipotong di batas kata. '' jika tidak ada yang muat
+    """
+    end = 0
+    used = 0
+    for start, sentence_end in sentence_spans(text):
+        cost = estimate_tokens(text[start:sentence_end])
+        if used + cost > max_tokens:
+            break
+        used += cost
+        end = sentence_end
+    
+    if end == 0:
+        for match in _WORD_END.finditer(text):
+            cost = estimate_tokens(match.group())
+            if used + cost > max_tokens:
+                break
+            used += cost
+            end = match.end()
+    
+    return text[:end]
+
+
+def pack_contexts(contexts: List[Dict[str, Any]], budget_tokens: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pilih / potong contexts hasil rag_service.retrieve_context supaya muat di budget_tokens
+    
+    Returns:
+        (packed, report) - packed tetap urut seperti input, chunk terpotong punya 'trimmed': True
+        report = {'budget_tokens', 'input_tokens', 'used_tokens', 'kept', 'trimmed': [...], 'dropped': [...]}
+    """
+    costs = [
+        (estimate_tokens(ctx['metadata']['judul']) + CONTEXT_OVERHEAD_TOKENS, estimate_tokens(ctx['text']))
+        for ctx in contexts
+    ]
+    # Skor sama: urutan asli (sort stabil)
+    order = sorted(range(len(contexts)), key=lambda position: -contexts[position]['score'])
+    
+    remaining = budget_tokens
+    packed = {}
+    trimmed = []
+    dropped = []
+    for position in order:
+        ctx = contexts[position]
+        overhead, tokens = costs[position]
+        
+        if overhead + tokens <= remaining:
+            packed[position] = ctx
+            remaining -= overhead + tokens
+            continue
+        
+        text = ''
+        if remaining - overhead >= MIN_TRIM_TOKENS:
+            text = trim_to_tokens(ctx['text'], remaining - overhead - estimate_tokens(TRIM_MARKER))
+        if text:
+            kept_tokens = estimate_tokens(text) + estimate_tokens(TRIM_MARKER)
+            packed[position] = dict(ctx, text=text + TRIM_MARKER, trimmed=True)
+            remaining -= overhead + kept_tokens
+            trimmed.append({'judul': ctx['metadata']['judul'], 'score': ctx['score'],
+                            'tokens': tokens, 'kept_tokens': kept_tokens})
+        else:
+            dropped.append({'judul': ctx['metadata']['judul'], 'score': ctx['score'], 'tokens': tokens})
+    
+    report = {
+        'budget_tokens': budget_tokens,
+        'input_tokens': sum(overhead + tokens for overhead, tokens in costs),
+        'used_tokens': budget_tokens - remaining,
+        'kept': len(packed),
+        'trimmed': trimmed,
+        'dropped': dropped
+    }
+    return [packed[position] for position in sorted(packed)], report
@@ -0,0 +1,167 @@
+"""
+Extraction Service
+Ekstraksi teks file materi guru dilakukan SEKALI saat upload, di background thread
+
+Prinsip:
+1. Teks hasil ekstraksi disimpan di extracted_texts dengan key SHA-256 file
+2. Upload ulang file yang identik langsung 'ready' tanpa ekstraksi
+3. RAG service hanya membaca teks yang sudah diekstrak (tidak parsing PDF di request siswa)
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+
+from app.models import db, TeacherMaterial, ExtractedText
+from app import pdf_extraction
+
+STATUS_EXTRACTING = 'extracting'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+EXTRACTABLE_TYPES = {'txt', 'pdf'}
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    SHA-256 isi file (dibaca per blok supaya memory tetap kecil)
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_text_from_file(file_path: str, file_type: str) -> str:
+    """
+    Extract plain text dari file TXT/PDF
+    Raise exception jika gagal atau tipe file tidak didukung
+    """
+    # Extract text from TXT files
+    if file_type == 'txt':
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    # Extract text from PDF files (paralel per range halaman untuk PDF besar)
+    if file_type == 'pdf':
+        result = pdf_extraction.extract_pdf(file_path)
+        timings = result['page_timings']
+        if timings:
+            slowest = max(range(len(timings)), key=timings.__getitem__)
+            print(
+                f"  📄 PDF {os.path.basename(file_path)}: {result['page_count']} pages in {result['elapsed']:.2f}s "
+                f"({'parallel' if result['parallel'] else 'sequential'}, slowest page {slowest + 1}: {timings[slowest]:.3f}s)"
+            )
+        return result['text']
+    
+    # DOC/DOCX/PPT/PPTX belum didukung
+    raise ValueError(f"Cannot extract text from {file_type} file")
+
+
+class ExtractionService:
+    """
+    Pipeline ekstraksi teks saat upload
+    """
+    
+    def __init__(self):
+        self.max_workers = int(os.getenv('EXTRACTION_WORKERS', '2'))
+        self._executor = None
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='extraction'
+            )
+        return self._executor
+    
+    def prepare_material(self, material: TeacherMaterial) -> bool:
+        """
+        Hitung hash file dan set status awal (sebelum commit)
+        
+        Returns:
+            True jika masih perlu ekstraksi di background
+        """
+        material.file_hash = file_sha256(material.file_path)
+        
+        if ExtractedText.query.get(material.file_hash) is not None:
+            # File identik sudah pernah diekstrak
+            material.extraction_status = STATUS_READY
+            return False
+        
+        if (material.file_type or '') not in EXTRACTABLE_TYPES:
+            print(f"  ⚠️  Cannot extract text from {material.file_type} file: {material.file_name}")
+            material.extraction_status = STATUS_FAILED
+            return False
+        
+        material.extraction_status = STATUS_EXTRACTING
+        return True
+    
+    def submit(self, app, material_id: int):
+        """
+        Jalankan ekstraksi di background thread pool
+        """
+        return self._get_executor().submit(self._run, app, material_id)
+    
+    def _run(self, app, material_id: int):
+        with app.app_context():
+            try:
+                self.extract_material(material_id)
+            finally:
+                db.session.remove()
+    
+    def extract_material(self, material_id: int) -> str:
+        """
+        Ekstraksi satu materi, simpan teks ke cache lalu update RAG index
+        
+        Returns:
+            Status akhir (ready / failed)
+        """
+        from app.rag_service import rag_service
+        
+        material = TeacherMaterial.query.get(material_id)
+        if material is None or not material.file_path:
+            return STATUS_FAILED
+        
+        try:
+            if not material.file_hash:
+                material.file_hash = file_sha256(material.file_path)
+            
+            if ExtractedText.query.get(material.file_hash) is None:
+                text = extract_text_from_file(material.file_path, material.file_type or '')
+                db.session.add(ExtractedText(
+                    sha256=material.file_hash,
+                    text=text,
+                    char_count=len(text)
+                ))
+                print(f"  ✅ Extracted text from {material.file_name} ({len(text)} chars)")
+            
+            material.extraction_status = STATUS_READY
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            material = TeacherMaterial.query.get(material_id)
+            if material is None:
+                return STATUS_FAILED
+            
+            # Upload identik yang diekstrak bersamaan sudah menyimpan teksnya
+            cached = material.file_hash and ExtractedText.query.get(material.file_hash) is not None
+            if not cached:
+                print(f"  ❌ Failed to extract {material.file_name}: {e}")
+                material.extraction_status = STATUS_FAILED
+                db.session.commit()
+                return STATUS_FAILED
+            
+            material.extraction_status = STATUS_READY
+            db.session.commit()
+        
+        try:
+            rag_service.replace_material(material)
+        except Exception as e:
+            print(f"⚠️  Failed to update RAG index: {e}")
+        
+        return STATUS_READY
+
+
+# Global instance
+extraction_service = ExtractionService()
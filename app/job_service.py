@@ -0,0 +1,192 @@
+"""
+Job Service
+Pekerjaan LLM yang lama (generate quiz, dll) dijalankan di background thread pool,
+supaya worker HTTP langsung bebas untuk request ringan
+
+Prinsip:
+1. Endpoint membuat job (tabel llm_jobs, status queued) lalu langsung return 202 + job_id
+2. Maksimal max_workers job jalan bersamaan (concurrency ke LLM terkontrol)
+3. Antrian dibatasi max_queue: jika penuh, submit ditolak (JobQueueFull -> 503), bukan menumpuk
+4. Status + hasil disimpan di DB, client polling GET /api/jobs/<id>
+5. Job running yang melewati job_timeout sejak started_at (mis. proses worker mati) dilaporkan failed;
+   job yang masih queued lebih lama dari queue_timeout sejak created_at juga failed dan tidak akan dijalankan
+6. Status hanya berpindah queued -> running -> succeeded/failed (UPDATE bersyarat status lama),
+   jadi job yang sudah dilaporkan failed tidak bisa berubah lagi
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+import json
+import os
+import threading
+import uuid
+
+from app.models import db, LLMJob
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """
+    Antrian job penuh, client sebaiknya mencoba lagi nanti
+    """
+
+
+class JobService:
+    """
+    Thread pool + antrian terbatas untuk job LLM
+    """
+    
+    def __init__(self):
+        self.max_workers = int(os.getenv('LLM_JOB_WORKERS', '2'))
+        self.max_queue = int(os.getenv('LLM_JOB_QUEUE_SIZE', '100'))
+        self.job_timeout = int(os.getenv('LLM_JOB_TIMEOUT_SECONDS', '600'))
+        self.queue_timeout = int(os.getenv('LLM_JOB_QUEUE_TIMEOUT_SECONDS', '1800'))
+        self._executor = None
+        # Slot = job yang sedang jalan + yang menunggu di antrian
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._lock = threading.Lock()
+        self.counters = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'pending': 0, 'running': 0}
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='llm-job'
+            )
+        return self._executor
+    
+    def register(self, kind: str, handler: Callable[..., Any]):
+        """
+        Daftarkan handler untuk satu jenis job
+        handler(**params) dipanggil di dalam app context, return value (JSON-serializable) = hasil job
+        """
+        self._handlers[kind] = handler
+    
+    def _count(self, name: str, delta: int = 1):
+        with self._lock:
+            self.counters[name] += delta
+    
+    def submit(self, app, kind: str, params: Dict[str, Any], user_id: int = None) -> LLMJob:
+        """
+        Buat job dan masukkan ke antrian
+        
+        Raises:
+            JobQueueFull: jika antrian sudah penuh
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise JobQueueFull(f"LLM job queue is full ({self.max_queue} waiting)")
+        
+        try:
+            job = LLMJob(
+                id=str(uuid.uuid4()),
+                kind=kind,
+                status=STATUS_QUEUED,
+                user_id=user_id,
+                params=json.dumps(params)
+            )
+            db.session.add(job)
+            db.session.commit()
+        except Exception:
+            self._slots.release()
+            raise
+        
+        self._count('submitted')
+        self._count('pending')
+        self._get_executor().submit(self._run, app, job.id)
+        return job
+    
+    def _run(self, app, job_id: str):
+        self._count('pending', -1)
+        self._count('running')
+        with app.app_context():
+            try:
+                self.run_job(job_id)
+            finally:
+                db.session.remove()
+                self._count('running', -1)
+                self._slots.release()
+    
+    def _transition(self, job_id: str, from_status: str, **values) -> bool:
+        """
+        UPDATE status job hanya jika status saat ini masih from_status
+        
+        Returns:
+            True jika baris ter-update (transisi milik caller ini)
+        """
+        updated = LLMJob.query.filter_by(id=job_id, status=from_status).update(values, synchronize_session=False)
+        db.session.commit()
+        return updated == 1
+    
+    def run_job(self, job_id: str) -> Optional[str]:
+        """
+        Jalankan satu job dan simpan hasil / error-nya
+        Job yang sudah tidak queued (mis. ditandai failed karena kelamaan antri) dilewati
+        
+        Returns:
+            Status akhir (succeeded / failed), atau None jika job dilewati
+        """
+        job = LLMJob.query.get(job_id)
+        if job is None or not self._transition(job_id, STATUS_QUEUED, status=STATUS_RUNNING, started_at=datetime.utcnow()):
+            print(f"⏭️  Skipping job {job_id} (no longer queued)")
+            return None
+        
+        kind = job.kind
+        params = json.loads(job.params)
+        print(f"⚙️  Running {kind} job {job_id}")
+        
+        try:
+            result = self._handlers[kind](**params)
+            values = {'status': STATUS_SUCCEEDED, 'result': json.dumps(result), 'error': None}
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ {kind} job {job_id} failed: {e}")
+            values = {'status': STATUS_FAILED, 'error': str(e)}
+        
+        if not self._transition(job_id, STATUS_RUNNING, finished_at=datetime.utcnow(), **values):
+            # Sudah dilaporkan failed (timeout) oleh get_job; status itu yang berlaku
+            print(f"⚠️  {kind} job {job_id} finished after it was reported failed")
+            return STATUS_FAILED
+        
+        self._count(values['status'])
+        return values['status']
+    
+    def get_job(self, job_id: str) -> Optional[LLMJob]:
+        """
+        Job by id; job yang melewati batas waktunya ditandai failed:
+        - running: lebih lama dari job_timeout sejak started_at
+        - queued: lebih lama dari queue_timeout sejak created_at (tidak akan dijalankan lagi)
+        """
+        job = LLMJob.query.get(job_id)
+        if job is None or job.status not in (STATUS_QUEUED, STATUS_RUNNING):
+            return job
+        
+        if job.status == STATUS_RUNNING:
+            since, limit, what = job.started_at, self.job_timeout, 'finish'
+        else:
+            since, limit, what = job.created_at, self.queue_timeout, 'start'
+        
+        if since and datetime.utcnow() - since > timedelta(seconds=limit):
+            if self._transition(job_id, job.status, status=STATUS_FAILED,
+                                error=f'Job did not {what} within {limit} seconds',
+                                finished_at=datetime.utcnow()):
+                self._count(STATUS_FAILED)
+            job = LLMJob.query.get(job_id)
+        return job
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counters, max_workers=self.max_workers, max_queue=self.max_queue,
+                        job_timeout=self.job_timeout, queue_timeout=self.queue_timeout)
+
+
+# Global instance
+job_service = JobService()
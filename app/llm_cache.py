@@ -0,0 +1,222 @@
+"""
+Cache response LLM (dua tingkat)
+
+1. Memory: LRU in-process (batas jumlah entry + bytes), lookup sub-milidetik
+2. Disk: SQLite lokal, dipakai bersama semua worker dan bertahan saat restart
+
+Key = SHA-256 dari (model, method, prompt lengkap). Prompt sudah memuat context RAG dari
+materi guru, jadi saat materi berubah prompt-nya berubah dan entry lama tidak pernah cocok lagi
+(tidak perlu invalidasi manual); entry basi hilang sendiri lewat TTL / batas ukuran.
+
+Error di tingkat disk (file terkunci, disk penuh, dll) tidak pernah menggagalkan request:
+dicatat lalu diperlakukan sebagai miss.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+def prompt_fingerprint(model: str, method: str, prompt: str) -> str:
+    """
+    Key cache untuk satu prompt
+    """
+    digest = hashlib.sha256()
+    for part in (model, method, prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    LRU memory di depan tabel SQLite; entry kadaluarsa setelah ttl_seconds (0 = tanpa TTL)
+    Metrik hit/miss dicatat per method LLMService (explanation, step_by_step, ...)
+    """
+    
+    def __init__(self, path: Optional[str], ttl_seconds: float, max_entries: int, max_bytes: int,
+                 disk_max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+        
+        self._entries = OrderedDict()  # key -> (text, created_at, size)
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.disk_errors = 0
+        self.methods: Dict[str, Dict[str, int]] = {}
+    
+    def _method_stats(self, method: str) -> Dict[str, int]:
+        if method not in self.methods:
+            self.methods[method] = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'stores': 0}
+        return self.methods[method]
+    
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+    
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """
+        Koneksi SQLite (dibuat saat pertama dipakai); None jika tingkat disk nonaktif
+        """
+        if not self.path:
+            return None
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS llm_cache ('
+                'key TEXT PRIMARY KEY, method TEXT NOT NULL, response TEXT NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at)')
+            connection.commit()
+            self._db = connection
+        return self._db
+    
+    def _disk_get(self, key: str, now: float):
+        with self._db_lock:
+            connection = self._connection()
+            if connection is None:
+                return None
+            row = connection.execute('SELECT response, created_at FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1], now):
+                connection.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                connection.commit()
+                return False
+            connection.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            connection.commit()
+            return row
+    
+    def _disk_put(self, key: str, method: str, text: str, now: float):
+        with self._db_lock:
+            connection = self._connection()
+            if connection is None:
+                return
+            connection.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, method, response, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)', (key, method, text, now, now)
+            )
+            if self.ttl_seconds > 0:
+                connection.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+            # Batas ukuran: buang entry yang paling lama tidak dipakai
+            excess = connection.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0] - self.disk_max_entries
+            if self.disk_max_entries > 0 and excess > 0:
+                connection.execute(
+                    'DELETE FROM llm_cache WHERE key IN '
+                    '(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)', (excess,)
+                )
+            connection.commit()
+    
+    def _memory_put(self, key: str, text: str, created_at: float):
+        size = 128 + len(text) * 2
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (text, created_at, size)
+            self.bytes += size
+            
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.bytes -= self._entries.pop(next(iter(self._entries)))[2]
+                self.evictions += 1
+    
+    def get(self, key: str, method: str) -> Optional[str]:
+        """
+        Response yang di-cache untuk key, None jika miss / kadaluarsa
+        """
+        now = time.time()
+        with self._lock:
+            stats = self._method_stats(method)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1], now):
+                    self._entries.move_to_end(key)
+                    stats['memory_hits'] += 1
+                    return entry[0]
+                self.bytes -= self._entries.pop(key)[2]
+                stats['expired'] += 1
+        
+        try:
+            row = self._disk_get(key, now)
+        except (sqlite3.Error, OSError) as e:
+            self.disk_errors += 1
+            print(f"⚠️  LLM cache read failed: {e}")
+            row = None
+        
+        with self._lock:
+            if row:
+                stats['disk_hits'] += 1
+            else:
+                if row is False:
+                    stats['expired'] += 1
+                stats['misses'] += 1
+        if not row:
+            return None
+        
+        # Promosikan ke memory (created_at asli supaya TTL tetap dihitung dari awal)
+        self._memory_put(key, row[0], row[1])
+        return row[0]
+    
+    def put(self, key: str, method: str, text: str):
+        """
+        Simpan response di kedua tingkat
+        """
+        now = time.time()
+        self._memory_put(key, text, now)
+        with self._lock:
+            self._method_stats(method)['stores'] += 1
+        
+        try:
+            self._disk_put(key, method, text, now)
+        except (sqlite3.Error, OSError) as e:
+            self.disk_errors += 1
+            print(f"⚠️  LLM cache write failed: {e}")
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+        try:
+            with self._db_lock:
+                connection = self._connection()
+                if connection is not None:
+                    connection.execute('DELETE FROM llm_cache')
+                    connection.commit()
+        except (sqlite3.Error, OSError) as e:
+            self.disk_errors += 1
+            print(f"⚠️  LLM cache clear failed: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {}
+            for method, counts in self.methods.items():
+                hits = counts['memory_hits'] + counts['disk_hits']
+                lookups = hits + counts['misses']
+                methods[method] = dict(counts, hit_rate=round(hits / lookups, 4) if lookups else 0.0)
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'ttl_seconds': self.ttl_seconds,
+                'disk_path': self.path or None,
+                'disk_max_entries': self.disk_max_entries,
+                'disk_errors': self.disk_errors,
+                'methods': methods
+            }
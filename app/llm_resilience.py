@@ -0,0 +1,189 @@
+"""
+Resilience untuk panggilan model LLM
+
+1. Deadline per method: panggilan dijalankan di thread pool dan ditunggu maksimal sisa deadline
+   (google-generativeai 0.3.x tidak punya parameter timeout). Thread yang menggantung tetap jalan
+   sampai provider menjawab, tapi request HTTP sudah dilepas dan jatuh ke fallback rule-based.
+2. Retry terbatas untuk error transient (429, 5xx, timeout, koneksi putus) dengan exponential
+   backoff + full jitter, selalu di dalam deadline yang sama (total waktu tetap terbatas).
+3. Circuit breaker: setelah N kegagalan berturut-turut semua panggilan langsung ditolak
+   (CircuitOpenError) selama reset_seconds, lalu satu panggilan percobaan (half-open) menentukan
+   apakah breaker ditutup lagi atau dibuka ulang.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import Any, Callable, Dict
+import random
+import threading
+import time
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    TRANSIENT_PROVIDER_ERRORS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.InternalServerError,
+        google_exceptions.BadGateway,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.GatewayTimeout,
+        google_exceptions.DeadlineExceeded,
+    )
+except ImportError:
+    TRANSIENT_PROVIDER_ERRORS = ()
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class ModelTimeout(TimeoutError):
+    """
+    Panggilan model melewati deadline method
+    """
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Circuit breaker terbuka: panggilan tidak dikirim ke provider
+    """
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Error yang layak di-retry (kemungkinan besar berhasil jika dicoba lagi sebentar kemudian)
+    """
+    return isinstance(error, (TimeoutError, ConnectionError) + TRANSIENT_PROVIDER_ERRORS)
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """
+    Exponential backoff dengan full jitter: acak di [0, min(max, base * 2^attempt)]
+    Jitter mencegah semua request yang gagal bersamaan me-retry bersamaan juga
+    """
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+def parse_method_timeouts(value: str) -> Dict[str, float]:
+    """
+    "explanation=20,quiz=60" -> {'explanation': 20.0, 'quiz': 60.0}
+    """
+    timeouts = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        method, seconds = item.split('=', 1)
+        try:
+            timeouts[method.strip()] = float(seconds)
+        except ValueError:
+            print(f"⚠️  Ignoring invalid LLM timeout '{item.strip()}'")
+    return timeouts
+
+
+def run_with_deadline(executor: ThreadPoolExecutor, fn: Callable[[], Any], timeout: float, what: str) -> Any:
+    """
+    Jalankan fn() di executor, tunggu maksimal timeout detik
+    
+    Raises:
+        ModelTimeout: fn belum selesai saat timeout habis
+    """
+    future = executor.submit(fn)
+    try:
+        return future.result(timeout=max(timeout, 0))
+    except FutureTimeoutError:
+        # TimeoutError dari fn sendiri (mis. socket timeout) diteruskan apa adanya
+        if future.done():
+            raise
+        future.cancel()
+        raise ModelTimeout(f"{what} did not finish within {timeout:.1f}s")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker closed -> open -> half_open -> closed untuk satu provider LLM
+    """
+    
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_opened = None
+    
+    def _current_state(self) -> str:
+        # Dipanggil dengan _lock dipegang
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+    
+    def available(self) -> bool:
+        """
+        False selama breaker terbuka (caller langsung pakai fallback tanpa menyiapkan prompt)
+        """
+        return self.state != STATE_OPEN
+    
+    def acquire(self) -> bool:
+        """
+        Izin untuk satu panggilan ke provider; half-open hanya mengizinkan satu panggilan percobaan
+        Setiap acquire() yang berhasil harus diakhiri record_success() / record_failure()
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            if self._state != STATE_CLOSED:
+                print("🔌 LLM circuit breaker closed (provider recovered)")
+            self._state = STATE_CLOSED
+            self._probe_in_flight = False
+            self.consecutive_failures = 0
+    
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            state = self._current_state()
+            if state == STATE_HALF_OPEN or (state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.open_count += 1
+                self.last_opened = datetime.utcnow().isoformat()
+                print(f"🔌 LLM circuit breaker OPEN for {self.reset_seconds:.0f}s after "
+                      f"{self.consecutive_failures} failures ({self.last_error})")
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            retry_in = 0.0
+            if state == STATE_OPEN:
+                retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+            return {
+                'state': state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_seconds': self.reset_seconds,
+                'retry_in_seconds': round(retry_in, 1),
+                'open_count': self.open_count,
+                'rejected': self.rejected,
+                'last_error': self.last_error,
+                'last_opened': self.last_opened
+            }
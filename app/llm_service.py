@@ -8,9 +8,47 @@ CRITICAL UPDATE: Sekarang menggunakan RAG (Retrieval-Augmented Generation)
 """
 import os
 import json
+import time
 import google.generativeai as genai
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterator, Optional
 from app.rag_service import rag_service
+from app.context_packer import pack_contexts
+from app.llm_cache import LLMResponseCache, prompt_fingerprint
+from app.single_flight import SingleFlight
+from app.llm_resilience import (
+    CircuitBreaker, CircuitOpenError, ModelTimeout, backoff_delay, is_transient,
+    parse_method_timeouts, run_with_deadline
+)
+
+# Deadline default per method (detik), bisa di-override lewat LLM_METHOD_TIMEOUTS="quiz=90,..."
+METHOD_TIMEOUTS = {
+    'explanation': 20,
+    'motivation': 8,
+    'practice_question': 15,
+    'visualization': 20,
+    'quiz': 45,
+    'step_by_step': 30
+}
+
+# Context quiz: query topik + satu query per aspek materi (satu retrieve_context_batch),
+# supaya soal tidak semuanya diambil dari chunk yang sama
+QUIZ_CONTEXT_ASPECTS = ('rumus volume', 'luas permukaan', 'contoh soal')
+QUIZ_CONTEXTS_PER_QUERY = 3
+QUIZ_MAX_CONTEXTS = 6
+
+_STREAM_END = object()
+
+
+def _chunk_text(chunk) -> str:
+    """
+    Teks satu chunk stream; kosong untuk chunk tanpa teks (mis. hanya finish_reason / safety ratings)
+    """
+    try:
+        return chunk.text
+    except ValueError:
+        return ''
+
 
 class LLMService:
     """
@@ -22,6 +60,42 @@ class LLMService:
         use_llm_env = os.getenv('USE_LLM', 'False')
         self.use_llm = use_llm_env.lower() == 'true'
         self.model = None
+        self.model_name = 'gemma-3-4b-it'
+        
+        # Cache response (memory LRU + SQLite), key = fingerprint prompt lengkap (termasuk context RAG)
+        # Method dengan output JSON tidak di-cache default: response rusak akan ikut tersimpan sampai TTL
+        self.cached_methods = {
+            method.strip() for method in os.getenv('LLM_CACHE_METHODS', 'explanation').split(',') if method.strip()
+        }
+        self.response_cache = LLMResponseCache(
+            path=os.getenv('LLM_CACHE_PATH', os.path.join('uploads', 'llm_cache.sqlite3')),
+            ttl_seconds=float(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600))),
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '256')),
+            max_bytes=int(os.getenv('LLM_CACHE_MAX_BYTES', str(8 * 1024 * 1024))),
+            disk_max_entries=int(os.getenv('LLM_CACHE_DISK_MAX_ENTRIES', '5000'))
+        )
+        self.model_stats = {}  # method -> {'calls', 'errors', 'total_ms'}
+        self.stream_stats = {}  # method -> {'streams', 'first_chunk_ms'} (waktu sampai chunk pertama)
+        # Request identik yang datang bersamaan berbagi satu panggilan model (lihat app/single_flight.py)
+        self.single_flight = SingleFlight()
+        
+        # Resilience (lihat app/llm_resilience.py): deadline per method, retry error transient, circuit breaker
+        self.default_timeout = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+        self.method_timeouts = dict(METHOD_TIMEOUTS, **parse_method_timeouts(os.getenv('LLM_METHOD_TIMEOUTS', '')))
+        self.stream_idle_timeout = float(os.getenv('LLM_STREAM_IDLE_SECONDS', '15'))
+        self.max_retries = int(os.getenv('LLM_MAX_RETRIES', '2'))
+        self.retry_base_seconds = float(os.getenv('LLM_RETRY_BASE_SECONDS', '0.5'))
+        self.retry_max_seconds = float(os.getenv('LLM_RETRY_MAX_SECONDS', '4'))
+        self.call_workers = int(os.getenv('LLM_CALL_WORKERS', '16'))
+        self._call_executor = None
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+            reset_seconds=float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+        )
+        
+        # Batas token materi guru per prompt (bounded prompt = bounded latency & biaya)
+        self.context_token_budget = int(os.getenv('LLM_CONTEXT_TOKEN_BUDGET', '1500'))
+        self.context_stats = {'packed': 0, 'trimmed_chunks': 0, 'dropped_chunks': 0, 'tokens_cut': 0}
         
         # Debug logging
         print(f"🔍 LLM Service Initialization:")
@@ -36,7 +110,7 @@ class LLMService:
                 genai.configure(api_key=self.api_key)
                 # Using Gemini 1.5 Flash - faster and more efficient
                 # self.model = genai.GenerativeModel('gemini-2.5-flash')
-                self.model = genai.GenerativeModel('gemma-3-4b-it')
+                self.model = genai.GenerativeModel(self.model_name)
                 print("✅ LLM (Google Gemini Flash 2.5) initialized successfully")
             except Exception as e:
                 print(f"⚠️ LLM initialization failed: {e}")
@@ -77,8 +151,296 @@ Silakan:
 Terima kasih atas pengertiannya! 🙏"""
     
     def is_available(self) -> bool:
-        """Check if LLM is available"""
-        return self.use_llm and self.model is not None
+        """Check if LLM is available (False juga selama circuit breaker terbuka -> langsung fallback)"""
+        return self.use_llm and self.model is not None and self.circuit_breaker.available()
+    
+    def _pack_contexts(self, contexts: list, purpose: str) -> list:
+        """
+        Batasi contexts RAG ke context_token_budget sebelum masuk prompt (lihat app/context_packer.py)
+        """
+        packed, report = pack_contexts(contexts, self.context_token_budget)
+        
+        self.context_stats['packed'] += 1
+        if report['trimmed'] or report['dropped']:
+            cut = sum(item['tokens'] - item['kept_tokens'] for item in report['trimmed'])
+            cut += sum(item['tokens'] for item in report['dropped'])
+            self.context_stats['trimmed_chunks'] += len(report['trimmed'])
+            self.context_stats['dropped_chunks'] += len(report['dropped'])
+            self.context_stats['tokens_cut'] += cut
+            print(
+                f"   ✂️  {purpose} context: {report['input_tokens']} -> {report['used_tokens']} tokens "
+                f"(budget {report['budget_tokens']}), trimmed {[item['judul'] for item in report['trimmed']]}, "
+                f"dropped {[item['judul'] for item in report['dropped']]}"
+            )
+        return packed
+    
+    def get_context_stats(self) -> Dict[str, int]:
+        return dict(self.context_stats, budget_tokens=self.context_token_budget)
+    
+    def _quiz_contexts(self, topik: str, level: str, num_questions: int) -> list:
+        """
+        Retrieve context quiz untuk topik + tiap aspek sekaligus, digabung bergiliran per peringkat
+        (chunk yang sama hanya sekali; hasil aspek dengan skor 0 dibuang)
+        """
+        queries = [topik] + [f"{aspect} {topik}" for aspect in QUIZ_CONTEXT_ASPECTS]
+        results = rag_service.retrieve_context_batch(
+            queries, topik=topik, level=level, top_k=QUIZ_CONTEXTS_PER_QUERY
+        )
+        
+        contexts = []
+        seen = set()
+        for rank in range(QUIZ_CONTEXTS_PER_QUERY):
+            for position, query_results in enumerate(results):
+                if rank >= len(query_results):
+                    continue
+                ctx = query_results[rank]
+                key = (ctx['metadata']['material_id'], ctx['text'])
+                if key in seen or (position and not ctx['score']):
+                    continue
+                seen.add(key)
+                contexts.append(ctx)
+        return contexts[:max(QUIZ_CONTEXTS_PER_QUERY, min(num_questions, QUIZ_MAX_CONTEXTS))]
+    
+    def _call_model(self, method: str, prompt: str) -> str:
+        """
+        Semua panggilan model lewat sini: single-flight + cache response (method di cached_methods)
+        + metrik per method. Exception dari model diteruskan ke caller (sama seperti generate_content)
+        """
+        key = prompt_fingerprint(self.model_name, method, prompt)
+        flight, leader = self.single_flight.join(key, method)
+        if not leader:
+            print(f"   🔗 Joined in-flight LLM call ({method})")
+            return self.single_flight.wait(flight, method)
+        
+        error = None
+        try:
+            text = self._cached_response(key, method)
+            if text is None:
+                text = self._generate(method, prompt)
+                # Simpan sebelum flight dilepas: request berikutnya langsung kena cache
+                self._store_response(key, method, text)
+            flight.publish(text)
+            return text
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.single_flight.finish(key, flight, error)
+    
+    def _cached_response(self, key: str, method: str) -> Optional[str]:
+        if method not in self.cached_methods:
+            return None
+        cached = self.response_cache.get(key, method)
+        if cached is not None:
+            print(f"   ⚡ LLM cache hit ({method})")
+        return cached
+    
+    def _store_response(self, key: str, method: str, text: str):
+        if method in self.cached_methods and text.strip():
+            self.response_cache.put(key, method, text)
+    
+    def _get_call_executor(self) -> ThreadPoolExecutor:
+        if self._call_executor is None:
+            self._call_executor = ThreadPoolExecutor(
+                max_workers=self.call_workers,
+                thread_name_prefix='llm-call'
+            )
+        return self._call_executor
+    
+    def _method_stats(self, method: str) -> Dict[str, Any]:
+        return self.model_stats.setdefault(method, {
+            'calls': 0, 'errors': 0, 'total_ms': 0.0, 'timeouts': 0, 'retries': 0, 'short_circuited': 0
+        })
+    
+    def _resilient(self, method: str, attempt: Callable[[float], Any]) -> Any:
+        """
+        attempt(timeout) = satu percobaan ke provider, dijalankan dengan deadline total per method,
+        retry (backoff + jitter) untuk error transient dan circuit breaker (lihat app/llm_resilience.py)
+        
+        Raises:
+            CircuitOpenError: breaker terbuka, provider tidak dipanggil
+            ModelTimeout: deadline method habis
+        """
+        deadline = time.monotonic() + self.method_timeouts.get(method, self.default_timeout)
+        stats = self._method_stats(method)
+        retries = 0
+        while True:
+            if not self.circuit_breaker.acquire():
+                stats['short_circuited'] += 1
+                raise CircuitOpenError(f"LLM circuit breaker is open, skipping {method} call")
+            
+            started = time.perf_counter()
+            try:
+                result = attempt(deadline - time.monotonic())
+            except ValueError:
+                # Response diterima tapi tidak bisa dipakai (mis. diblokir safety filter): provider sehat
+                stats['errors'] += 1
+                self.circuit_breaker.record_success()
+                raise
+            except Exception as e:
+                stats['errors'] += 1
+                if isinstance(e, ModelTimeout):
+                    stats['timeouts'] += 1
+                self.circuit_breaker.record_failure(e)
+                
+                delay = backoff_delay(retries, self.retry_base_seconds, self.retry_max_seconds)
+                if not is_transient(e) or retries >= self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                retries += 1
+                stats['retries'] += 1
+                print(f"   🔁 LLM {method} failed ({type(e).__name__}: {e}), "
+                      f"retry {retries}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+            else:
+                self.circuit_breaker.record_success()
+                return result
+            finally:
+                stats['calls'] += 1
+                stats['total_ms'] += (time.perf_counter() - started) * 1000
+    
+    def _generate(self, method: str, prompt: str) -> str:
+        """
+        Satu panggilan generate_content ke provider (deadline + retry + circuit breaker)
+        """
+        return self._resilient(method, lambda timeout: run_with_deadline(
+            self._get_call_executor(),
+            lambda: self.model.generate_content(prompt).text,
+            timeout,
+            f"LLM {method} call"
+        ))
+    
+    def _stream_model(self, method: str, prompt: str) -> Iterator[str]:
+        """
+        Seperti _call_model tapi dengan stream=True: yield teks per chunk dari model
+        Cache hit dikirim sebagai satu chunk; teks lengkap disimpan ke cache setelah stream selesai
+        (stream yang putus di tengah / dihentikan client tidak disimpan).
+        Request identik yang datang selama stream berjalan ikut menerima chunk yang sama.
+        """
+        key = prompt_fingerprint(self.model_name, method, prompt)
+        flight, leader = self.single_flight.join(key, method)
+        if not leader:
+            print(f"   🔗 Joined in-flight LLM stream ({method})")
+            yield from flight.chunks()
+            return
+        
+        error = None
+        try:
+            cached = self._cached_response(key, method)
+            if cached is not None:
+                flight.publish(cached)
+                yield cached
+                return
+            
+            parts = []
+            for text in self._generate_stream(method, prompt):
+                parts.append(text)
+                flight.publish(text)
+                yield text
+            self._store_response(key, method, ''.join(parts))
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.single_flight.finish(key, flight, error)
+    
+    def _generate_stream(self, method: str, prompt: str) -> Iterator[str]:
+        """
+        Panggilan generate_content(stream=True) ke provider, yield teks per chunk
+        
+        Deadline method + retry hanya berlaku sampai chunk pertama (setelah itu teks sudah terkirim
+        ke client); chunk berikutnya masing-masing ditunggu maksimal stream_idle_timeout.
+        """
+        stream_stats = self.stream_stats.setdefault(method, {'streams': 0, 'first_chunk_ms': 0.0, 'total_ms': 0.0})
+        executor = self._get_call_executor()
+        started = time.perf_counter()
+        
+        def open_stream():
+            chunks = iter(self.model.generate_content(prompt, stream=True))
+            for chunk in chunks:
+                text = _chunk_text(chunk)
+                if text:
+                    return chunks, text
+            return chunks, ''
+        
+        chunks, text = self._resilient(method, lambda timeout: run_with_deadline(
+            executor, open_stream, timeout, f"LLM {method} stream"
+        ))
+        if not text:
+            return
+        
+        stream_stats['streams'] += 1
+        stream_stats['first_chunk_ms'] += (time.perf_counter() - started) * 1000
+        try:
+            yield text
+            while True:
+                try:
+                    chunk = run_with_deadline(executor, lambda: next(chunks, _STREAM_END),
+                                              self.stream_idle_timeout, f"LLM {method} stream chunk")
+                except Exception as e:
+                    stats = self._method_stats(method)
+                    stats['errors'] += 1
+                    if isinstance(e, ModelTimeout):
+                        stats['timeouts'] += 1
+                    self.circuit_breaker.record_failure(e)
+                    raise
+                if chunk is _STREAM_END:
+                    return
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+        finally:
+            stream_stats['total_ms'] += (time.perf_counter() - started) * 1000
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Cache response + latency model per method
+        """
+        stats = self.response_cache.stats()
+        stats['cached_methods'] = sorted(self.cached_methods)
+        stats['model_calls'] = {
+            method: {
+                'calls': counts['calls'],
+                'errors': counts['errors'],
+                'avg_ms': round(counts['total_ms'] / counts['calls'], 1) if counts['calls'] else 0.0
+            }
+            for method, counts in self.model_stats.items()
+        }
+        stats['single_flight'] = self.single_flight.stats()
+        stats['model_streams'] = {
+            method: {
+                'streams': counts['streams'],
+                'avg_first_chunk_ms': round(counts['first_chunk_ms'] / counts['streams'], 1) if counts['streams'] else 0.0,
+                'avg_ms': round(counts['total_ms'] / counts['streams'], 1) if counts['streams'] else 0.0
+            }
+            for method, counts in self.stream_stats.items()
+        }
+        return stats
+    
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """
+        Circuit breaker + deadline/retry per method
+        """
+        return {
+            'circuit_breaker': self.circuit_breaker.stats(),
+            'timeouts': {
+                'default_seconds': self.default_timeout,
+                'stream_idle_seconds': self.stream_idle_timeout,
+                'methods': dict(self.method_timeouts)
+            },
+            'retries': {
+                'max_retries': self.max_retries,
+                'base_seconds': self.retry_base_seconds,
+                'max_seconds': self.retry_max_seconds
+            },
+            'methods': {
+                method: {
+                    'timeouts': counts['timeouts'],
+                    'retries': counts['retries'],
+                    'short_circuited': counts['short_circuited']
+                }
+                for method, counts in self.model_stats.items()
+            }
+        }
     
     def generate_explanation(self,
                            topic: str,
@@ -107,6 +469,52 @@ Terima kasih atas pengertiannya! 🙏"""
             print("   ❌ LLM not available, returning None")
             return None
         
+        prompt = self._explanation_prompt(topic, learning_style, difficulty, emotion, user_query)
+        if prompt is None:
+            # Return special message instead of None to indicate materials not available
+            return self._generate_no_material_message(topic, emotion)
+        
+        print("   ✅ LLM is available, generating content...")
+        
+        try:
+            text = self._call_model('explanation', prompt)
+            print(f"   ✅ LLM response received! Length: {len(text)} chars")
+            return text
+        except Exception as e:
+            print(f"   ❌ LLM generation error: {e}")
+            return None
+    
+    def stream_explanation(self,
+                           topic: str,
+                           learning_style: str,
+                           difficulty: str,
+                           emotion: str,
+                           user_query: str = None) -> Iterator[str]:
+        """
+        Versi streaming generate_explanation: yield potongan teks (markdown mentah) begitu diterima
+        
+        Generator kosong jika LLM tidak tersedia. Exception dari model diteruskan ke caller
+        (caller yang memutuskan fallback, tergantung sudah ada teks terkirim atau belum).
+        """
+        if not self.is_available():
+            return
+        
+        prompt = self._explanation_prompt(topic, learning_style, difficulty, emotion, user_query)
+        if prompt is None:
+            yield self._generate_no_material_message(topic, emotion)
+            return
+        
+        yield from self._stream_model('explanation', prompt)
+    
+    def _explanation_prompt(self,
+                            topic: str,
+                            learning_style: str,
+                            difficulty: str,
+                            emotion: str,
+                            user_query: str = None) -> Optional[str]:
+        """
+        Retrieve context RAG + build prompt penjelasan; None jika belum ada materi guru untuk topik ini
+        """
         # CRITICAL: Retrieve context dari guru materials via RAG
         query = user_query if user_query else topic
         contexts = rag_service.retrieve_context(
@@ -118,13 +526,13 @@ Terima kasih atas pengertiannya! 🙏"""
         
         if not contexts or all(c['score'] == 0 for c in contexts):
             print("   ⚠️  No teacher materials found for this topic!")
-            # Return special message instead of None to indicate materials not available
-            return self._generate_no_material_message(topic, emotion)
+            return None
         
         print(f"   ✅ Retrieved {len(contexts)} context chunks from teacher materials")
+        contexts = self._pack_contexts(contexts, 'explanation')
         
         # Build prompt with RAG context
-        prompt = self._build_rag_prompt(
+        return self._build_rag_prompt(
             contexts=contexts,
             topic=topic,
             learning_style=learning_style,
@@ -132,16 +540,6 @@ Terima kasih atas pengertiannya! 🙏"""
             emotion=emotion,
             user_query=user_query
         )
-        
-        print("   ✅ LLM is available, generating content...")
-        
-        try:
-            response = self.model.generate_content(prompt)
-            print(f"   ✅ LLM response received! Length: {len(response.text)} chars")
-            return response.text
-        except Exception as e:
-            print(f"   ❌ LLM generation error: {e}")
-            return None
     
     def _build_rag_prompt(self,
                          contexts: list,
@@ -349,9 +747,9 @@ Harus terasa personal dan genuine.
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except:
+            return self._call_model('motivation', prompt).strip()
+        except Exception as e:
+            print(f"   ❌ LLM motivation error: {e}")
             return None
     
     def generate_practice_question(self,
@@ -377,8 +775,7 @@ Pastikan:
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
+            text = self._call_model('practice_question', prompt).strip()
             
             # Parse response
             parts = text.split('PEMBAHASAN:')
@@ -395,7 +792,8 @@ Pastikan:
                     }
             
             return None
-        except:
+        except Exception as e:
+            print(f"   ❌ LLM practice question error: {e}")
             return None
     
     def generate_visualization_json(self,
@@ -474,8 +872,7 @@ OUTPUT (HANYA JSON VALID):
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
+            text = self._call_model('visualization', prompt).strip()
             
             # Clean markdown code blocks if present
             if text.startswith('```'):
@@ -526,17 +923,14 @@ OUTPUT (HANYA JSON VALID):
             return None
         
         # Retrieve context from RAG
-        contexts = rag_service.retrieve_context(
-            query=topik,
-            topik=topik,
-            level=level,
-            top_k=3
-        )
+        contexts = self._quiz_contexts(topik, level, num_questions)
         
         if not contexts:
             print(f"⚠️ No teacher materials found for {topik}/{level}")
             return None
         
+        contexts = self._pack_contexts(contexts, 'quiz')
+        
         # Format contexts untuk prompt
         formatted_context = "\n\n---\n\n".join([
             f"MATERI: {ctx['metadata']['judul']}\n{ctx['text']}"
@@ -578,8 +972,7 @@ OUTPUT (HANYA JSON ARRAY):
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
+            text = self._call_model('quiz', prompt).strip()
             
             # Clean markdown code blocks if present
             if text.startswith('```'):
@@ -661,6 +1054,8 @@ OUTPUT (HANYA JSON ARRAY):
             print(f"⚠️ No teacher materials found for {topik}/{level}")
             return None
         
+        contexts = self._pack_contexts(contexts, 'step-by-step')
+        
         # Format contexts untuk prompt
         formatted_context = "\n\n---\n\n".join([
             f"MATERI: {ctx['metadata']['judul']}\n{ctx['text']}"
@@ -716,8 +1111,7 @@ OUTPUT (HANYA JSON):
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
+            text = self._call_model('step_by_step', prompt).strip()
             
             # Clean markdown code blocks if present
             if text.startswith('```'):
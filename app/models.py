@@ -2,7 +2,9 @@
 Database Models untuk EMOTIVA-MATH
 """
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.mysql import LONGTEXT
 from datetime import datetime
+import json
 
 db = SQLAlchemy()
 
@@ -132,6 +134,10 @@ class TeacherMaterial(db.Model):
     CRITICAL: Ini adalah SATU-SATUNYA sumber pengetahuan sistem
     """
     __tablename__ = 'teacher_materials'
+    __table_args__ = (
+        # FULLTEXT untuk search_service (MATCH ... AGAINST), hanya di MySQL; SQLite memakai tabel FTS5
+        db.Index('idx_konten', 'konten', 'judul', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -153,6 +159,12 @@ class TeacherMaterial(db.Model):
     # File type/extension
     file_type = db.Column(db.String(50), nullable=True)
     
+    # SHA-256 dari file (key ke extracted_texts)
+    file_hash = db.Column(db.String(64), nullable=True, index=True)
+    
+    # Status ekstraksi teks file: extracting, ready, failed (None untuk materi teks)
+    extraction_status = db.Column(db.String(20), nullable=True)
+    
     # Level: pemula, menengah, mahir
     level = db.Column(db.String(20), default='pemula')
     
@@ -163,6 +175,14 @@ class TeacherMaterial(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Teks hasil ekstraksi (dibagi oleh semua materi dengan file yang identik)
+    extracted_text = db.relationship(
+        'ExtractedText',
+        primaryjoin='foreign(TeacherMaterial.file_hash) == ExtractedText.sha256',
+        viewonly=True,
+        uselist=False
+    )
+    
     def to_dict(self):
         """Convert model to dictionary"""
         return {
@@ -173,6 +193,7 @@ class TeacherMaterial(db.Model):
             'file_path': self.file_path,
             'file_name': self.file_name,
             'file_type': self.file_type,
+            'extraction_status': self.extraction_status,
             'level': self.level,
             'created_by': self.created_by,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -183,6 +204,73 @@ class TeacherMaterial(db.Model):
         return f'<TeacherMaterial {self.judul} - {self.topik}>'
 
 
+class ExtractedText(db.Model):
+    """
+    Cache teks hasil ekstraksi file materi, key = SHA-256 isi file
+    Upload ulang file yang identik tidak perlu diekstrak lagi
+    """
+    __tablename__ = 'extracted_texts'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    text = db.Column(db.Text().with_variant(LONGTEXT(), 'mysql'), nullable=False)
+    char_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ExtractedText {self.sha256[:12]} ({self.char_count} chars)>'
+
+
+class RagIndexState(db.Model):
+    """
+    Versi index RAG bersama (mode RAG_SHARED_INDEX): satu baris, id = 1
+    Naik setiap snapshot baru ditulis; worker lain re-attach ke snapshot saat versinya berubah
+    """
+    __tablename__ = 'rag_index_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    materials_version = db.Column(db.String(100), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RagIndexState v{self.version}>'
+
+
+class LLMJob(db.Model):
+    """
+    Job LLM asynchronous (mis. generate quiz), dijalankan thread pool job_service
+    Client polling GET /api/jobs/<id> sampai status succeeded / failed
+    """
+    __tablename__ = 'llm_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # uuid4
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, succeeded, failed
+    user_id = db.Column(db.Integer, nullable=True)
+    params = db.Column(db.Text, nullable=False)  # JSON
+    result = db.Column(db.Text().with_variant(LONGTEXT(), 'mysql'), nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        """Convert model to dictionary (result di-decode dari JSON)"""
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<LLMJob {self.kind} {self.id} - {self.status}>'
+
+
 class QuizQuestion(db.Model):
     """
     Model untuk menyimpan soal-soal quiz yang di-generate
@@ -0,0 +1,121 @@
+"""
+PDF Extraction Engine
+Ekstraksi teks PDF per halaman, paralel di process pool untuk PDF besar
+
+Prinsip:
+1. Halaman di-stream lewat generator (memory tetap terbatas)
+2. Range halaman dibagi ke ProcessPoolExecutor (extract_text CPU-bound)
+3. Hasil digabung dengan list-join, bukan string concatenation
+4. Waktu ekstraksi per halaman dicatat
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Tuple
+import multiprocessing
+import os
+import threading
+import time
+
+PROCESSES = int(os.getenv('PDF_EXTRACTION_PROCESSES', str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '16'))
+PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '32'))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Process pool dibuat sekali dan dipakai ulang
+    Pakai 'spawn' karena proses Flask sudah multi-thread saat pool dibuat
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESSES,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def count_pages(file_path: str) -> int:
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def iter_pages(file_path: str, start: int = 0, end: int = None) -> Iterator[Tuple[int, str, float]]:
+    """
+    Generator (page_number, text, seconds) untuk halaman [start, end)
+    """
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        if end is None:
+            end = len(pdf_reader.pages)
+        for page_number in range(start, end):
+            started = time.perf_counter()
+            text = pdf_reader.pages[page_number].extract_text() or ''
+            yield page_number, text, time.perf_counter() - started
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """
+    Dijalankan di worker process: ekstrak satu range halaman
+    """
+    return list(iter_pages(file_path, start, end))
+
+
+def iter_pages_parallel(file_path: str, page_count: int) -> Iterator[Tuple[int, str, float]]:
+    """
+    Generator halaman berurutan, diekstrak paralel per range di process pool
+    Jumlah range yang sedang dikerjakan dibatasi supaya memory tetap terbatas
+    """
+    pool = _get_pool()
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    max_in_flight = PROCESSES * 2
+    
+    pending = []
+    next_range = 0
+    while next_range < len(ranges) or pending:
+        while next_range < len(ranges) and len(pending) < max_in_flight:
+            start, end = ranges[next_range]
+            pending.append(pool.submit(_extract_page_range, file_path, start, end))
+            next_range += 1
+        
+        for page in pending.pop(0).result():
+            yield page
+
+
+def extract_pdf(file_path: str) -> Dict[str, Any]:
+    """
+    Extract seluruh teks PDF
+    
+    Returns:
+        {
+            'text': str,
+            'page_count': int,
+            'page_timings': [detik per halaman],
+            'elapsed': detik total,
+            'parallel': bool
+        }
+    """
+    started = time.perf_counter()
+    page_count = count_pages(file_path)
+    parallel = PROCESSES > 1 and page_count >= PARALLEL_MIN_PAGES
+    
+    pages = iter_pages_parallel(file_path, page_count) if parallel else iter_pages(file_path)
+    
+    texts = []
+    page_timings = []
+    for _, text, seconds in pages:
+        texts.append(text)
+        page_timings.append(seconds)
+    
+    return {
+        'text': '\n\n'.join(texts),
+        'page_count': page_count,
+        'page_timings': page_timings,
+        'elapsed': time.perf_counter() - started,
+        'parallel': parallel
+    }
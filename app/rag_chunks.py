@@ -0,0 +1,206 @@
+"""
+Compact chunk store untuk RAG index
+
+Prinsip:
+1. Teks materi disimpan SEKALI sebagai satu buffer per materi
+2. Chunk hanya record __slots__ (material_id, start, end) - offset ke buffer materi
+3. Metadata materi di-intern: satu dict per materi, dipakai bersama semua chunk-nya
+4. Tidak menyimpan ORM object (konten, relasi) setelah indexing
+"""
+from collections.abc import Mapping
+from typing import Dict, Any, Iterable, Set, Tuple
+import sys
+
+METADATA_KEYS = ('material_id', 'judul', 'topik', 'level', 'created_by', 'source')
+
+
+def intern_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Metadata materi dengan string topik/level/source di-intern
+    (nilai yang sama dipakai ulang oleh ratusan materi)
+    """
+    interned = {}
+    for key in METADATA_KEYS:
+        value = metadata.get(key)
+        if key in ('topik', 'level', 'source') and isinstance(value, str):
+            value = sys.intern(value)
+        interned[key] = value
+    return interned
+
+
+class ChunkRecord:
+    """
+    Satu chunk: range [start, end) di buffer teks materinya
+    """
+    __slots__ = ('material_id', 'start', 'end')
+    
+    def __init__(self, material_id: int, start: int, end: int):
+        self.material_id = material_id
+        self.start = start
+        self.end = end
+
+
+class ChunkStore(Mapping):
+    """
+    chunk_id -> {'text', 'metadata'}
+    Teks di-slice dari buffer materi saat diakses (tidak ada salinan teks per chunk)
+    """
+    
+    def __init__(self):
+        self._records: Dict[int, ChunkRecord] = {}
+        self._buffers: Dict[int, str] = {}  # material_id -> teks materi
+        self._metadata: Dict[int, Dict[str, Any]] = {}  # material_id -> metadata (shared)
+    
+    def add_material(self, material_id: int, metadata: Dict[str, Any], buffer: str,
+                     chunks: Iterable[Tuple[int, int, int]]):
+        """
+        Args:
+            material_id: ID materi
+            metadata: Metadata materi (sudah di-intern, TIDAK di-copy)
+            buffer: Teks materi
+            chunks: (chunk_id, start, end) per chunk
+        """
+        self._buffers[material_id] = buffer
+        self._metadata[material_id] = metadata
+        for chunk_id, start, end in chunks:
+            self._records[chunk_id] = ChunkRecord(material_id, start, end)
+    
+    def remove_material(self, material_id: int, chunk_ids: Iterable[int]):
+        for chunk_id in chunk_ids:
+            self._records.pop(chunk_id, None)
+        self._buffers.pop(material_id, None)
+        self._metadata.pop(material_id, None)
+    
+    def text(self, chunk_id: int) -> str:
+        record = self._records[chunk_id]
+        return self._buffers[record.material_id][record.start:record.end]
+    
+    def material_text(self, material_id: int) -> str:
+        return self._buffers.get(material_id, '')
+    
+    def material_id(self, chunk_id: int) -> int:
+        return self._records[chunk_id].material_id
+    
+    def span(self, chunk_id: int) -> Tuple[int, int]:
+        record = self._records[chunk_id]
+        return record.start, record.end
+    
+    def __getitem__(self, chunk_id):
+        record = self._records[chunk_id]
+        return {
+            'text': self._buffers[record.material_id][record.start:record.end],
+            'metadata': self._metadata[record.material_id]
+        }
+    
+    def __iter__(self):
+        return iter(self._records)
+    
+    def __len__(self):
+        return len(self._records)
+    
+    def __contains__(self, chunk_id):
+        return chunk_id in self._records
+    
+    def copy(self) -> 'ChunkStore':
+        """
+        Salinan dangkal untuk update copy-on-write
+        Record, buffer dan metadata dipakai bersama (tidak pernah diubah in-place)
+        """
+        store = ChunkStore()
+        store._records = dict(self._records)
+        store._buffers = dict(self._buffers)
+        store._metadata = dict(self._metadata)
+        return store
+    
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Estimasi memory chunk store (bytes)
+        """
+        text_bytes = sum(sys.getsizeof(buffer) for buffer in self._buffers.values())
+        record_bytes = sys.getsizeof(self._records) + sum(
+            sys.getsizeof(record) for record in self._records.values()
+        )
+        metadata_bytes = sys.getsizeof(self._metadata) + sum(
+            sys.getsizeof(metadata) for metadata in self._metadata.values()
+        )
+        return {
+            'materials': len(self._buffers),
+            'chunks': len(self._records),
+            'text_bytes': text_bytes,
+            'record_bytes': record_bytes,
+            'metadata_bytes': metadata_bytes,
+            'total_bytes': text_bytes + record_bytes + metadata_bytes
+        }
+
+
+class OverlayChunks(Mapping):
+    """
+    Chunk snapshot (read-only, mmap) + chunk materi yang di-index sejak snapshot ditulis
+    Chunk id baru selalu >= jumlah chunk snapshot. Chunk snapshot milik materi yang dihapus
+    tetap bisa dibaca (query lama mungkin masih memegangnya), hanya tidak direferensikan index
+    """
+    
+    def __init__(self, base, added: ChunkStore = None, removed: Set[int] = None):
+        self.base = base  # rag_snapshot.SnapshotChunks
+        self.added = added if added is not None else ChunkStore()
+        self._removed = removed if removed is not None else set()  # material_id snapshot yang dihapus
+        self._base_count = len(base)
+        self._positions = None  # material_id -> posisi di snapshot, dibangun saat pertama dipakai
+    
+    def copy(self) -> 'OverlayChunks':
+        chunks = OverlayChunks(self.base, self.added.copy(), set(self._removed))
+        chunks._positions = self._positions
+        return chunks
+    
+    def _store(self, chunk_id: int):
+        return self.added if chunk_id >= self._base_count else self.base
+    
+    def add_material(self, material_id: int, metadata: Dict[str, Any], buffer: str,
+                     chunks: Iterable[Tuple[int, int, int]]):
+        self.added.add_material(material_id, metadata, buffer, chunks)
+    
+    def remove_material(self, material_id: int, chunk_ids: Iterable[int]):
+        chunk_ids = list(chunk_ids)
+        if chunk_ids and chunk_ids[0] < self._base_count:
+            self._removed.add(material_id)
+        else:
+            self.added.remove_material(material_id, chunk_ids)
+    
+    def text(self, chunk_id: int) -> str:
+        return self._store(chunk_id).text(chunk_id)
+    
+    def material_text(self, material_id: int) -> str:
+        text = self.added.material_text(material_id)
+        if text or material_id in self._removed:
+            return text
+        if self._positions is None:
+            self._positions = {material_id: position for position, material_id in enumerate(self.base.material_ids())}
+        position = self._positions.get(material_id)
+        return '' if position is None else self.base.material_text(position)
+    
+    def material_id(self, chunk_id: int) -> int:
+        return self._store(chunk_id).material_id(chunk_id)
+    
+    def span(self, chunk_id: int) -> Tuple[int, int]:
+        return self._store(chunk_id).span(chunk_id)
+    
+    def __getitem__(self, chunk_id):
+        return self._store(chunk_id)[chunk_id]
+    
+    def __iter__(self):
+        yield from self.base
+        yield from self.added
+    
+    def __len__(self):
+        return self._base_count + len(self.added)
+    
+    def __contains__(self, chunk_id):
+        return chunk_id in self._store(chunk_id)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Buffer teks materi: paragraf di-strip dan dipisah tepat satu baris kosong
+    """
+    paragraphs = (para.strip() for para in text.strip().split('\n\n'))
+    return '\n\n'.join(para for para in paragraphs if para)
@@ -0,0 +1,209 @@
+"""
+Near-duplicate detection untuk chunk RAG (MinHash + LSH)
+
+Prinsip:
+1. Signature MinHash (NUM_PERM hash) atas shingle 3 token dari token ter-analisis chunk
+2. LSH: signature dipecah jadi BANDS band; chunk yang sama di satu band = kandidat
+3. Kandidat dikonfirmasi dengan estimasi Jaccard (persentase hash yang sama) >= threshold
+4. Cluster single-link; chunk canonical = anggota pertama cluster (chunk id terkecil saat dihapus)
+5. Hash token memakai crc32 supaya signature identik di semua worker / snapshot
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Iterable, Tuple
+import zlib
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+NO_SIGNATURE = np.uint32(0xFFFFFFFF)  # baris signature untuk chunk tanpa token (di snapshot)
+
+_MIX = np.uint64(0x01000193)  # multiplier FNV
+_MASK = np.uint64(0xFFFFFFFF)
+_SHIFT = np.uint64(32)
+
+
+@lru_cache(maxsize=65536)
+def _token_hash(token: str) -> int:
+    return zlib.crc32(token.encode('utf-8'))
+
+
+class MinHasher:
+    """
+    Hash multiply-shift h_i(x) = ((a_i * x + b_i) mod 2^64) >> 32, a_i ganjil, seed tetap
+    """
+    
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = (rng.integers(0, 2 ** 64 - 1, num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1))[:, None]
+        self.b = rng.integers(0, 2 ** 64 - 1, num_perm, dtype=np.uint64, endpoint=True)[:, None]
+    
+    def signature(self, tokens: List[str]) -> Optional[np.ndarray]:
+        """
+        Signature uint32 (num_perm,), atau None jika tidak ada token
+        """
+        if not tokens:
+            return None
+        
+        # Hash shingle = kombinasi hash token (tanpa membuat string per shingle)
+        token_hashes = np.fromiter((_token_hash(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+        if len(tokens) < SHINGLE_SIZE:
+            hashes = token_hashes[:1].copy()
+            for value in token_hashes[1:]:
+                hashes = (hashes * _MIX) ^ value
+        else:
+            count = len(tokens) - SHINGLE_SIZE + 1
+            hashes = token_hashes[:count].copy()
+            for offset in range(1, SHINGLE_SIZE):
+                hashes = ((hashes * _MIX) & _MASK) ^ token_hashes[offset:offset + count]
+        hashes = np.unique(hashes & _MASK)
+        # Overflow uint64 = mod 2^64 (disengaja)
+        return ((self.a * hashes + self.b) >> _SHIFT).min(axis=1).astype(np.uint32)
+
+
+class DuplicateIndex:
+    """
+    LSH bucket + cluster near-duplicate per chunk id
+    Hanya chunk yang punya duplikat yang tercatat di cluster_of (chunk lain = cluster-nya sendiri)
+    """
+    
+    def __init__(self, threshold: float = 0.8, num_perm: int = NUM_PERM, bands: int = BANDS):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.buckets: Dict[tuple, List[int]] = {}
+        self.cluster_of: Dict[int, int] = {}  # chunk_id -> canonical chunk_id
+        self.members: Dict[int, Set[int]] = {}  # canonical -> semua anggota cluster
+        self._frozen = None  # signature chunk snapshot (mmap, read-only), kandidat dicari vectorized
+        self._removed: Set[int] = set()  # chunk snapshot yang sudah dihapus dari index
+    
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+    
+    def canonical(self, chunk_id: int) -> int:
+        return self.cluster_of.get(chunk_id, chunk_id)
+    
+    def has_duplicates(self) -> bool:
+        return bool(self.cluster_of)
+    
+    def add(self, chunk_id: int, tokens: List[str]) -> int:
+        """
+        Masukkan chunk; return canonical chunk id cluster-nya
+        """
+        signature = self.hasher.signature(tokens)
+        if signature is None:
+            return chunk_id
+        return self._insert(chunk_id, signature)
+    
+    def _insert(self, chunk_id: int, signature: np.ndarray) -> int:
+        candidates = set()
+        for key in self._band_keys(signature):
+            bucket = self.buckets.setdefault(key, [])
+            candidates.update(bucket)
+            bucket.append(chunk_id)
+        self.signatures[chunk_id] = signature
+        candidates.update(self._frozen_candidates(signature))
+        
+        matches = [(float(np.mean(self._signature(candidate) == signature)), -candidate) for candidate in candidates]
+        matches = [match for match in matches if match[0] >= self.threshold]
+        if not matches:
+            return chunk_id
+        
+        # Gabung ke cluster chunk yang paling mirip
+        canonical = self.canonical(-max(matches)[1])
+        self.members.setdefault(canonical, {canonical}).add(chunk_id)
+        self.cluster_of[canonical] = canonical
+        self.cluster_of[chunk_id] = canonical
+        return canonical
+    
+    def _frozen_candidates(self, signature: np.ndarray) -> List[int]:
+        """
+        Chunk snapshot yang sama di minimal satu band (satu perbandingan array, tanpa bucket)
+        """
+        frozen = self._frozen
+        if frozen is None or not len(frozen):
+            return []
+        same_band = (frozen == signature).reshape(len(frozen), self.bands, self.rows).all(axis=2).any(axis=1)
+        return [
+            chunk_id for chunk_id in np.flatnonzero(same_band).tolist()
+            if chunk_id not in self._removed and frozen[chunk_id][0] != NO_SIGNATURE
+        ]
+    
+    def _signature(self, chunk_id: int) -> np.ndarray:
+        signature = self.signatures.get(chunk_id)
+        if signature is None:
+            signature = self._frozen[chunk_id]
+        return signature
+    
+    def remove(self, chunk_id: int):
+        signature = self.signatures.pop(chunk_id, None)
+        if signature is not None:
+            for key in self._band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.remove(chunk_id)
+                    if not bucket:
+                        del self.buckets[key]
+        elif self._frozen is not None and chunk_id < len(self._frozen):
+            self._removed.add(chunk_id)
+        
+        canonical = self.cluster_of.pop(chunk_id, None)
+        if canonical is None:
+            return
+        members = self.members.pop(canonical)
+        members.discard(chunk_id)
+        if len(members) < 2:
+            for member in members:
+                self.cluster_of.pop(member, None)
+            return
+        
+        canonical = min(members)
+        self.members[canonical] = members
+        for member in members:
+            self.cluster_of[member] = canonical
+    
+    def clear(self):
+        self.signatures = {}
+        self.buckets = {}
+        self.cluster_of = {}
+        self.members = {}
+        self._frozen = None
+        self._removed = set()
+    
+    def load(self, signatures, duplicates: Iterable[Tuple[int, int]]):
+        """
+        Pakai state dari snapshot: signatures = array (n_chunks, num_perm) read-only,
+        duplicates = pasangan (chunk_id, canonical)
+        """
+        self.clear()
+        self._frozen = signatures
+        for chunk_id, canonical in duplicates:
+            self.cluster_of[chunk_id] = canonical
+            self.members.setdefault(canonical, set()).add(chunk_id)
+    
+    def signature_rows(self, chunk_ids: List[int]) -> bytes:
+        """
+        Signature chunk `chunk_ids` (urutan snapshot) sebagai bytes uint32 untuk disimpan
+        """
+        rows = np.full((len(chunk_ids), self.hasher.num_perm), NO_SIGNATURE, dtype=np.uint32)
+        for position, chunk_id in enumerate(chunk_ids):
+            if chunk_id in self.signatures:
+                rows[position] = self.signatures[chunk_id]
+            elif self._frozen is not None and chunk_id < len(self._frozen):
+                rows[position] = self._frozen[chunk_id]
+        return rows.tobytes()
+    
+    def stats(self, total_chunks: int) -> Dict[str, float]:
+        duplicates = sum(len(members) - 1 for members in self.members.values())
+        return {
+            'chunks': total_chunks,
+            'clusters': total_chunks - duplicates,
+            'duplicate_chunks': duplicates,
+            'dedup_ratio': round(duplicates / total_chunks, 4) if total_chunks else 0.0,
+            'threshold': self.threshold,
+        }
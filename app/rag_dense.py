@@ -0,0 +1,148 @@
+"""
+Dense retrieval lokal untuk RAG index (tanpa model / network)
+
+Prinsip:
+1. Embedding = hashing trick atas character n-gram (3-5), signed, tf sublinear, L2-normalized
+2. Vektor chunk disimpan dalam satu matriks NumPy contiguous (float32, atau int8 + scale per baris)
+3. Search brute-force (matvec) untuk partisi kecil, IVF (k-means, probe beberapa list) untuk partisi besar
+4. Hash memakai crc32 supaya vektor identik di semua worker (hash() Python di-random per proses)
+"""
+from collections import Counter
+from functools import lru_cache
+from typing import List, Iterable
+import math
+import zlib
+
+import numpy as np
+
+
+@lru_cache(maxsize=262144)
+def _hash_ngram(ngram: str, dim: int) -> tuple:
+    """
+    (index, sign) untuk satu n-gram
+    """
+    value = zlib.crc32(ngram.encode('utf-8'))
+    return value % dim, (1.0 if value & 0x80000000 else -1.0)
+
+
+class HashingEncoder:
+    """
+    Character n-gram hashing vectorizer
+    N-gram diambil per kata dengan padding spasi (' kubus ') supaya awalan/akhiran kata ikut terwakili
+    """
+    
+    def __init__(self, dim: int = 512, min_n: int = 3, max_n: int = 5):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+    
+    def _ngrams(self, words: Iterable[str]) -> Counter:
+        counts = Counter()
+        for word in words:
+            padded = f' {word} '
+            for n in range(self.min_n, self.max_n + 1):
+                for start in range(0, len(padded) - n + 1):
+                    counts[padded[start:start + n]] += 1
+        return counts
+    
+    def encode(self, words: List[str]) -> np.ndarray:
+        """
+        Vektor float32 ter-normalisasi L2 (nol jika tidak ada n-gram)
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for ngram, count in self._ngrams(words).items():
+            index, sign = _hash_ngram(ngram, self.dim)
+            vector[index] += sign * (1.0 + math.log(count))
+        
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+    
+    def encode_batch(self, texts_words: List[List[str]]) -> np.ndarray:
+        matrix = np.zeros((len(texts_words), self.dim), dtype=np.float32)
+        for row, words in enumerate(texts_words):
+            matrix[row] = self.encode(words)
+        return matrix
+
+
+class DenseIndex:
+    """
+    Matriks vektor chunk satu partisi (baris urut sama dengan PartitionMatrix.doc_ids)
+    """
+    
+    def __init__(self, vectors: np.ndarray, quantize: bool = False, ivf_min_rows: int = 4096,
+                 nprobe: int = 8, seed: int = 0):
+        self.rows = len(vectors)
+        self.quantized = quantize
+        if quantize:
+            # int8 + scale per baris (memory 4x lebih kecil)
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.vectors = np.ascontiguousarray(np.round(vectors / scales[:, None]).astype(np.int8))
+            self.scales = scales.astype(np.float32)
+        else:
+            self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            self.scales = None
+        
+        self.centroids = None
+        self.lists = None
+        self.nprobe = nprobe
+        if self.rows >= ivf_min_rows:
+            self._build_ivf(vectors, seed)
+    
+    def _build_ivf(self, vectors: np.ndarray, seed: int, iterations: int = 8):
+        """
+        Spherical k-means sederhana: nlist ~ sqrt(n)
+        """
+        nlist = max(1, int(math.sqrt(self.rows)))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(self.rows, nlist, replace=False)].copy()
+        
+        for _ in range(iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = vectors[assignment == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[cluster] = centroid / norm if norm > 0 else centroid
+        
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+    
+    def _dot(self, rows, queries: np.ndarray) -> np.ndarray:
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        sims = vectors.astype(np.float32, copy=False) @ queries.T
+        if self.scales is not None:
+            scales = self.scales if rows is None else self.scales[rows]
+            sims *= scales[:, None]
+        return sims.T
+    
+    def search(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity (queries x rows)
+        Dengan IVF hanya baris di `nprobe` list terdekat yang dihitung, sisanya 0
+        """
+        if self.centroids is None:
+            return self._dot(None, queries)
+        
+        sims = np.zeros((len(queries), self.rows), dtype=np.float32)
+        nprobe = min(self.nprobe, len(self.lists))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+        for position, query in enumerate(queries):
+            rows = np.concatenate([self.lists[cluster] for cluster in probes[position]])
+            if len(rows):
+                sims[position, rows] = self._dot(rows, query[None, :])[0]
+        return sims
+    
+    def memory_bytes(self) -> int:
+        total = self.vectors.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        if self.centroids is not None:
+            total += self.centroids.nbytes + sum(cluster.nbytes for cluster in self.lists)
+        return total
@@ -5,180 +5,1734 @@ CRITICAL: Memastikan LLM HANYA menggunakan materi dari guru
 Prinsip:
 1. Materi HANYA dari teacher_materials table
 2. Chunking untuk memecah materi panjang
-3. Embedding sederhana (TF-IDF based)
+3. Inverted index + BM25 scoring
 4. Retrieve context yang relevan berdasarkan query
+5. Scoring vectorized dengan NumPy (CSR), fallback pure-Python jika NumPy tidak ada
 """
-from typing import List, Dict, Any
-from app.models import TeacherMaterial, db
-import re
-from collections import Counter
+from typing import List, Dict, Any, Set
+from flask import current_app
+from app.models import TeacherMaterial, RagIndexState, db
+from app import rag_snapshot
+from app.rag_chunks import ChunkStore, OverlayChunks, intern_metadata, normalize_text
+from app.chunking import iter_chunks
+from app import text_analysis
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+import atexit
+import heapq
 import math
 import os
+import sys
+import threading
+import time
+
+try:
+    import numpy as np
+    from app import rag_dense, rag_dedup
+except ImportError:
+    np = None
+    rag_dense = None
+    rag_dedup = None
+    print("⚠️  NumPy not installed. RAG scoring falls back to pure Python (lexical only, no dedup)")
+
+try:
+    import fcntl
+except ImportError:  # Windows: tanpa lock antar proses, setiap worker bisa rebuild sendiri
+    fcntl = None
+
+RETRIEVAL_MODES = ('lexical', 'dense', 'hybrid')
+
+# Jumlah chunk per blok saat batch scoring (membatasi ukuran matriks dense)
+BATCH_BLOCK_SIZE = 8192
+
+# Panjang snippet hasil search materi (karakter)
+SEARCH_SNIPPET_CHARS = 200
+
+# Estimasi memory satu entry postings / title postings / doc length di dict Python (bytes)
+POSTING_BYTES = 100
+
+
+def _process_rss() -> int:
+    """
+    Resident memory proses saat ini (bytes), 0 jika tidak bisa dibaca
+    Di luar Linux memakai peak RSS dari getrusage
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+    except ImportError:
+        return 0
+
+
+class RetrievalCache:
+    """
+    LRU cache hasil retrieve_context
+    Key: token query (dinormalisasi) + topik + level + top_k
+    Entry hanya valid untuk index_version saat disimpan
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (version, results, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def _estimate_size(results: List[Dict[str, Any]]) -> int:
+        return 256 + sum(len(result['text']) + 256 for result in results)
+    
+    def get(self, key: tuple, version: int):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(result) for result in entry[1]]
+    
+    def put(self, key: tuple, version: int, results: List[Dict[str, Any]]):
+        size = self._estimate_size(results)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, [dict(result) for result in results], size)
+            self.bytes += size
+            
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _drop(self, key: tuple):
+        self.bytes -= self._entries.pop(key)[2]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class PartitionMatrix:
+    """
+    Term-document matrix satu partisi dalam format CSR (NumPy)
+    Baris = term, kolom = posisi chunk (urut chunk_id), data = tf
+    Bobot BM25 dihitung saat query karena avgdl tergantung scope partisi
+    """
+    
+    def __init__(self, partition: 'IndexPartition'):
+        self.doc_ids = np.fromiter(partition.doc_lengths, dtype=np.int64, count=len(partition.doc_lengths))
+        self.doc_ids.sort()
+        self.doc_lengths = np.array([partition.doc_lengths[int(i)] for i in self.doc_ids], dtype=np.float64)
+        
+        if hasattr(partition.postings, 'csr'):
+            # Snapshot sudah menyimpan postings dalam CSR
+            terms, indptr, docs, tfs = partition.postings.csr()
+            indptr = np.frombuffer(indptr, dtype=np.uint32).astype(np.int64)
+            cols = np.searchsorted(self.doc_ids, np.frombuffer(docs, dtype=np.uint32))
+            data = np.frombuffer(tfs, dtype=np.uint32).astype(np.float64)
+        else:
+            terms = list(partition.postings)
+            indptr, chunk_ids, data = self._flatten(
+                partition.postings[term].items() for term in terms
+            )
+            cols = np.searchsorted(self.doc_ids, chunk_ids)
+        self.rows = {term: row for row, term in enumerate(terms)}
+        self.indptr, self.cols, self.tfs = self._sort_rows(indptr, cols, data)
+        
+        # Statistik per baris untuk upper bound MaxScore: tf maksimum dan panjang dokumen minimum
+        if len(self.tfs):
+            self.row_max_tf = np.maximum.reduceat(self.tfs, self.indptr[:-1])
+            self.row_min_dl = np.minimum.reduceat(self.doc_lengths[self.cols], self.indptr[:-1])
+        else:
+            self.row_max_tf = self.row_min_dl = np.zeros(0)
+        
+        title_terms = list(partition.title_postings)
+        title_indptr, title_ids, _ = self._flatten(
+            ((chunk_id, 1) for chunk_id in partition.title_postings[term]) for term in title_terms
+        )
+        self.title_rows = {term: row for row, term in enumerate(title_terms)}
+        self.title_indptr, self.title_cols, _ = self._sort_rows(
+            title_indptr, np.searchsorted(self.doc_ids, title_ids), np.ones(len(title_ids))
+        )
+        self.material_ids = None  # material_id per kolom, diisi saat search materi pertama
+    
+    @staticmethod
+    def _flatten(rows):
+        indptr = [0]
+        chunk_ids = []
+        data = []
+        for row in rows:
+            for chunk_id, value in row:
+                chunk_ids.append(chunk_id)
+                data.append(value)
+            indptr.append(len(chunk_ids))
+        return (
+            np.array(indptr, dtype=np.int64),
+            np.array(chunk_ids, dtype=np.int64),
+            np.array(data, dtype=np.float64)
+        )
+    
+    @staticmethod
+    def _sort_rows(indptr, cols, data):
+        """
+        Urutkan kolom di dalam tiap baris (dibutuhkan untuk slicing per blok)
+        """
+        row_of = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        order = np.lexsort((cols, row_of))
+        return indptr, cols[order], data[order]
+    
+    def row(self, term: str):
+        """
+        (cols, tfs) untuk satu term, atau None
+        """
+        row = self.rows.get(term)
+        if row is None:
+            return None
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.cols[start:end], self.tfs[start:end]
+    
+    def title_row(self, term: str):
+        row = self.title_rows.get(term)
+        if row is None:
+            return None
+        return self.title_cols[self.title_indptr[row]:self.title_indptr[row + 1]]
+    
+    def dense_block(self, terms: List[str], start: int, end: int):
+        """
+        Submatriks dense (tf, title) untuk term `terms` dan kolom [start, end)
+        """
+        tf_block = np.zeros((len(terms), end - start))
+        title_block = np.zeros((len(terms), end - start))
+        for position, term in enumerate(terms):
+            found = self.row(term)
+            if found is not None:
+                cols, tfs = found
+                lo, hi = np.searchsorted(cols, (start, end))
+                tf_block[position, cols[lo:hi] - start] = tfs[lo:hi]
+            title_cols = self.title_row(term)
+            if title_cols is not None:
+                lo, hi = np.searchsorted(title_cols, (start, end))
+                title_block[position, title_cols[lo:hi] - start] = 1.0
+        return tf_block, title_block
+
+
+class IndexPartition:
+    """
+    Inverted index untuk satu partisi (topik, level)
+    Statistik BM25 (jumlah chunk, panjang dokumen, df, IDF) dihitung per partisi
+    Partisi yang sudah dipublish (IndexState) tidak di-update lagi; update memakai copy()
+    """
+    
+    def __init__(self, key: tuple):
+        self.key = key
+        self.postings: Dict[str, Dict[int, int]] = {}  # term -> {chunk_id: tf}
+        self.title_postings: Dict[str, Set[int]] = {}  # term -> {chunk_id} yang judulnya memuat term
+        self.doc_lengths: Dict[int, int] = {}  # chunk_id -> jumlah token (urut chunk_id)
+        self.total_doc_length = 0
+        self.idf: Dict[str, float] = {}  # di-cache, dihitung ulang lazily setelah update
+        self._matrix = None  # PartitionMatrix, dibangun lazily saat query pertama
+        self._dense = None  # rag_dense.DenseIndex, dibangun lazily saat query dense pertama
+        self._copied = None  # (terms, title terms) yang sudah disalin dari partisi asal (None = milik sendiri)
+        
+        # Partisi dari snapshot: stub (katalog + statistik) yang postings-nya di-load ke partisi
+        # terpisah (resident) saat pertama dipakai; evict hanya melepas referensi itu
+        self.snapshot = None  # rag_snapshot.Snapshot sumber
+        self.snapshot_number = None  # posisi partisi di snapshot (None = index in-memory)
+        self.loaded = True  # False = stub snapshot
+        self.resident = None  # partisi hasil load (stub saja)
+        self.materials: List[int] = []  # material_id partisi (stub saja, untuk title postings)
+        self.base_bytes = 0  # estimasi memory postings/title_postings (di luar matrix & dense)
+    
+    @property
+    def doc_count(self) -> int:
+        return len(self.doc_lengths)
+    
+    @property
+    def avg_doc_length(self) -> float:
+        return (self.total_doc_length / self.doc_count) if self.doc_count else 0.0
+    
+    def _own(self, table: dict, term: str, copied: Set[str], empty):
+        """
+        Entry postings/title postings yang boleh diubah: entry yang masih dipakai bersama
+        partisi asal disalin dulu (copy-on-write per term)
+        """
+        entry = table.get(term)
+        if entry is None:
+            entry = table[term] = empty()
+        elif copied is not None and term not in copied:
+            entry = table[term] = empty(entry.items()) if empty is dict else empty(entry)
+        if copied is not None:
+            copied.add(term)
+        return entry
+    
+    def add_chunk(self, chunk_id: int, tokens: List[str], title_terms: Set[str]):
+        copied_terms, copied_titles = self._copied or (None, None)
+        self.doc_lengths[chunk_id] = len(tokens)
+        self.total_doc_length += len(tokens)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self._own(self.postings, term, copied_terms, dict)[chunk_id] = tf
+        for term in title_terms:
+            self._own(self.title_postings, term, copied_titles, set).add(chunk_id)
+        self.base_bytes += POSTING_BYTES * (len(counts) + len(title_terms) + 1)
+        self.idf = {}
+        self._matrix = None
+        self._dense = None
+    
+    def remove_chunk(self, chunk_id: int, terms: Set[str], title_terms: Set[str]):
+        copied_terms, copied_titles = self._copied or (None, None)
+        for term in terms:
+            if term in self.postings:
+                term_postings = self._own(self.postings, term, copied_terms, dict)
+                term_postings.pop(chunk_id, None)
+                if not term_postings:
+                    del self.postings[term]
+        
+        for term in title_terms:
+            if term in self.title_postings:
+                term_chunks = self._own(self.title_postings, term, copied_titles, set)
+                term_chunks.discard(chunk_id)
+                if not term_chunks:
+                    del self.title_postings[term]
+        
+        self.total_doc_length -= self.doc_lengths.pop(chunk_id)
+        self.base_bytes -= POSTING_BYTES * (len(terms) + len(title_terms) + 1)
+        self.idf = {}
+        self._matrix = None
+        self._dense = None
+    
+    def precompute_idf(self, idf_fn):
+        self.idf = {
+            term: idf_fn(len(term_postings), self.doc_count)
+            for term, term_postings in self.postings.items()
+        }
+    
+    def matrix(self) -> PartitionMatrix:
+        """
+        CSR term-document matrix, di-cache sampai partisi berubah
+        """
+        matrix = self._matrix
+        if matrix is None:
+            matrix = self._matrix = PartitionMatrix(self)
+        return matrix
+    
+    def copy(self) -> 'IndexPartition':
+        """
+        Partisi baru yang boleh di-update tanpa mengubah partisi ini (query lain masih memakainya)
+        Hanya dict term -> postings yang disalin; postings per term disalin saat term itu diubah,
+        postings read-only dari snapshot (mmap) ikut dipakai bersama sampai diubah
+        """
+        partition = IndexPartition(self.key)
+        partition.postings = {term: self.postings[term] for term in self.postings}
+        partition.title_postings = dict(self.title_postings)
+        partition.doc_lengths = dict(self.doc_lengths.items())
+        partition.total_doc_length = self.total_doc_length
+        partition.base_bytes = POSTING_BYTES * (
+            sum(len(term_postings) for term_postings in partition.postings.values())
+            + sum(len(chunk_ids) for chunk_ids in partition.title_postings.values())
+            + len(partition.doc_lengths)
+        )
+        partition._copied = (set(), set())
+        return partition
+    
+    def unload(self):
+        """
+        Buang struktur turunan (matrix, dense, IDF), dibangun ulang saat partisi dipakai lagi
+        Postings tetap (partisi snapshot di-evict dengan melepas stub.resident)
+        """
+        self._matrix = None
+        self._dense = None
+        self.idf = {}
+    
+    def memory_bytes(self) -> int:
+        """
+        Estimasi memory resident partisi (postings + matrix CSR + vektor dense)
+        """
+        total = self.base_bytes
+        matrix = self._matrix
+        if matrix is not None:
+            total += sum(
+                array.nbytes for array in vars(matrix).values() if hasattr(array, 'nbytes')
+            ) + 100 * (len(matrix.rows) + len(matrix.title_rows))
+        dense = self._dense
+        if dense is not None:
+            total += dense.memory_bytes()
+        return total
+
+
+class IndexState:
+    """
+    Satu versi index (partisi, chunk store, katalog materi) yang tidak diubah setelah dipublish
+    
+    Query mengambil referensi state sekali lalu scoring tanpa lock. Update membangun state baru
+    di samping lewat derive() (hanya partisi yang berubah yang disalin) lalu menukar referensinya.
+    """
+    
+    def __init__(self):
+        self.partitions: Dict[tuple, IndexPartition] = {}
+        self.chunks = ChunkStore()  # ChunkStore / SnapshotChunks / OverlayChunks
+        self.material_chunks: Dict[int, List[int]] = {}  # material_id -> [chunk_id]
+        self.material_meta: Dict[int, Dict[str, Any]] = {}  # material_id -> metadata
+        self.clusters: Dict[int, int] = {}  # chunk_id -> canonical (salinan DuplicateIndex.cluster_of)
+        self.snapshot = None  # menahan mmap selama partisi / chunk snapshot dipakai
+        self.dirty: Set[int] = set()  # material_id yang berubah sejak snapshot ditulis
+        self.version = 0  # naik setiap index berubah (monoton)
+        self.materials_version = None
+        self.index_stamp = None  # rag_index_state.version dari snapshot yang dipakai
+        self.next_chunk_id = 0
+        self.owned: Set[tuple] = set()  # partisi yang sudah disalin oleh update ini (belum dipublish)
+    
+    def derive(self) -> 'IndexState':
+        """
+        State baru untuk satu update: dict katalog disalin dangkal, partisi dipakai bersama
+        sampai diubah (RAGService._mutable_partition)
+        """
+        state = IndexState()
+        state.partitions = dict(self.partitions)
+        if isinstance(self.chunks, rag_snapshot.SnapshotChunks):
+            state.chunks = OverlayChunks(self.chunks)
+        else:
+            state.chunks = self.chunks.copy()
+        state.material_chunks = dict(self.material_chunks)
+        state.material_meta = dict(self.material_meta)
+        state.clusters = self.clusters
+        state.snapshot = self.snapshot
+        state.dirty = set(self.dirty)
+        state.version = self.version
+        state.materials_version = self.materials_version
+        state.index_stamp = self.index_stamp
+        state.next_chunk_id = self.next_chunk_id
+        return state
 
 
 class RAGService:
     """
-    Simple RAG implementation menggunakan TF-IDF
+    Simple RAG implementation menggunakan inverted index + BM25
+    Index dipartisi per (topik, level) supaya query ber-filter hanya menyentuh partisinya
     Tanpa dependency eksternal yang berat
     """
     
     def __init__(self):
         self.chunk_size = 500  # characters per chunk
         self.chunk_overlap = 100  # overlap untuk context continuity
+        self.chunk_max_length = 1000  # hard limit panjang chunk
+        self.chunk_strategy = os.getenv('RAG_CHUNK_STRATEGY', 'paragraph')  # paragraph / sentence / window
         self.top_k = 3  # Berapa chunk yang di-retrieve
+        self.analyzer = os.getenv('RAG_ANALYZER', 'indonesian')  # indonesian (stopword + stemming) / simple
+        if self.analyzer not in text_analysis.ANALYZERS:
+            print(f"⚠️  Unknown RAG_ANALYZER '{self.analyzer}', using indonesian")
+            self.analyzer = 'indonesian'
+        
+        # BM25 parameters
+        self.bm25_k1 = 1.5
+        self.bm25_b = 0.75
+        self.title_boost = 0.5  # Bonus per query token yang ada di judul
+        # MaxScore hanya menang di scope besar (±40k chunk ke atas, lihat _rank_maxscore);
+        # di bawahnya satu sparse scan NumPy atas semua chunk scope lebih cepat
+        self.maxscore_min_chunks = int(os.getenv('RAG_MAXSCORE_MIN_CHUNKS', '40000'))
+        
+        # Dense retrieval lokal (hashed char n-gram), dipakai di mode 'dense' / 'hybrid'
+        self.retrieval_mode = os.getenv('RAG_RETRIEVAL_MODE', 'lexical')
+        self.dense_weight = float(os.getenv('RAG_DENSE_WEIGHT', '2.0'))  # bobot cosine di mode hybrid
+        self.dense_min_similarity = float(os.getenv('RAG_DENSE_MIN_SIMILARITY', '0.15'))  # di bawah ini dianggap 0
+        self.dense_quantize = os.getenv('RAG_DENSE_INT8', 'False').lower() == 'true'
+        self.dense_encoder = rag_dense.HashingEncoder(dim=int(os.getenv('RAG_DENSE_DIM', '512'))) if rag_dense else None
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            print(f"⚠️  Unknown RAG_RETRIEVAL_MODE '{self.retrieval_mode}', using lexical")
+            self.retrieval_mode = 'lexical'
+        
+        # Near-duplicate chunk (MinHash/LSH): hasil retrieval maksimal satu chunk per cluster (0 = nonaktif)
+        self.dedup_threshold = float(os.getenv('RAG_DEDUP_THRESHOLD', '0.8'))
+        self.duplicates = rag_dedup.DuplicateIndex(self.dedup_threshold) if rag_dedup and self.dedup_threshold > 0 else None
         
-        # Cache untuk materials
-        self.materials_cache = []
-        self.chunks_cache = []
+        # Index aktif: partisi (topik, level) + chunk store compact (offset ke buffer teks per materi)
+        # Diganti utuh setiap update (copy-on-write), lihat IndexState
+        self._state = IndexState()
+        if self.duplicates:
+            # State awal dibangun in-place oleh builder offline (benchmark) sebelum dipakai query
+            self._state.clusters = self.duplicates.cluster_of
+        self.is_loaded = False
+        
+        # Snapshot on-disk (mmap) - dipakai ulang oleh worker lain / restart berikutnya
+        self.snapshot_path = os.getenv('RAG_SNAPSHOT_PATH', os.path.join('uploads', 'rag_index.snapshot'))
+        
+        # Mode shared (multi-worker): satu proses build/update snapshot (flock lockfile), worker lain
+        # hanya attach read-only dan re-attach saat versi di rag_index_state berubah
+        self.shared_index = os.getenv('RAG_SHARED_INDEX', 'False').lower() == 'true'
+        self.shared_poll_seconds = float(os.getenv('RAG_SHARED_POLL_SECONDS', '1.0'))  # 0 = cek setiap query
+        self._next_poll = 0.0
+        self._builder_mutex = threading.RLock()
+        self._builder_depth = 0
+        self._builder_file = None
+        
+        # Update incremental hanya mengubah index in-memory (overlay di atas snapshot mmap);
+        # snapshot ditulis ulang di background setelah update berhenti selama compact_delay detik
+        # (maksimal 10x compact_delay sejak update pertama yang belum tersimpan). 0 = tulis langsung
+        self.compact_delay = float(os.getenv('RAG_COMPACT_DELAY_SECONDS', '2.0'))
+        self._persist_lock = threading.RLock()  # satu penulis snapshot per proses, diambil SEBELUM _update_lock
+        self._persist_mutex = threading.Lock()
+        self._persist_timer = None
+        self._persist_deadline = None
+        self._flush_at_exit = False
+        
+        # Partisi snapshot di-load saat pertama dipakai; di atas budget, partisi LRU di-evict (0 = tanpa batas)
+        self.memory_budget = int(float(os.getenv('RAG_MEMORY_BUDGET_MB', '256')) * 1024 * 1024)
+        self._resident: 'OrderedDict[int, IndexPartition]' = OrderedDict()  # id(partisi) -> partisi, urut LRU
+        self.partition_loads = 0
+        self.partition_evictions = 0
+        
+        # Cache hasil retrieval, invalid otomatis saat index_version naik
+        self.result_cache = RetrievalCache(
+            max_entries=int(os.getenv('RAG_CACHE_MAX_ENTRIES', '1024')),
+            max_bytes=int(os.getenv('RAG_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+        )
+        
+        # Query hanya memegang _lock untuk mengambil referensi state (+ LRU partisi), scoring tanpa lock.
+        # Update (request handler, multi-thread) antri di _update_lock dan membangun state baru di samping
+        self._lock = threading.Lock()
+        self._update_lock = threading.RLock()
         # Don't load materials here - will be loaded on first use
     
-    def reload_materials(self):
+    @property
+    def chunks_cache(self):
+        return self._state.chunks
+    
+    @property
+    def partitions(self) -> Dict[tuple, IndexPartition]:
+        return self._state.partitions
+    
+    @property
+    def material_meta(self) -> Dict[int, Dict[str, Any]]:
+        return self._state.material_meta
+    
+    @property
+    def index_version(self) -> int:
+        return self._state.version
+    
+    def _current_state(self) -> IndexState:
+        with self._lock:
+            return self._state
+    
+    def _publish(self, state: IndexState):
         """
-        Reload materials dari database dan rebuild chunks
-        Panggil ini setiap kali ada update materi
+        Pakai state baru untuk query berikutnya (swap referensi atomic)
+        Query yang sedang berjalan tetap memakai state lamanya sampai selesai
+        Dipanggil dengan _update_lock dipegang
         """
-        print("🔄 Reloading teacher materials...")
+        state.owned = set()
+        if self.duplicates:
+            state.clusters = dict(self.duplicates.cluster_of)
+        live = {id(partition) for partition in state.partitions.values()}
+        with self._lock:
+            state.version = self._state.version + 1
+            self._state = state
+            # Partisi yang sudah tidak dipakai state baru keluar dari LRU (memory-nya ikut dilepas)
+            self._resident = OrderedDict(
+                (key, partition) for key, partition in self._resident.items() if key in live
+            )
+            self.is_loaded = True
+        # Hasil cache versi lama jadi basi (RetrievalCache mengecek versi)
+        self.result_cache.clear()
+    
+    def _index_params(self) -> Dict[str, Any]:
+        """
+        Parameter yang mempengaruhi isi index
+        Snapshot dengan parameter berbeda tidak boleh dipakai
+        """
+        return {
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'chunk_max_length': self.chunk_max_length,
+            'chunk_strategy': self.chunk_strategy,
+            'tokenizer': 'regex-w' if self.analyzer == 'simple' else 'id-stem-v2',
+            'extraction': 'pre-extracted',
+            'dedup': self.dedup_threshold if self.duplicates else None,
+        }
+    
+    def _materials_version(self) -> str:
+        """
+        Versi materi di DB (berubah setiap insert/update/delete materi)
+        """
+        count, id_sum, last_update = db.session.query(
+            db.func.count(TeacherMaterial.id),
+            db.func.coalesce(db.func.sum(TeacherMaterial.id), 0),
+            db.func.max(TeacherMaterial.updated_at)
+        ).one()
+        return f"{count}:{id_sum}:{last_update or ''}"
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Counter cache retrieval (hit/miss/eviction) + ukuran saat ini
+        """
+        stats = self.result_cache.stats()
+        stats['index_version'] = self.index_version
+        stats['analyzer'] = text_analysis.cache_info()
+        return stats
+    
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """
+        Estimasi memory index di worker ini (chunk store + postings) dan RSS proses
+        Index dari snapshot: total_bytes = partisi resident + bagian file yang di-mmap
+        """
+        state = self._current_state()
+        with self._lock:
+            resident = [self._resident_partition(partition) for partition in self._resident.values()]
+            resident_bytes = sum(partition.memory_bytes() for partition in resident if partition is not None)
         
-        # Get all materials from database
-        self.materials_cache = TeacherMaterial.query.all()
+        chunks = state.chunks
+        if isinstance(chunks, ChunkStore):
+            stats = chunks.memory_stats()
+        elif state.snapshot is not None:
+            stats = state.snapshot.memory_stats()
+            stats['total_bytes'] = resident_bytes + stats['mapped_bytes'] + stats['metadata_bytes']
+            if isinstance(chunks, OverlayChunks):
+                # Materi yang di-index sejak snapshot ditulis (buffer teks di heap)
+                stats['overlay'] = chunks.added.memory_stats()
+                stats['total_bytes'] += stats['overlay']['total_bytes']
+        else:
+            stats = {'materials': len(state.material_meta), 'chunks': len(chunks), 'total_bytes': resident_bytes}
+        live_chunks = sum(p.doc_count for p in state.partitions.values())
+        partitions = [self._resident_partition(p) for p in state.partitions.values()]
+        stats['snapshot_backed'] = state.snapshot is not None
+        stats['shared_index'] = {'enabled': self.shared_index, 'index_stamp': state.index_stamp}
+        stats['partitions'] = len(state.partitions)
+        stats['postings'] = sum(len(p.postings) for p in partitions if p is not None)
+        stats['partition_cache'] = {
+            'resident_partitions': len(resident),
+            'resident_bytes': resident_bytes,
+            'budget_bytes': self.memory_budget,
+            'loads': self.partition_loads,
+            'evictions': self.partition_evictions
+        }
+        stats['dense_bytes'] = sum(p._dense.memory_bytes() for p in partitions if p is not None and p._dense is not None)
+        stats['dedup'] = self.duplicates.stats(live_chunks) if self.duplicates else None
+        stats['process_rss_bytes'] = _process_rss()
+        return stats
+    
+    def _partition_key(self, metadata: Dict[str, Any]) -> tuple:
+        return (metadata['topik'], metadata['level'])
+    
+    def _ensure_loaded(self):
+        """
+        Lazy load saat pertama dipakai:
+        pakai snapshot on-disk jika versinya sama dengan DB, selain itu rebuild
+        Mode shared: hanya pemegang lockfile yang rebuild, worker lain menunggu lalu attach ke snapshot-nya
+        """
+        if self.is_loaded:
+            if self.shared_index:
+                self._poll_shared()
+            return
         
-        # Build chunks
-        self.chunks_cache = []
-        for material in self.materials_cache:
-            # Extract text content from material
-            text_content = self._extract_content(material)
-            
-            if text_content:
-                chunks = self._chunk_text(
-                    text=text_content,
-                    metadata={
-                        'material_id': material.id,
-                        'judul': material.judul,
-                        'topik': material.topik,
-                        'level': material.level,
-                        'created_by': material.created_by,
-                        'source': 'file' if material.file_path else 'text'
-                    }
-                )
-                self.chunks_cache.extend(chunks)
-        
-        print(f"✅ Loaded {len(self.materials_cache)} materials, {len(self.chunks_cache)} chunks")
+        with self._builder(), self._persist_lock:
+            with self._update_lock:
+                if self.is_loaded:
+                    return
+                if not self._load_snapshot():
+                    self.reload_materials()
     
-    def _extract_content(self, material: TeacherMaterial) -> str:
+    @contextmanager
+    def _builder(self):
         """
-        Extract text content from material (file or konten field)
+        Mode shared: satu proses saja yang build / update snapshot pada satu waktu (flock lockfile
+        di sebelah snapshot). Reentrant di thread yang sama; selalu diambil SEBELUM self._update_lock
         """
-        # If material has a file, try to extract content from it
-        if material.file_path and os.path.exists(material.file_path):
+        if not self.shared_index or fcntl is None:
+            yield
+            return
+        
+        with self._builder_mutex:
+            if self._builder_depth == 0:
+                self._builder_file = open(self.snapshot_path + '.lock', 'a+')
+                fcntl.flock(self._builder_file, fcntl.LOCK_EX)
+            self._builder_depth += 1
             try:
-                file_type = material.file_type or ''
+                yield
+            finally:
+                self._builder_depth -= 1
+                if self._builder_depth == 0:
+                    fcntl.flock(self._builder_file, fcntl.LOCK_UN)
+                    self._builder_file.close()
+                    self._builder_file = None
+    
+    def _read_stamp(self) -> int:
+        """
+        Versi index bersama di DB (0 jika belum pernah ada snapshot yang diumumkan)
+        Koneksi terpisah supaya tidak ikut transaksi request
+        """
+        with db.engine.connect() as connection:
+            version = connection.execute(
+                db.select(RagIndexState.version).where(RagIndexState.id == 1)
+            ).scalar()
+        return version or 0
+    
+    def _publish_stamp(self, version: int, materials_version: str):
+        """
+        Umumkan snapshot baru ke worker lain (dipanggil saat memegang lockfile)
+        """
+        with db.engine.begin() as connection:
+            values = {'version': version, 'materials_version': materials_version}
+            updated = connection.execute(
+                db.update(RagIndexState).where(RagIndexState.id == 1).values(**values)
+            ).rowcount
+            if not updated:
+                connection.execute(db.insert(RagIndexState).values(id=1, **values))
+    
+    def _poll_shared(self, force: bool = False):
+        """
+        Cek versi index bersama (maksimal sekali per shared_poll_seconds), re-attach jika ada snapshot baru
+        """
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return
+        self._next_poll = now + self.shared_poll_seconds
+        
+        try:
+            stamp = self._read_stamp()
+        except Exception as e:
+            print(f"⚠️  Failed to read RAG index version: {e}")
+            return
+        if stamp <= (self._state.index_stamp or 0) or self._state.dirty:
+            # Update lokal yang belum tersimpan di-rebase ke snapshot terbaru saat persist (_rebase_shared)
+            return
+        
+        # Query tidak ikut menunggu update yang sedang berjalan: attach dicoba lagi di poll berikutnya
+        if not self._update_lock.acquire(blocking=force):
+            return
+        try:
+            if stamp <= (self._state.index_stamp or 0) or self._state.dirty:
+                return
+            snapshot = rag_snapshot.load_snapshot(self.snapshot_path)
+            if snapshot is None or snapshot.meta.get('index_params') != self._index_params() \
+                    or (snapshot.meta.get('index_stamp') or 0) < stamp:
+                print(f"⚠️  RAG snapshot for index version {stamp} not available, keeping version {self._state.index_stamp}")
+                return
+            self._attach_snapshot(snapshot, snapshot.meta.get('materials_version'))
+            print(f"🔄 Attached RAG snapshot version {self._state.index_stamp}: {len(self._state.material_meta)} materials")
+        finally:
+            self._update_lock.release()
+    
+    def _schedule_persist(self):
+        """
+        Tulis snapshot di background setelah update berhenti selama compact_delay detik
+        Update beruntun cukup menulis snapshot sekali; request tidak menunggu penulisan snapshot
+        """
+        if self.compact_delay <= 0:
+            self._persist()
+            return
+        
+        app = current_app._get_current_object()
+        with self._persist_mutex:
+            if not self._flush_at_exit:
+                # Update yang belum tersimpan ikut ditulis saat proses berhenti (tanpa itu: rebuild saat start)
+                atexit.register(self.flush)
+                self._flush_at_exit = True
+            now = time.monotonic()
+            if self._persist_deadline is None:
+                self._persist_deadline = now + self.compact_delay * 10
+            if self._persist_timer is not None:
+                self._persist_timer.cancel()
+            self._persist_timer = threading.Timer(
+                max(0.0, min(self.compact_delay, self._persist_deadline - now)), self._run_persist, args=(app,)
+            )
+            self._persist_timer.daemon = True
+            self._persist_timer.start()
+    
+    def _run_persist(self, app):
+        with self._builder(), self._persist_lock:
+            with self._persist_mutex:
+                self._persist_timer = None
+                self._persist_deadline = None
+            with app.app_context():
+                try:
+                    self._persist()
+                except Exception as e:
+                    print(f"⚠️  Failed to persist RAG index: {e}")
+                finally:
+                    db.session.remove()
+    
+    def flush(self):
+        """
+        Tulis sekarang update yang masih menunggu penulisan snapshot di background (test / shutdown)
+        Penulisan yang sedang berjalan ditunggu sampai selesai
+        """
+        with self._persist_mutex:
+            timer = self._persist_timer
+            self._persist_timer = None
+            self._persist_deadline = None
+        if timer is not None:
+            timer.cancel()
+            self._run_persist(*timer.args)
+            return
+        with self._persist_lock:
+            pass
+    
+    def _persist(self):
+        """
+        Tulis snapshot, umumkan versinya (mode shared), lalu pakai lagi lewat mmap
+        State + signature dedup diambil di bawah _update_lock, penulisan file tanpa _update_lock
+        (update berikutnya tidak menunggu; snapshot hanya dipakai jika index belum berubah lagi)
+        """
+        with self._builder(), self._persist_lock:
+            with self._update_lock:
+                if self.shared_index:
+                    self._rebase_shared()
+                state = self._state
+                if state.snapshot is not None and not state.dirty:
+                    return
+                signatures = self._signature_rows(state)
+            
+            index_stamp = state.index_stamp
+            if self.shared_index:
+                try:
+                    index_stamp = self._read_stamp() + 1
+                except Exception as e:
+                    print(f"⚠️  Failed to read RAG index version: {e}")
+                    index_stamp = None
+            
+            if not self.save_snapshot(state, index_stamp, signatures):
+                return
+            if self.shared_index and index_stamp is not None:
+                try:
+                    self._publish_stamp(index_stamp, state.materials_version)
+                except Exception as e:
+                    print(f"⚠️  Failed to publish RAG index version: {e}")
+            self._reattach_snapshot(state)
+    
+    def _rebase_shared(self):
+        """
+        Mode shared: worker lain sudah mengumumkan snapshot yang lebih baru dari dasar update lokal.
+        Update lokal yang belum tersimpan diulang (dari DB) di atas snapshot itu sebelum ditulis,
+        supaya perubahan worker lain tidak tertimpa. Dipanggil dengan lockfile + _update_lock dipegang
+        """
+        state = self._state
+        if not state.dirty:
+            return
+        try:
+            stamp = self._read_stamp()
+        except Exception as e:
+            print(f"⚠️  Failed to read RAG index version: {e}")
+            return
+        if stamp <= (state.index_stamp or 0):
+            return
+        
+        snapshot = rag_snapshot.load_snapshot(self.snapshot_path)
+        if snapshot is None or snapshot.meta.get('index_params') != self._index_params() \
+                or (snapshot.meta.get('index_stamp') or 0) < stamp:
+            print(f"⚠️  RAG snapshot for index version {stamp} not available, keeping version {state.index_stamp}")
+            return
+        
+        update = self._snapshot_state(snapshot, snapshot.meta.get('materials_version')).derive()
+        for material_id in state.dirty:
+            self._remove_material_chunks(material_id, update)
+            material = TeacherMaterial.query.get(material_id)
+            if material is not None:
+                self._index_material(material, update)
+            update.dirty.add(material_id)
+        update.materials_version = self._materials_version()
+        self._publish(update)
+        print(f"🔄 Rebased {len(state.dirty)} RAG index updates onto snapshot version {update.index_stamp}")
+    
+    def _load_snapshot(self) -> bool:
+        """
+        mmap snapshot read-only; False jika tidak ada atau sudah basi
+        """
+        snapshot = rag_snapshot.load_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return False
+        
+        version = self._materials_version()
+        if snapshot.meta.get('materials_version') != version or snapshot.meta.get('index_params') != self._index_params():
+            print("ℹ️  RAG snapshot is stale, rebuilding index")
+            return False
+        
+        self._attach_snapshot(snapshot, version)
+        state = self._state
+        print(f"✅ Loaded RAG snapshot: {len(state.material_meta)} materials, {len(state.chunks)} chunks, {len(state.partitions)} partitions")
+        return True
+    
+    def _attach_snapshot(self, snapshot, version: str):
+        """
+        Pakai snapshot sebagai index: hanya katalog materi + statistik partisi yang dibaca di sini,
+        postings tiap partisi di-load saat partisi pertama kali dipakai (_use_partitions)
+        """
+        with self._update_lock:
+            self._publish(self._snapshot_state(snapshot, version))
+    
+    def _snapshot_state(self, snapshot, version: str) -> IndexState:
+        """
+        State (belum dipublish) yang dilayani langsung dari snapshot; dedup ikut di-load dari snapshot
+        Dipanggil dengan _update_lock dipegang
+        """
+        state = IndexState()
+        state.snapshot = snapshot
+        state.chunks = snapshot.chunks
+        state.next_chunk_id = len(snapshot.chunks)
+        
+        for number, stored in enumerate(snapshot.partitions):
+            partition = IndexPartition(stored['key'])
+            partition.doc_lengths = stored['doc_lengths']
+            partition.total_doc_length = stored['total_doc_length']
+            partition.snapshot = snapshot
+            partition.snapshot_number = number
+            partition.loaded = False
+            state.partitions[partition.key] = partition
+        
+        for position, material in enumerate(snapshot.materials):
+            metadata = snapshot.chunks.material_metadata(position)
+            state.material_chunks[material['material_id']] = range(material['chunk_start'], material['chunk_end'])
+            state.material_meta[material['material_id']] = metadata
+            partition = state.partitions.get(self._partition_key(metadata))
+            if partition is not None:
+                partition.materials.append(material['material_id'])
+        
+        if self.duplicates:
+            signatures = snapshot.section('minhash')
+            self.duplicates.load(
+                np.frombuffer(signatures, dtype=np.uint32).reshape(-1, rag_dedup.NUM_PERM),
+                snapshot.meta.get('duplicates', [])
+            )
+        
+        state.materials_version = version
+        state.index_stamp = snapshot.meta.get('index_stamp')
+        return state
+    
+    def _reattach_snapshot(self, state: IndexState):
+        """
+        Setelah snapshot `state` ditulis: pakai lagi lewat mmap supaya index in-memory (seluruh library)
+        dilepas dan partisi kembali di-load sesuai pemakaian
+        Tidak dilakukan jika index sudah berubah lagi sejak state itu (snapshot-nya sudah basi)
+        """
+        snapshot = rag_snapshot.load_snapshot(self.snapshot_path)
+        with self._update_lock:
+            if snapshot is None or self._state is not state \
+                    or snapshot.meta.get('materials_version') != state.materials_version \
+                    or snapshot.meta.get('index_params') != self._index_params():
+                return
+            self._attach_snapshot(snapshot, state.materials_version)
+    
+    @staticmethod
+    def _resident_partition(partition: IndexPartition):
+        """
+        Partisi dengan postings ter-load (stub snapshot: hasil load-nya, None jika belum/sudah di-evict)
+        """
+        return partition if partition.loaded else partition.resident
+    
+    def _load_partition(self, state: IndexState, partition: IndexPartition) -> IndexPartition:
+        """
+        Load postings + title postings satu partisi snapshot ke objek partisi baru
+        Stub tidak diubah di sini, jadi query lain yang sedang memakai partisi ini tidak terganggu
+        """
+        resident = IndexPartition(partition.key)
+        resident.postings = partition.snapshot.partition_postings(partition.snapshot_number)
+        resident.doc_lengths = partition.doc_lengths
+        resident.total_doc_length = partition.total_doc_length
+        resident.snapshot = partition.snapshot
+        resident.snapshot_number = partition.snapshot_number
+        
+        title_entries = 0
+        for material_id in partition.materials:
+            chunk_ids = state.material_chunks.get(material_id)
+            if not chunk_ids:
+                continue
+            for term in set(self._tokenize(state.material_meta[material_id]['judul'])):
+                resident.title_postings.setdefault(term, set()).update(chunk_ids)
+                title_entries += len(chunk_ids)
+        
+        resident.base_bytes = (
+            partition.snapshot.partition_bytes(partition.snapshot_number)
+            + POSTING_BYTES * (len(resident.postings) + title_entries)
+        )
+        return resident
+    
+    def _use_partitions(self, state: IndexState, partitions: List[IndexPartition]) -> List[IndexPartition]:
+        """
+        Partisi resident (postings ter-load) untuk partisi yang akan di-score, tandai paling baru dipakai (LRU)
+        Load dilakukan di luar lock; dua query yang me-load partisi yang sama bersamaan hanya membuang kerja
+        """
+        resident = []
+        loads = 0
+        for partition in partitions:
+            loaded = self._resident_partition(partition)
+            if loaded is None:
+                loaded = partition.resident = self._load_partition(state, partition)
+                loads += 1
+            resident.append(loaded)
+        
+        with self._lock:
+            self.partition_loads += loads
+            for partition in partitions:
+                self._resident[id(partition)] = partition
+                self._resident.move_to_end(id(partition))
+        return resident
+    
+    def _release_partitions(self):
+        """
+        Evict partisi least-recently-used sampai estimasi memory <= memory_budget
+        Dipanggil di akhir query (scoring sudah selesai); partisi query ini ada di ujung LRU
+        sehingga paling akhir di-evict. Evict hanya melepas referensi / cache turunan: query lain
+        yang masih memegang partisi itu tetap bisa memakainya
+        """
+        if self.memory_budget <= 0:
+            return
+        
+        with self._lock:
+            resident = sum(
+                loaded.memory_bytes() for loaded in map(self._resident_partition, self._resident.values())
+                if loaded is not None
+            )
+            for key in list(self._resident):
+                if resident <= self.memory_budget:
+                    break
                 
-                # Extract text from TXT files
-                if file_type == 'txt':
-                    with open(material.file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    print(f"  ✅ Extracted text from {material.file_name} ({len(content)} chars)")
-                    return content
+                partition = self._resident.pop(key)
+                loaded = self._resident_partition(partition)
+                if loaded is None:
+                    continue
+                resident -= loaded.memory_bytes()
+                if partition.loaded:
+                    partition.unload()
+                    resident += partition.memory_bytes()  # partisi in-memory: postings tetap resident
+                else:
+                    partition.resident = None
+                    partition.snapshot.release_partition(partition.snapshot_number)
+                self.partition_evictions += 1
+    
+    def _mutable_partition(self, state: IndexState, key: tuple) -> IndexPartition:
+        """
+        Partisi `key` yang boleh di-update di state yang sedang dibangun
+        Partisi yang masih dipakai state lama disalin dulu (stub snapshot di-load), partisi lain tidak disentuh
+        """
+        partition = state.partitions.get(key)
+        if partition is not None and key in state.owned:
+            return partition
+        
+        if partition is None:
+            partition = IndexPartition(key)
+        else:
+            source = self._resident_partition(partition) or self._load_partition(state, partition)
+            partition = source.copy()
+        state.partitions[key] = partition
+        state.owned.add(key)
+        return partition
+    
+    def _snapshot_layout(self, state: IndexState) -> Dict[tuple, List[int]]:
+        """
+        Urutan materi di snapshot: dikelompokkan per partisi (key -> [material_id])
+        """
+        materials_by_partition = {}
+        for material_id, metadata in state.material_meta.items():
+            materials_by_partition.setdefault(self._partition_key(metadata), []).append(material_id)
+        return materials_by_partition
+    
+    def _signature_rows(self, state: IndexState) -> bytes:
+        """
+        Signature dedup chunk `state` dalam urutan snapshot
+        DuplicateIndex ikut berubah oleh update berikutnya, jadi dipanggil dengan _update_lock dipegang
+        """
+        if not self.duplicates:
+            return None
+        chunk_ids = [
+            chunk_id
+            for material_ids in self._snapshot_layout(state).values()
+            for material_id in material_ids
+            for chunk_id in state.material_chunks[material_id]
+        ]
+        return self.duplicates.signature_rows(chunk_ids)
+    
+    def save_snapshot(self, state: IndexState = None, index_stamp: int = None, signatures: bytes = None) -> bool:
+        """
+        Tulis index (default: state saat ini) ke disk supaya worker lain / restart tidak perlu rebuild
+        Chunk id dipadatkan ulang menjadi 0..n-1, dikelompokkan per partisi lalu per materi
+        State tidak pernah diubah setelah dipublish, jadi tidak perlu lock selain untuk signature dedup
+        (`signatures` dari _signature_rows jika sudah diambil bersama state-nya)
+        
+        Returns:
+            True jika snapshot berhasil ditulis
+        """
+        state = state or self._current_state()
+        if index_stamp is None:
+            index_stamp = state.index_stamp
+        if state.snapshot is not None and not state.dirty:
+            # Index saat ini = snapshot yang di-mmap (belum diubah sejak di-load)
+            return state.snapshot.path == self.snapshot_path
+        
+        materials = []
+        material_texts = []
+        chunk_spans = []
+        chunk_materials = []
+        doc_lengths = []
+        partitions = []
+        id_map = {}
+        
+        for key, material_ids in self._snapshot_layout(state).items():
+            partition = state.partitions.get(key)
+            partition_start = len(chunk_spans)
+            for material_id in material_ids:
+                record = dict(state.material_meta[material_id])
+                record['chunk_start'] = len(chunk_spans)
+                for chunk_id in state.material_chunks[material_id]:
+                    id_map[chunk_id] = len(chunk_spans)
+                    chunk_spans.append(state.chunks.span(chunk_id))
+                    chunk_materials.append(len(materials))
+                    doc_lengths.append(partition.doc_lengths[chunk_id])
+                record['chunk_end'] = len(chunk_spans)
+                materials.append(record)
+                material_texts.append(state.chunks.material_text(material_id))
+            
+            if partition is None or not partition.doc_count:
+                continue
+            postings = (self._resident_partition(partition) or self._load_partition(state, partition)).postings
+            partitions.append({
+                'key': list(key),
+                'chunk_start': partition_start,
+                'chunk_end': len(chunk_spans),
+                'total_doc_length': partition.total_doc_length,
+                'postings': [
+                    (term, sorted((id_map[chunk_id], tf) for chunk_id, tf in postings[term].items()))
+                    for term in postings
+                ]
+            })
+        
+        meta = {
+            'materials_version': state.materials_version,
+            'index_params': self._index_params(),
+            'index_stamp': index_stamp,
+        }
+        extra_sections = {}
+        if self.duplicates:
+            if signatures is None:
+                with self._update_lock:
+                    signatures = self._signature_rows(state)
+            extra_sections['minhash'] = signatures
+            meta['duplicates'] = [
+                [id_map[chunk_id], id_map[canonical]] for chunk_id, canonical in state.clusters.items()
+            ]
+        
+        try:
+            rag_snapshot.write_snapshot(
+                self.snapshot_path, meta, materials, material_texts,
+                chunk_spans, chunk_materials, doc_lengths, partitions, extra_sections
+            )
+            print(f"💾 RAG snapshot saved: {self.snapshot_path}")
+            return True
+        except OSError as e:
+            print(f"⚠️  Failed to save RAG snapshot: {e}")
+            return False
+    
+    def reload_materials(self):
+        """
+        Reload materials dari database dan rebuild chunks + index
+        Index baru dibangun di samping; query tetap dilayani index lama sampai index baru dipublish
+        Untuk update satu materi gunakan add_material/replace_material/remove_material
+        """
+        with self._builder():
+            print("🔄 Reloading teacher materials...")
+            
+            # Get all materials from database (urut partisi supaya chunk satu partisi berdekatan)
+            version = self._materials_version()
+            materials = TeacherMaterial.query.options(
+                db.joinedload(TeacherMaterial.extracted_text)
+            ).order_by(TeacherMaterial.topik, TeacherMaterial.level, TeacherMaterial.id).all()
+            
+            with self._update_lock:
+                state = IndexState()
+                if self.duplicates:
+                    self.duplicates.clear()
                 
-                # Extract text from PDF files
-                elif file_type == 'pdf':
-                    try:
-                        import PyPDF2
-                        with open(material.file_path, 'rb') as f:
-                            pdf_reader = PyPDF2.PdfReader(f)
-                            content = ''
-                            for page in pdf_reader.pages:
-                                content += page.extract_text() + '\n\n'
-                        print(f"  ✅ Extracted text from PDF {material.file_name} ({len(content)} chars)")
-                        return content
-                    except ImportError:
-                        print(f"  ⚠️  PyPDF2 not installed, cannot read PDF: {material.file_name}")
-                        return material.konten or ''
-                    except Exception as e:
-                        print(f"  ❌ Failed to extract PDF {material.file_name}: {e}")
-                        return material.konten or ''
+                for material in materials:
+                    self._index_material(material, state)
+                # ORM object (konten, extracted_text) tidak disimpan setelah indexing
+                del materials
                 
-                # For DOC/DOCX/PPT/PPTX, fall back to konten if available
-                else:
-                    print(f"  ⚠️  Cannot extract text from {file_type} file: {material.file_name}")
-                    return material.konten or ''
-                    
-            except Exception as e:
-                print(f"  ❌ Error reading file {material.file_path}: {e}")
-                return material.konten or ''
+                # Precompute IDF per partisi
+                for partition in state.partitions.values():
+                    partition.precompute_idf(self._bm25_idf)
+                
+                state.materials_version = version
+                self._publish(state)
+            
+            print(f"✅ Loaded {len(state.material_meta)} materials, {len(state.chunks)} chunks, {len(state.partitions)} partitions")
+            self._persist()
+    
+    def _prepare_update(self) -> bool:
+        """
+        Sebelum update incremental: False jika index belum pernah di-load di worker ini
+        Mode shared: worker lain mungkin sudah memakai index, jadi index di-load (rebuild jika
+        snapshot basi, sekaligus diumumkan) dan update dilakukan di atas snapshot versi terbaru
+        """
+        if not self.is_loaded:
+            if self.shared_index:
+                self._ensure_loaded()
+            # Index belum pernah dibangun - materi ikut ter-load saat retrieval pertama
+            return False
+        if self.shared_index:
+            self._poll_shared(force=True)
+        return True
+    
+    def add_material(self, material: TeacherMaterial):
+        """
+        Index satu materi baru tanpa rebuild seluruh corpus
+        Hanya partisi (topik, level) materi tersebut yang disalin dan berubah; chunk snapshot tetap
+        di mmap (overlay), snapshot ditulis ulang di background (_schedule_persist)
+        """
+        if not self._prepare_update():
+            return
+        
+        with self._update_lock:
+            update = self._state.derive()
+            self._remove_material_chunks(material.id, update)
+            chunk_count = self._index_material(material, update)
+            update.dirty.add(material.id)
+            update.materials_version = self._materials_version()
+            self._publish(update)
+        
+        print(f"✅ Indexed material {material.id}: {chunk_count} chunks")
+        self._schedule_persist()
+    
+    def replace_material(self, material: TeacherMaterial):
+        """
+        Re-index satu materi setelah di-update
+        """
+        self.add_material(material)
+    
+    def remove_material(self, material_id: int):
+        """
+        Hapus semua chunk milik satu materi dari index
+        """
+        if not self._prepare_update():
+            return
+        
+        with self._update_lock:
+            update = self._state.derive()
+            removed = self._remove_material_chunks(material_id, update)
+            update.dirty.add(material_id)
+            update.materials_version = self._materials_version()
+            self._publish(update)
+        
+        print(f"🗑️  Removed material {material_id} from index: {removed} chunks")
+        self._schedule_persist()
+    
+    def _index_material(self, material: TeacherMaterial, state: IndexState = None) -> int:
+        """
+        Chunk + tokenisasi satu materi dan masukkan ke partisinya di `state`
+        Tokenisasi dilakukan SEKALI di sini, bukan setiap query
+        Hanya metadata + buffer teks yang disimpan, bukan ORM object-nya
+        """
+        if state is None:
+            # Builder offline (benchmark): state awal di-update in-place sebelum dipakai query
+            state = self._state
+        
+        metadata = intern_metadata({
+            'material_id': material.id,
+            'judul': material.judul,
+            'topik': material.topik,
+            'level': material.level,
+            'created_by': material.created_by,
+            'source': 'file' if material.file_path else 'text'
+        })
+        state.material_meta[material.id] = metadata
+        state.material_chunks[material.id] = []
+        
+        # Extract text content from material
+        text_content = self._extract_content(material)
+        if not text_content:
+            return 0
+        
+        buffer, chunks = self._chunk_text(text_content)
+        
+        key = self._partition_key(metadata)
+        partition = None
+        
+        # Title-term set cukup dihitung sekali per material
+        title_terms = set(self._tokenize(material.judul))
+        chunk_ids = state.material_chunks[material.id]
+        spans = []
+        
+        for start, end in chunks:
+            if partition is None:
+                partition = self._mutable_partition(state, key)
+            
+            spans.append((start, end))
+            chunk_id = state.next_chunk_id
+            state.next_chunk_id += 1
+            chunk_ids.append(chunk_id)
+            tokens = self._tokenize(buffer[start:end])
+            partition.add_chunk(chunk_id, tokens, title_terms)
+            if self.duplicates:
+                self.duplicates.add(chunk_id, tokens)
+        
+        if not spans:
+            return 0
+        
+        state.chunks.add_material(
+            material.id, metadata, buffer,
+            ((chunk_id, start, end) for chunk_id, (start, end) in zip(chunk_ids, spans))
+        )
+        return len(chunk_ids)
+    
+    def _remove_material_chunks(self, material_id: int, state: IndexState) -> int:
+        """
+        Hapus chunk satu materi dari chunk store dan partisinya di `state`
+        """
+        metadata = state.material_meta.pop(material_id, None)
+        chunk_ids = state.material_chunks.pop(material_id, [])
+        if metadata is None or not chunk_ids:
+            return 0
+        
+        key = self._partition_key(metadata)
+        partition = self._mutable_partition(state, key)
+        title_terms = set(self._tokenize(metadata['judul']))
+        
+        for chunk_id in chunk_ids:
+            partition.remove_chunk(chunk_id, set(self._tokenize(state.chunks.text(chunk_id))), title_terms)
+            if self.duplicates:
+                self.duplicates.remove(chunk_id)
+        state.chunks.remove_material(material_id, chunk_ids)
+        
+        if not partition.doc_count:
+            del state.partitions[key]
+        
+        return len(chunk_ids)
+    
+    def _extract_content(self, material: TeacherMaterial) -> str:
+        """
+        Text content dari material (teks file yang sudah diekstrak atau konten field)
+        Parsing file TIDAK dilakukan di sini - lihat extraction_service
+        """
+        if material.file_path:
+            extracted = material.extracted_text
+            if extracted is not None:
+                return extracted.text
+            
+            if material.extraction_status != 'failed':
+                print(f"  ⏳ Text of {material.file_name} is not extracted yet (status: {material.extraction_status})")
         
         # Fall back to konten field (for old text-based materials)
         return material.konten or ''
     
-    def _chunk_text(self, text: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _chunk_text(self, text: str) -> tuple:
+        """
+        Memecah text panjang menjadi chunks kecil (lihat app/chunking.py)
+        
+        Returns:
+            (buffer, chunks) - teks materi (paragraf dinormalisasi) dan generator
+            (start, end) tiap chunk sebagai offset ke buffer tersebut
+        """
+        buffer = normalize_text(text)
+        chunks = iter_chunks(
+            buffer,
+            strategy=self.chunk_strategy,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            max_length=self.chunk_max_length
+        )
+        return buffer, chunks
+    
+    def _tokenize(self, text: str) -> List[str]:
+        """
+        Tokenization: lowercase + split by non-alphanumeric,
+        lalu (analyzer 'indonesian') buang stopword dan stem imbuhan
+        """
+        return text_analysis.analyze(text, self.analyzer)
+    
+    def _bm25_idf(self, doc_freq: int, total_docs: int) -> float:
+        """
+        BM25 IDF (selalu positif)
+        """
+        return math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+    
+    def _select_partitions(self, state: IndexState, topik: str = None, level: str = None) -> List[IndexPartition]:
+        """
+        Pilih partisi `state` untuk filter topik/level
+        
+        Widening bertahap jika partisi kosong:
+        (topik, level) -> topik di semua level -> global
+        """
+        topik = topik.lower() if topik else None
+        level = level.lower() if level else None
+        
+        if topik and level:
+            partition = state.partitions.get((topik, level))
+            if partition is not None and partition.doc_count:
+                return [partition]
+        
+        if topik:
+            selected = [p for key, p in state.partitions.items() if key[0] == topik and p.doc_count]
+        elif level:
+            selected = [p for key, p in state.partitions.items() if key[1] == level and p.doc_count]
+        else:
+            selected = []
+        
+        if selected:
+            return selected
+        
+        # No matching chunks, use all
+        return [p for p in state.partitions.values() if p.doc_count]
+    
+    def _scope_stats(self, partitions: List[IndexPartition], terms) -> tuple:
+        """
+        IDF per term + avgdl untuk scope partisi yang dipilih
+        Statistik (N, avgdl, df) dijumlahkan dari partisi yang dipilih
+        """
+        total_docs = sum(p.doc_count for p in partitions)
+        avg_len = (sum(p.total_doc_length for p in partitions) / total_docs) if total_docs else 0.0
+        single = partitions[0] if len(partitions) == 1 else None
+        idf = {}
+        
+        for term in terms:
+            if single is not None:
+                if term in single.idf:
+                    idf[term] = single.idf[term]
+                elif term in single.postings:
+                    idf[term] = single.idf[term] = self._bm25_idf(len(single.postings[term]), total_docs)
+            else:
+                doc_freq = sum(len(p.postings[term]) for p in partitions if term in p.postings)
+                if doc_freq:
+                    idf[term] = self._bm25_idf(doc_freq, total_docs)
+        
+        return idf, avg_len or 1.0
+    
+    def _score_partitions(self, partitions: List[IndexPartition], query_counts: Counter) -> Dict[int, float]:
+        """
+        BM25 + title bonus untuk chunk yang ada di postings query tokens (pure Python)
+        """
+        k1 = self.bm25_k1
+        b = self.bm25_b
+        idf, avg_len = self._scope_stats(partitions, query_counts)
+        scores = {}
+        
+        for term, qtf in query_counts.items():
+            for partition in partitions:
+                if term in idf:
+                    term_postings = partition.postings.get(term)
+                    if term_postings is not None:
+                        doc_lengths = partition.doc_lengths
+                        for idx, tf in term_postings.items():
+                            norm = k1 * (1 - b + b * doc_lengths[idx] / avg_len)
+                            scores[idx] = scores.get(idx, 0.0) + qtf * idf[term] * tf * (k1 + 1) / (tf + norm)
+                
+                # Boost score if query token in title
+                for idx in partition.title_postings.get(term, ()):
+                    scores[idx] = scores.get(idx, 0.0) + qtf * self.title_boost
+        
+        return scores
+    
+    def _rank_python(self, partitions: List[IndexPartition], query: str, top_k: int) -> List[tuple]:
+        """
+        Ranking pure-Python: (chunk_id, score) urut (-score, chunk_id)
+        """
+        scores = self._score_partitions(partitions, Counter(self._tokenize(query)))
+        # Bounded heap selection (bukan full sort)
+        ranked = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return self._pad_zero_scores(ranked, partitions, scores, top_k)
+    
+    def _pad_zero_scores(self, ranked: List[tuple], partitions: List[IndexPartition], scored, top_k: int) -> List[tuple]:
         """
-        Memecah text panjang menjadi chunks kecil
+        Lengkapi dengan chunk skor 0 (urutan corpus) agar jumlah hasil tetap top_k
         """
-        chunks = []
+        if len(ranked) < top_k:
+            candidates = heapq.merge(*(iter(p.doc_lengths) for p in partitions))
+            for idx in candidates:
+                if len(ranked) >= top_k:
+                    break
+                if idx not in scored:
+                    ranked.append((idx, 0.0))
         
-        # Clean text
-        text = text.strip()
+        return ranked
+    
+    def _rank_maxscore(self, partitions: List[IndexPartition], query_counts: Counter, top_k: int) -> List[tuple]:
+        """
+        Top-k BM25 dengan MaxScore
         
-        # Split by paragraphs first (better semantic boundaries)
-        paragraphs = text.split('\n\n')
+        Per partisi, posting list (term + judul) diurutkan berdasarkan upper bound menurun.
+        List "essential" di-score penuh; begitu total upper bound list sisanya < skor ke-k
+        saat ini, chunk yang belum tersentuh tidak mungkin masuk top-k: list sisanya hanya
+        di-probe untuk kandidat (chunk lain di-skip tanpa scoring) dan kandidat yang tidak
+        bisa lagi mencapai skor ke-k dibuang. Partisi yang total upper bound-nya < skor ke-k
+        dilewati seluruhnya.
         
-        current_chunk = ""
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
+        Overhead per partisi (array skor penuh + kandidat) membuatnya ±2x lebih lambat dari
+        _score_matrix di scope kecil; hanya dipakai jika scope >= maxscore_min_chunks. Terukur
+        (top_k=3): 4k chunk 1.05-1.2x, 40k chunk 0.8-1.1x, 160k chunk 0.45-0.95x waktu full scan.
+        
+        Returns:
+            (chunk_id, score) urut (-score, chunk_id)
+        """
+        k1 = self.bm25_k1
+        b = self.bm25_b
+        idf, avg_len = self._scope_stats(partitions, query_counts)
+        
+        plans = []
+        for partition in partitions:
+            matrix = partition.matrix()
+            lists = []  # (upper_bound, kolom, tf atau None untuk judul, bobot query)
+            for term, qtf in query_counts.items():
+                row = matrix.rows.get(term)
+                if row is not None and term in idf:
+                    start, end = matrix.indptr[row], matrix.indptr[row + 1]
+                    max_tf = matrix.row_max_tf[row]
+                    bound = max_tf * (k1 + 1) / (max_tf + k1 * (1 - b + b * matrix.row_min_dl[row] / avg_len))
+                    weight = qtf * idf[term]
+                    lists.append((weight * bound, matrix.cols[start:end], matrix.tfs[start:end], weight))
+                
+                # Boost score if query token in title
+                title_cols = matrix.title_row(term)
+                if title_cols is not None:
+                    lists.append((qtf * self.title_boost, title_cols, None, qtf * self.title_boost))
+            
+            if lists:
+                lists.sort(key=lambda item: -item[0])
+                # suffix[i] = total upper bound list ke-i dst (toleransi pembulatan float, suffix terakhir tepat 0)
+                suffix = [0.0] * (len(lists) + 1)
+                for position in range(len(lists) - 1, -1, -1):
+                    suffix[position] = suffix[position + 1] + lists[position][0] * (1 + 1e-9) + 1e-12
+                plans.append((suffix, matrix, lists))
+        
+        def contributions(matrix, cols, tfs, weight):
+            if tfs is None:
+                return np.full(len(cols), weight)
+            norm = k1 * (1 - b + b * matrix.doc_lengths[cols] / avg_len)
+            return weight * tfs * (k1 + 1) / (tfs + norm)
+        
+        def kth_score(scores):
+            return np.partition(scores, len(scores) - top_k)[len(scores) - top_k] if len(scores) >= top_k else 0.0
+        
+        # Partisi dengan upper bound terbesar dulu supaya skor ke-k cepat naik
+        plans.sort(key=lambda plan: -plan[0][0])
+        threshold = 0.0
+        doc_id_parts = []
+        score_parts = []
+        
+        for suffix, matrix, lists in plans:
+            if suffix[0] < threshold:
                 continue
             
-            # If adding this paragraph exceeds chunk_size
-            if len(current_chunk) + len(para) > self.chunk_size:
-                if current_chunk:
-                    chunks.append({
-                        'text': current_chunk,
-                        'metadata': metadata.copy()
-                    })
-                current_chunk = para
-            else:
-                current_chunk += "\n\n" + para if current_chunk else para
+            # Essential lists: akumulasi penuh
+            scores = np.zeros(len(matrix.doc_ids))
+            position = 0
+            while position < len(lists) and suffix[position] >= threshold:
+                _, cols, tfs, weight = lists[position]
+                scores[cols] += contributions(matrix, cols, tfs, weight)
+                position += 1
+                # Skor ke-k dari subset chunk mana pun = batas bawah skor ke-k global
+                if position < len(lists) and suffix[position] < suffix[0] - suffix[position]:
+                    threshold = max(threshold, kth_score(scores[cols]))
+            
+            cand_cols = np.flatnonzero(scores)
+            cand_scores = scores[cand_cols]
+            
+            # Non-essential lists: probe kandidat saja
+            for position in range(position, len(lists)):
+                keep = cand_scores + suffix[position] >= threshold
+                cand_cols = cand_cols[keep]
+                cand_scores = cand_scores[keep]
+                if not len(cand_cols):
+                    break
+                
+                _, cols, tfs, weight = lists[position]
+                positions = np.searchsorted(cols, cand_cols)
+                found = positions < len(cols)
+                found[found] = cols[positions[found]] == cand_cols[found]
+                if found.any():
+                    hits = positions[found]
+                    cand_scores[found] += contributions(matrix, cols[hits], None if tfs is None else tfs[hits], weight)
+            
+            threshold = max(threshold, kth_score(cand_scores))
+            doc_id_parts.append(matrix.doc_ids[cand_cols])
+            score_parts.append(cand_scores)
         
-        # Add remaining chunk
-        if current_chunk:
-            chunks.append({
-                'text': current_chunk,
-                'metadata': metadata.copy()
-            })
+        if not doc_id_parts:
+            return self._pad_zero_scores([], partitions, set(), top_k)
         
-        return chunks
+        doc_ids = np.concatenate(doc_id_parts)
+        scores = np.concatenate(score_parts)
+        ranked = self._top_k(doc_ids, scores, top_k) if len(doc_ids) else []
+        return self._pad_zero_scores(ranked, partitions, set(doc_ids.tolist()) if len(ranked) < top_k else (), top_k)
     
-    def _tokenize(self, text: str) -> List[str]:
+    def _dense_mode(self) -> bool:
+        return self.retrieval_mode in ('dense', 'hybrid') and rag_dense is not None
+    
+    def _dense_index(self, state: IndexState, partition: IndexPartition):
         """
-        Simple tokenization: lowercase + split by non-alphanumeric
+        Vektor dense partisi (urut PartitionMatrix.doc_ids), di-encode sekali lalu di-cache
+        """
+        dense = partition._dense
+        if dense is None:
+            matrix = partition.matrix()
+            vectors = self.dense_encoder.encode_batch([
+                self._tokenize(state.chunks.text(int(chunk_id))) for chunk_id in matrix.doc_ids
+            ])
+            dense = partition._dense = rag_dense.DenseIndex(vectors, quantize=self.dense_quantize)
+        return dense
+    
+    def _score_matrix(self, partitions: List[IndexPartition], query_counts: List[Counter], lexical_only: bool = False,
+                      state: IndexState = None):
+        """
+        Score banyak query sekaligus dengan NumPy
+        
+        Satu query: sparse dot product (hanya baris CSR dari query tokens).
+        Banyak query: submatriks dense term-gabungan x chunk, lalu satu matmul per blok chunk.
+        Mode dense/hybrid: cosine vektor hashed n-gram (di bawah dense_min_similarity = 0)
+        menggantikan (dense) atau ditambahkan ke skor BM25 (hybrid).
+        
+        Returns:
+            (doc_ids, scores) dengan scores shape (len(query_counts), len(doc_ids))
         """
-        text = text.lower()
-        tokens = re.findall(r'\b\w+\b', text)
-        return tokens
+        state = state or self._current_state()
+        k1 = self.bm25_k1
+        b = self.bm25_b
+        terms = sorted(set().union(*query_counts))
+        idf, avg_len = self._scope_stats(partitions, terms)
+        
+        qtf = np.array([[counts.get(term, 0) for term in terms] for counts in query_counts], dtype=np.float64)
+        query_weights = qtf * np.array([idf.get(term, 0.0) for term in terms])
+        
+        dense = self._dense_mode() and not lexical_only
+        lexical = self.retrieval_mode != 'dense' or not dense
+        if dense:
+            query_vectors = self.dense_encoder.encode_batch([list(counts.elements()) for counts in query_counts])
+        
+        doc_id_parts = []
+        score_parts = []
+        for partition in partitions:
+            matrix = partition.matrix()
+            norm = k1 * (1 - b + b * matrix.doc_lengths / avg_len)
+            scores = np.zeros((len(query_counts), len(matrix.doc_ids)))
+            
+            if lexical and len(query_counts) == 1:
+                for position, term in enumerate(terms):
+                    found = matrix.row(term)
+                    if found is not None and query_weights[0, position]:
+                        cols, tfs = found
+                        scores[0, cols] += query_weights[0, position] * tfs * (k1 + 1) / (tfs + norm[cols])
+                    
+                    # Boost score if query token in title
+                    title_cols = matrix.title_row(term)
+                    if title_cols is not None:
+                        scores[0, title_cols] += qtf[0, position] * self.title_boost
+            elif lexical:
+                for start in range(0, len(matrix.doc_ids), BATCH_BLOCK_SIZE):
+                    end = min(start + BATCH_BLOCK_SIZE, len(matrix.doc_ids))
+                    tf_block, title_block = matrix.dense_block(terms, start, end)
+                    weights = tf_block * (k1 + 1) / (tf_block + norm[start:end])
+                    scores[:, start:end] = query_weights @ weights + (qtf * self.title_boost) @ title_block
+            
+            if dense:
+                similarities = self._dense_index(state, partition).search(query_vectors)
+                similarities[similarities < self.dense_min_similarity] = 0.0
+                scores += (1.0 if not lexical else self.dense_weight) * similarities
+            
+            doc_id_parts.append(matrix.doc_ids)
+            score_parts.append(scores)
+        
+        return np.concatenate(doc_id_parts), np.concatenate(score_parts, axis=1)
     
-    def _calculate_tfidf(self, query_tokens: List[str], chunk_tokens: List[str]) -> float:
+    def _top_k(self, doc_ids, scores, top_k: int) -> List[tuple]:
+        """
+        Top-k (chunk_id, score) urut (-score, chunk_id)
+        Chunk skor 0 ikut terurut berdasarkan chunk_id (sama dengan padding urutan corpus)
         """
-        Calculate TF-IDF score untuk ranking chunks
-        Simple implementation tanpa sklearn
+        if len(scores) > top_k:
+            kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            candidates = np.nonzero(scores >= kth)[0]
+        else:
+            candidates = np.arange(len(scores))
+        
+        # Skor yang hanya beda pembulatan float (urutan penjumlahan) dianggap seri
+        order = np.lexsort((doc_ids[candidates], -np.round(scores[candidates], 9)))[:top_k]
+        selected = candidates[order]
+        return [(int(doc_ids[i]), float(scores[i])) for i in selected]
+    
+    def _collapse_duplicates(self, state: IndexState, rank, top_k: int) -> List[tuple]:
         """
-        # TF: Term frequency in chunk
-        chunk_counter = Counter(chunk_tokens)
-        total_chunk_tokens = len(chunk_tokens)
+        Top-k dengan maksimal satu chunk per cluster near-duplicate (yang ranking-nya tertinggi)
         
-        # Calculate score
-        score = 0.0
-        for token in query_tokens:
-            if token in chunk_counter:
-                tf = chunk_counter[token] / total_chunk_tokens
-                # Simple scoring: just TF for now (no IDF karena corpus kecil)
-                score += tf
+        Args:
+            state: Index yang di-query (cluster near-duplicate-nya)
+            rank: Fungsi k -> ranked list (chunk_id, score), kurang dari k jika scope habis
+            top_k: Jumlah hasil
+        """
+        clusters = state.clusters
+        if not clusters:
+            return rank(top_k)
         
-        return score
+        k = top_k
+        while True:
+            ranked = rank(k)
+            selected = []
+            seen = set()
+            for idx, score in ranked:
+                cluster = clusters.get(idx, idx)
+                if cluster not in seen:
+                    seen.add(cluster)
+                    selected.append((idx, score))
+                    if len(selected) == top_k:
+                        return selected
+            if len(ranked) < k:
+                return selected
+            k *= 2
+    
+    def _format_results(self, state: IndexState, ranked: List[tuple]) -> List[Dict[str, Any]]:
+        results = []
+        for idx, score in ranked:
+            chunk = state.chunks[idx]
+            results.append({
+                'text': chunk['text'],
+                'score': score,
+                'metadata': dict(chunk['metadata'])
+            })
+        return results
+    
+    def _cache_key(self, tokens: List[str], topik: str, level: str, top_k: int) -> tuple:
+        """
+        Token diurutkan: BM25 hanya bergantung pada frekuensi token, bukan urutannya
+        """
+        return (
+            tuple(sorted(tokens)),
+            topik.lower() if topik else None,
+            level.lower() if level else None,
+            top_k,
+            self.retrieval_mode
+        )
     
     def retrieve_context(self, query: str, topik: str = None, level: str = None, top_k: int = None) -> List[Dict[str, Any]]:
         """
         Retrieve relevant context dari teacher materials
         
+        Hanya partisi (topik, level) yang dipilih dan postings dari token query
+        yang di-score (BM25), chunk lain tidak disentuh sama sekali.
+        
         Args:
             query: User's question atau topic
             topik: Filter by topik (optional)
@@ -191,67 +1745,238 @@ class RAGService:
         if top_k is None:
             top_k = self.top_k
         
-        # Reload materials if cache is empty
-        if not self.chunks_cache:
-            self.reload_materials()
+        # Load index on first use (snapshot atau rebuild)
+        self._ensure_loaded()
+        # Satu versi index untuk seluruh query ini; update yang terjadi bersamaan tidak terlihat
+        state = self._current_state()
+        
+        # Query yang sama (mis. query=topik dari quiz/step-by-step) dijawab dari cache
+        tokens = self._tokenize(query)
+        cache_key = self._cache_key(tokens, topik, level, top_k)
+        cached = self.result_cache.get(cache_key, state.version)
+        if cached is not None:
+            return cached
         
-        if not self.chunks_cache:
+        partitions = self._select_partitions(state, topik, level)
+        if not partitions or top_k <= 0:
             return []
+        scope_chunks = sum(len(p.doc_lengths) for p in partitions)
+        partitions = self._use_partitions(state, partitions)
         
-        # Tokenize query
-        query_tokens = self._tokenize(query)
+        if np is None:
+            rank = lambda k: self._rank_python(partitions, query, k)
+        elif self._dense_mode() or scope_chunks < self.maxscore_min_chunks:
+            doc_ids, scores = self._score_matrix(partitions, [Counter(tokens)], state=state)
+            rank = lambda k: self._top_k(doc_ids, scores[0], k)
+        else:
+            query_counts = Counter(tokens)
+            rank = lambda k: self._rank_maxscore(partitions, query_counts, k)
+        ranked = self._collapse_duplicates(state, rank, top_k)
         
-        # Filter chunks by topik/level if specified
-        filtered_chunks = self.chunks_cache
-        if topik:
-            filtered_chunks = [c for c in filtered_chunks if c['metadata']['topik'] == topik.lower()]
-        if level:
-            filtered_chunks = [c for c in filtered_chunks if c['metadata']['level'] == level.lower()]
+        results = self._format_results(state, ranked)
+        self.result_cache.put(cache_key, state.version, results)
+        self._release_partitions()
+        return results
+    
+    def retrieve_context_batch(self, queries: List[str], topik: str = None, level: str = None,
+                               top_k: int = None) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve context untuk banyak query sekaligus (satu matmul per blok chunk)
+        Dipakai generate quiz (query topik + aspek materi, LLMService._quiz_contexts)
         
-        if not filtered_chunks:
-            # No matching chunks, return all
-            filtered_chunks = self.chunks_cache
+        Args:
+            queries: List query
+            topik: Filter by topik (optional, berlaku untuk semua query)
+            level: Filter by level (optional, berlaku untuk semua query)
+            top_k: Number of chunks per query (default: self.top_k)
         
-        # Score each chunk
-        scored_chunks = []
-        for chunk in filtered_chunks:
-            chunk_tokens = self._tokenize(chunk['text'])
-            score = self._calculate_tfidf(query_tokens, chunk_tokens)
-            
-            # Boost score if query token in title
-            title_tokens = self._tokenize(chunk['metadata']['judul'])
-            for token in query_tokens:
-                if token in title_tokens:
-                    score += 0.5  # Title match bonus
+        Returns:
+            List hasil per query, urutan sama dengan `queries`
+        """
+        if top_k is None:
+            top_k = self.top_k
+        if not queries:
+            return []
+        
+        if np is None:
+            return [self.retrieve_context(query, topik=topik, level=level, top_k=top_k) for query in queries]
+        
+        self._ensure_loaded()
+        state = self._current_state()
+        
+        results = [None] * len(queries)
+        pending = {}  # cache key -> (tokens, [posisi query])
+        for position, query in enumerate(queries):
+            tokens = self._tokenize(query)
+            cache_key = self._cache_key(tokens, topik, level, top_k)
+            if cache_key in pending:
+                pending[cache_key][1].append(position)
+                continue
+            results[position] = self.result_cache.get(cache_key, state.version)
+            if results[position] is None:
+                pending[cache_key] = (tokens, [position])
+        
+        if not pending:
+            return results
+        
+        partitions = self._select_partitions(state, topik, level)
+        if not partitions or top_k <= 0:
+            return [result or [] for result in results]
+        partitions = self._use_partitions(state, partitions)
+        
+        # Hanya query yang belum ada di cache yang di-score
+        keys = list(pending)
+        doc_ids, scores = self._score_matrix(partitions, [Counter(pending[key][0]) for key in keys], state=state)
+        for cache_key, row in zip(keys, scores):
+            scored = self._format_results(state, self._collapse_duplicates(state, lambda k: self._top_k(doc_ids, row, k), top_k))
+            self.result_cache.put(cache_key, state.version, scored)
+            for position in pending[cache_key][1]:
+                results[position] = [dict(result) for result in scored]
+        
+        self._release_partitions()
+        return results
+    
+    def search_materials(self, query: str, topik: str = None, level: str = None,
+                         page: int = 1, per_page: int = 10) -> Dict[str, Any]:
+        """
+        Full-text search materi dari index (judul + teks materi / hasil ekstraksi file)
+        
+        Skor materi = skor BM25 chunk terbaiknya (termasuk title boost), selalu lexical.
+        Filter topik/level berlaku ketat (tanpa widening seperti retrieval).
+        Materi tanpa teks ter-index hanya dicocokkan lewat judulnya.
+        
+        Args:
+            query: Keyword
+            topik: Filter by topik (optional)
+            level: Filter by level (optional)
+            page: Halaman (mulai dari 1)
+            per_page: Jumlah materi per halaman
+        
+        Returns:
+            {'total': jumlah materi yang cocok, 'results': [{'material_id', 'score', 'snippet', 'highlights'}]}
+            highlights = [start, end] char offset di snippet
+        """
+        self._ensure_loaded()
+        state = self._current_state()
+        
+        tokens = self._tokenize(query)
+        if not tokens:
+            return {'total': 0, 'results': []}
+        
+        topik = topik.lower() if topik else None
+        level = level.lower() if level else None
+        query_counts = Counter(tokens)
+        partitions = [
+            p for key, p in state.partitions.items()
+            if p.doc_count and (not topik or key[0] == topik) and (not level or key[1] == level)
+        ]
+        partitions = self._use_partitions(state, partitions)
+        
+        best = {}  # material_id -> (score, chunk_id terbaik)
+        if partitions and np is None:
+            scores = self._score_partitions(partitions, query_counts)
+            for chunk_id in sorted(scores, key=lambda chunk: (-scores[chunk], chunk)):
+                if scores[chunk_id] > 0:
+                    best.setdefault(state.chunks.material_id(chunk_id), (scores[chunk_id], chunk_id))
+        elif partitions:
+            doc_ids, scores = self._score_matrix(partitions, [query_counts], lexical_only=True, state=state)
+            material_ids = np.concatenate([self._matrix_material_ids(state, p.matrix()) for p in partitions])
+            positive = np.flatnonzero(scores[0] > 0)
+            materials = material_ids[positive]
+            chunk_scores = scores[0][positive]
+            chunk_ids = doc_ids[positive]
             
-            scored_chunks.append({
-                'chunk': chunk,
-                'score': score
-            })
+            # Chunk terbaik per materi: urut (materi, -skor, chunk_id), ambil baris pertama tiap materi
+            order = np.lexsort((chunk_ids, -chunk_scores, materials))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = materials[order][1:] != materials[order][:-1]
+            selected = order[first]
+            best = dict(zip(
+                materials[selected].tolist(),
+                zip(chunk_scores[selected].tolist(), chunk_ids[selected].tolist())
+            ))
         
-        # Sort by score descending
-        scored_chunks.sort(key=lambda x: x['score'], reverse=True)
+        # Materi tanpa chunk (mis. file belum/gagal diekstrak): cocokkan judul saja
+        for material_id, metadata in state.material_meta.items():
+            if state.material_chunks.get(material_id):
+                continue
+            if (topik and metadata['topik'] != topik) or (level and metadata['level'] != level):
+                continue
+            title_terms = set(self._tokenize(metadata['judul']))
+            score = sum(qtf for term, qtf in query_counts.items() if term in title_terms) * self.title_boost
+            if score > 0:
+                best[material_id] = (score, None)
         
-        # Return top_k chunks
-        top_chunks = scored_chunks[:top_k]
+        # Skor sama: materi terbaru (id terbesar) dulu
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], -item[0]))
+        offset = (max(page, 1) - 1) * per_page
         
-        # Format result
         results = []
-        for item in top_chunks:
+        terms = set(tokens)
+        for material_id, (score, chunk_id) in ranked[offset:offset + per_page]:
+            snippet, highlights = ('', []) if chunk_id is None else self._snippet(state.chunks.text(chunk_id), terms)
             results.append({
-                'text': item['chunk']['text'],
-                'score': item['score'],
-                'metadata': item['chunk']['metadata']
+                'material_id': material_id,
+                'score': score,
+                'snippet': snippet,
+                'highlights': highlights
             })
         
-        return results
+        self._release_partitions()
+        return {'total': len(ranked), 'results': results}
+    
+    def _matrix_material_ids(self, state: IndexState, matrix: PartitionMatrix):
+        """
+        material_id per kolom matrix (di-cache di matrix, ikut basi saat partisi berubah)
+        """
+        material_ids = matrix.material_ids
+        if material_ids is None:
+            material_ids = matrix.material_ids = np.fromiter(
+                (state.chunks.material_id(int(chunk_id)) for chunk_id in matrix.doc_ids),
+                dtype=np.int64, count=len(matrix.doc_ids)
+            )
+        return material_ids
+    
+    def _snippet(self, text: str, terms: Set[str]) -> tuple:
+        """
+        Potongan teks chunk (<= SEARCH_SNIPPET_CHARS) di sekitar kumpulan match terpadat
+        
+        Returns:
+            (snippet, highlights) - highlights = [[start, end], ...] relatif terhadap snippet
+        """
+        matches = [(start, end) for term, start, end in text_analysis.analyze_spans(text, self.analyzer) if term in terms]
+        
+        start, end = 0, len(text)
+        if len(text) > SEARCH_SNIPPET_CHARS:
+            # Jendela yang diawali sebuah match dan memuat match terbanyak
+            best_start, best_count = 0, 0
+            for position, (match_start, _) in enumerate(matches):
+                count = sum(1 for _, match_end in matches[position:] if match_end <= match_start + SEARCH_SNIPPET_CHARS)
+                if count > best_count:
+                    best_start, best_count = match_start, count
+            
+            # Sedikit konteks sebelum match pertama, dipotong di batas kata
+            start = max(0, best_start - SEARCH_SNIPPET_CHARS // 5)
+            if start > 0:
+                start = text.rfind(' ', 0, start) + 1
+            end = min(len(text), start + SEARCH_SNIPPET_CHARS)
+            if end < len(text):
+                cut = text.rfind(' ', start, end)
+                end = cut if cut > max(start, best_start) else end
+        
+        prefix = '…' if start > 0 else ''
+        suffix = '…' if end < len(text) else ''
+        shift = len(prefix) - start
+        highlights = [[match_start + shift, match_end + shift] for match_start, match_end in matches
+                      if match_start >= start and match_end <= end]
+        return prefix + text[start:end] + suffix, highlights
     
     def get_material_by_topik(self, topik: str, level: str = None) -> str:
         """
         Get full material by topik
         Untuk kasus dimana kita butuh semua materi tentang topik tertentu
         """
-        query = TeacherMaterial.query.filter_by(topik=topik.lower())
+        query = TeacherMaterial.query.options(db.joinedload(TeacherMaterial.extracted_text)).filter_by(topik=topik.lower())
         
         if level:
             query = query.filter_by(level=level.lower())
@@ -265,7 +1990,7 @@ class RAGService:
         combined_text = ""
         for mat in materials:
             combined_text += f"\n\n=== {mat.judul} (oleh {mat.created_by}) ===\n\n"
-            combined_text += mat.konten
+            combined_text += self._extract_content(mat)
         
         return combined_text.strip()
     
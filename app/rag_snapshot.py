@@ -0,0 +1,422 @@
+"""
+On-disk snapshot untuk RAG index
+Menyimpan chunk store + inverted index dalam layout biner yang bisa di-mmap read-only
+
+Layout file:
+    [0:8]    MAGIC
+    [8:16]   u64 offset header JSON
+    [16:24]  u64 panjang header JSON
+    [24:...] sections (masing-masing align 8 byte), lalu header JSON
+
+Header JSON berisi versi format, byteorder, offset tiap section dan metadata
+(versi materi di DB, parameter index, metadata per materi, range chunk per partisi).
+Setiap partisi (topik, level) punya section postings sendiri: p<i>.terms/indptr/docs/tfs.
+Teks disimpan sekali per materi; chunk hanya offset (byte untuk mmap, char untuk menulis ulang snapshot).
+Semua worker yang me-mmap file yang sama berbagi page cache OS.
+Postings partisi di-decode saat partisi dipakai (partition_postings) dan page-nya bisa
+dilepas dari RSS proses saat partisi di-evict (release_partition).
+"""
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from typing import Dict, Any, Optional
+import json
+import mmap
+import os
+import struct
+import sys
+
+from app.rag_chunks import intern_metadata
+
+MAGIC = b'EMRAGIX\x01'
+FORMAT_VERSION = 3
+_PREAMBLE = struct.Struct('<8sQQ')
+
+
+def _byte_offsets(text: str, positions) -> Dict[int, int]:
+    """
+    char offset -> byte offset UTF-8 untuk banyak posisi sekaligus (satu pass)
+    """
+    if text.isascii():
+        return {position: position for position in positions}
+    
+    offsets = {}
+    previous = 0
+    total = 0
+    for position in sorted(set(positions)):
+        total += len(text[previous:position].encode('utf-8'))
+        previous = position
+        offsets[position] = total
+    return offsets
+
+
+def write_snapshot(path: str, meta: Dict[str, Any], materials: list, material_texts: list,
+                   chunk_spans: list, chunk_materials: list, doc_lengths: list, partitions: list,
+                   extra_sections: Optional[Dict[str, bytes]] = None):
+    """
+    Tulis snapshot secara atomic (tmp file + os.replace)
+    
+    Args:
+        path: Lokasi file snapshot
+        meta: Metadata bebas (materials_version, index_params, dll)
+        materials: List metadata per materi, masing-masing punya chunk_start/chunk_end
+        material_texts: Buffer teks per materi (urutan sama dengan `materials`)
+        chunk_spans: (start, end) char offset tiap chunk di buffer materinya, urut chunk id (0..n-1)
+        chunk_materials: Index materi (posisi di `materials`) per chunk
+        doc_lengths: Jumlah token per chunk
+        partitions: List partisi {'key', 'chunk_start', 'chunk_end', 'total_doc_length',
+            'postings': [(term, [(chunk_id, tf), ...]), ...]} dengan chunk id yang sudah dipadatkan
+        extra_sections: Section biner tambahan (mis. signature MinHash), dibaca lewat Snapshot.section()
+    """
+    sections = {}
+    partition_table = []
+    for number, partition in enumerate(partitions):
+        terms = []
+        indptr = array('I', [0])
+        docs = array('I')
+        tfs = array('I')
+        for term, term_postings in partition['postings']:
+            terms.append(term)
+            for chunk_id, tf in term_postings:
+                docs.append(chunk_id)
+                tfs.append(tf)
+            indptr.append(len(docs))
+        
+        prefix = f'p{number}'
+        sections[f'{prefix}.terms'] = '\n'.join(terms).encode('utf-8')
+        sections[f'{prefix}.indptr'] = indptr.tobytes()
+        sections[f'{prefix}.docs'] = docs.tobytes()
+        sections[f'{prefix}.tfs'] = tfs.tobytes()
+        partition_table.append({
+            'key': list(partition['key']),
+            'sections': prefix,
+            'chunk_start': partition['chunk_start'],
+            'chunk_end': partition['chunk_end'],
+            'total_doc_length': partition['total_doc_length'],
+        })
+    
+    text_offsets = array('Q')
+    text_lengths = array('I')
+    char_spans = array('I')
+    text_parts = []
+    offset = 0
+    for material, text in zip(materials, material_texts):
+        encoded = text.encode('utf-8')
+        spans = chunk_spans[material['chunk_start']:material['chunk_end']]
+        byte_offsets = _byte_offsets(text, [position for span in spans for position in span])
+        for start, end in spans:
+            text_offsets.append(offset + byte_offsets[start])
+            text_lengths.append(byte_offsets[end] - byte_offsets[start])
+            char_spans.extend((start, end))
+        material['text_start'] = offset
+        material['text_end'] = offset + len(encoded)
+        text_parts.append(encoded)
+        offset += len(encoded)
+    
+    sections.update({
+        'dlens': array('I', doc_lengths).tobytes(),
+        'cmat': array('I', chunk_materials).tobytes(),
+        'coff': text_offsets.tobytes(),
+        'clen': text_lengths.tobytes(),
+        'cspan': char_spans.tobytes(),
+        'text': b''.join(text_parts),
+    })
+    sections.update(extra_sections or {})
+    
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * _PREAMBLE.size)
+        section_table = {}
+        for name, data in sections.items():
+            position = f.tell()
+            padding = (-position) % 8
+            f.write(b'\0' * padding)
+            section_table[name] = [position + padding, len(data)]
+            f.write(data)
+        
+        header = json.dumps({
+            'format': FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'sections': section_table,
+            'materials': materials,
+            'partitions': partition_table,
+            'meta': meta,
+        }).encode('utf-8')
+        header_offset = f.tell()
+        f.write(header)
+        
+        f.seek(0)
+        f.write(_PREAMBLE.pack(MAGIC, header_offset, len(header)))
+    
+    os.replace(tmp_path, path)
+
+
+class SnapshotPostingList:
+    """
+    Postings satu term, read-only view ke mmap
+    """
+    __slots__ = ('docs', 'tfs')
+    
+    def __init__(self, docs, tfs):
+        self.docs = docs
+        self.tfs = tfs
+    
+    def items(self):
+        return zip(self.docs, self.tfs)
+    
+    def __len__(self):
+        return len(self.docs)
+
+
+class SnapshotPostings(Mapping):
+    """
+    term -> SnapshotPostingList tanpa men-decode seluruh postings ke dict
+    """
+    
+    def __init__(self, terms: list, indptr, docs, tfs):
+        self._rows = {term: row for row, term in enumerate(terms)}
+        self._indptr = indptr
+        self._docs = docs
+        self._tfs = tfs
+    
+    def __getitem__(self, term):
+        row = self._rows[term]
+        start, end = self._indptr[row], self._indptr[row + 1]
+        return SnapshotPostingList(self._docs[start:end], self._tfs[start:end])
+    
+    def __iter__(self):
+        return iter(self._rows)
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def __contains__(self, term):
+        return term in self._rows
+    
+    def csr(self):
+        """
+        (terms, indptr, docs, tfs) - array CSR mentah dari mmap (tanpa copy)
+        """
+        return list(self._rows), self._indptr, self._docs, self._tfs
+
+
+class SnapshotDocLengths(Mapping):
+    """
+    chunk_id -> panjang dokumen untuk range chunk satu partisi [start, end)
+    Iterasi urut chunk id
+    """
+    
+    def __init__(self, dlens, start: int, end: int):
+        self._dlens = dlens
+        self._start = start
+        self._end = end
+    
+    def __getitem__(self, chunk_id):
+        if not self._start <= chunk_id < self._end:
+            raise KeyError(chunk_id)
+        return self._dlens[chunk_id]
+    
+    def __iter__(self):
+        return iter(range(self._start, self._end))
+    
+    def __len__(self):
+        return self._end - self._start
+    
+    def __contains__(self, chunk_id):
+        return isinstance(chunk_id, int) and self._start <= chunk_id < self._end
+
+
+class SnapshotChunks(Mapping):
+    """
+    chunk_id -> {'text', 'metadata'}; teks di-decode dari mmap saat diakses
+    """
+    
+    def __init__(self, text, offsets, lengths, char_spans, chunk_materials, materials: list):
+        self._text = text
+        self._offsets = offsets
+        self._lengths = lengths
+        self._char_spans = char_spans
+        self._chunk_materials = chunk_materials
+        self._text_ranges = [(material['text_start'], material['text_end']) for material in materials]
+        self._metadata = [intern_metadata(material) for material in materials]
+    
+    def __getitem__(self, chunk_id):
+        if not 0 <= chunk_id < len(self._offsets):
+            raise KeyError(chunk_id)
+        start = self._offsets[chunk_id]
+        text = bytes(self._text[start:start + self._lengths[chunk_id]]).decode('utf-8')
+        return {
+            'text': text,
+            'metadata': self._metadata[self._chunk_materials[chunk_id]]
+        }
+    
+    def text(self, chunk_id: int) -> str:
+        return self[chunk_id]['text']
+    
+    def material_text(self, position: int) -> str:
+        """
+        Buffer teks materi ke-`position` (urutan di header)
+        """
+        start, end = self._text_ranges[position]
+        return bytes(self._text[start:end]).decode('utf-8')
+    
+    def material_metadata(self, position: int) -> Dict[str, Any]:
+        return self._metadata[position]
+    
+    def material_id(self, chunk_id: int) -> int:
+        return self._metadata[self._chunk_materials[chunk_id]]['material_id']
+    
+    def material_ids(self) -> list:
+        """
+        material_id per posisi materi (urutan header)
+        """
+        return [metadata['material_id'] for metadata in self._metadata]
+    
+    def span(self, chunk_id: int) -> tuple:
+        """
+        (start, end) char offset chunk di buffer materinya
+        """
+        return self._char_spans[2 * chunk_id], self._char_spans[2 * chunk_id + 1]
+    
+    def __iter__(self):
+        return iter(range(len(self._offsets)))
+    
+    def __len__(self):
+        return len(self._offsets)
+
+
+class Snapshot:
+    """
+    Snapshot yang sudah di-mmap
+    """
+    
+    def __init__(self, path: str, mm: mmap.mmap, header: Dict[str, Any]):
+        self.path = path
+        self.meta = header['meta']
+        self.materials = header['materials']
+        self._mm = mm
+        self._view = memoryview(mm)
+        self._sections = header['sections']
+        section = self.section
+        
+        dlens = section('dlens', 'I')
+        material_starts = [material['chunk_start'] for material in self.materials]
+        self.partitions = []
+        for partition in header['partitions']:
+            # Materi (dan teksnya) tersimpan urut chunk: materi satu partisi = satu range byte teks
+            first = bisect_left(material_starts, partition['chunk_start'])
+            last = bisect_left(material_starts, partition['chunk_end']) - 1
+            text_range = (self.materials[first]['text_start'], self.materials[last]['text_end']) if last >= first else (0, 0)
+            self.partitions.append({
+                'key': tuple(partition['key']),
+                'sections': partition['sections'],
+                'doc_lengths': SnapshotDocLengths(dlens, partition['chunk_start'], partition['chunk_end']),
+                'total_doc_length': partition['total_doc_length'],
+                'text_range': text_range,
+            })
+        
+        self.chunks = SnapshotChunks(
+            section('text'), section('coff', 'Q'), section('clen', 'I'),
+            section('cspan', 'I'), section('cmat', 'I'), self.materials
+        )
+    
+    def partition_postings(self, number: int) -> SnapshotPostings:
+        """
+        Postings partisi ke-`number` (daftar term di-decode di sini, array tetap view ke mmap)
+        """
+        prefix = self.partitions[number]['sections']
+        terms_bytes = self.section(f'{prefix}.terms')
+        terms = bytes(terms_bytes).decode('utf-8').split('\n') if terms_bytes.nbytes else []
+        return SnapshotPostings(
+            terms, self.section(f'{prefix}.indptr', 'I'),
+            self.section(f'{prefix}.docs', 'I'), self.section(f'{prefix}.tfs', 'I')
+        )
+    
+    def _partition_ranges(self, number: int) -> list:
+        partition = self.partitions[number]
+        ranges = [self._sections[f"{partition['sections']}.{name}"] for name in ('terms', 'indptr', 'docs', 'tfs')]
+        text_start, text_end = partition['text_range']
+        ranges.append([self._sections['text'][0] + text_start, text_end - text_start])
+        return ranges
+    
+    def partition_bytes(self, number: int) -> int:
+        """
+        Ukuran postings + teks partisi di file (page yang ikut resident saat partisi dipakai)
+        """
+        return sum(length for _, length in self._partition_ranges(number))
+    
+    def release_partition(self, number: int):
+        """
+        Lepas page postings + teks partisi dari RSS proses (MADV_DONTNEED)
+        Page cache OS tetap ada: akses berikutnya di-fault ulang tanpa baca disk
+        """
+        if not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        page = mmap.PAGESIZE
+        for start, length in self._partition_ranges(number):
+            # Hanya page yang seluruhnya milik range ini
+            first = (start + page - 1) // page * page
+            last = (start + length) // page * page
+            if last > first:
+                self._mm.madvise(mmap.MADV_DONTNEED, first, last - first)
+    
+    def memory_stats(self) -> Dict[str, Any]:
+        """
+        Ukuran bagian snapshot yang di-mmap (bytes, dibagi lewat page cache antar worker)
+        + metadata materi yang di-decode ke heap Python
+        """
+        text_bytes = self._sections['text'][1]
+        postings_bytes = sum(
+            length for name, (_, length) in self._sections.items()
+            if name.rsplit('.', 1)[-1] in ('terms', 'indptr', 'docs', 'tfs')
+        )
+        metadata_bytes = sys.getsizeof(self.materials) + sum(sys.getsizeof(material) for material in self.materials)
+        return {
+            'materials': len(self.materials),
+            'chunks': len(self.chunks),
+            'mapped_bytes': len(self._mm),
+            'text_bytes': text_bytes,
+            'postings_bytes': postings_bytes,
+            'record_bytes': len(self._mm) - text_bytes - postings_bytes,
+            'metadata_bytes': metadata_bytes
+        }
+    
+    def section(self, name: str, fmt: str = None):
+        """
+        memoryview read-only satu section (None jika tidak ada)
+        """
+        if name not in self._sections:
+            return None
+        start, length = self._sections[name]
+        data = self._view[start:start + length]
+        return data.cast(fmt) if fmt else data
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    mmap snapshot read-only
+    Return None jika file tidak ada, rusak, atau format tidak cocok
+    """
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, header_offset, header_length = _PREAMBLE.unpack_from(mm, 0)
+        if magic != MAGIC:
+            print(f"⚠️  Invalid RAG snapshot (bad magic): {path}")
+            return None
+        
+        header = json.loads(mm[header_offset:header_offset + header_length].decode('utf-8'))
+        if header.get('format') != FORMAT_VERSION or header.get('byteorder') != sys.byteorder:
+            print(f"⚠️  Incompatible RAG snapshot format: {path}")
+            return None
+        
+        return Snapshot(path, mm, header)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"⚠️  Failed to load RAG snapshot {path}: {e}")
+        return None
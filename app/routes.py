@@ -1,10 +1,15 @@
-from flask import Blueprint, jsonify, request, send_from_directory
+from flask import Blueprint, jsonify, request, send_from_directory, current_app, Response, stream_with_context
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 import os
+import json
 from app.models import db, User, Emotion, LearningLog, TeacherMaterial, QuizQuestion, QuizAttempt, QuizAnswer
 from app.ai_engine import adaptive_engine
 from app.llm_service import llm_service
+from app.rag_service import rag_service
+from app.extraction_service import extraction_service
+from app.search_service import search_service
+from app.job_service import job_service, JobQueueFull
 from app.auth_utils import token_required, role_required
 
 # Blueprint untuk API routes
@@ -124,9 +129,11 @@ def health_check():
             'materials_detail': '/api/materials/<id> [GET, PUT, DELETE]',
             'materials_search': '/api/materials/search?q=keyword [GET]',
             'adaptive_content': '/api/adaptive/content [POST]',
+            'adaptive_content_stream': '/api/adaptive/content/stream [POST, text/event-stream]',
             'recommendations': '/api/recommendations/<user_id> [GET]',
             'visualization': '/api/visualization/generate [POST]',
             'quiz_generate': '/api/quiz/generate [POST]',
+            'job_status': '/api/jobs/<job_id> [GET]',
             'quiz_submit': '/api/quiz/submit [POST]',
             'quiz_history': '/api/quiz/history/<user_id> [GET]',
             'quiz_stats': '/api/quiz/stats/<user_id> [GET]',
@@ -135,7 +142,13 @@ def health_check():
             'dashboard_topics': '/api/dashboard/topics [GET]',
             'dashboard_emotions': '/api/dashboard/emotions [GET]',
             'dashboard_performance': '/api/dashboard/performance [GET]'
-        }
+        },
+        'rag_cache': rag_service.get_cache_stats(),
+        'rag_memory': rag_service.get_memory_stats(),
+        'llm_context': llm_service.get_context_stats(),
+        'llm_cache': llm_service.get_cache_stats(),
+        'llm_resilience': llm_service.get_resilience_stats(),
+        'llm_jobs': job_service.get_stats()
     }), 200
 
 @api_bp.route('/info', methods=['GET'])
@@ -421,38 +434,27 @@ def test_endpoint():
 
 # ==================== ADAPTIVE LEARNING ENDPOINTS ====================
 
-@api_bp.route('/adaptive/content', methods=['POST'])
-@token_required
-def get_adaptive_content():
+def _adaptive_learner_context(data):
     """
-    POST /api/adaptive/content - Get adaptive learning content (Authenticated users)
-    
-    Body:
-        {
-            "user_id": int,
-            "topic": string (kubus, balok, etc),
-            "emotion": string (optional - will use latest if not provided)
-        }
+    Validasi body adaptive content + ambil user, emosi terakhir, dan skor quiz terakhir
     
     Returns:
-        Personalized learning content based on user profile, emotion, and performance
+        (user, emotion, previous_scores, None) atau (None, None, None, error_response)
     """
-    data = request.get_json()
-    
     # Validation
     if not data or 'user_id' not in data or 'topic' not in data:
-        return jsonify({
+        return None, None, None, (jsonify({
             'status': 'error',
             'message': 'Missing required fields: user_id, topic'
-        }), 400
+        }), 400)
     
     # Get user profile
     user = User.query.get(data['user_id'])
     if not user:
-        return jsonify({
+        return None, None, None, (jsonify({
             'status': 'error',
             'message': f'User with id {data["user_id"]} not found'
-        }), 404
+        }), 404)
     
     # Get current emotion (from request or latest emotion log)
     emotion = data.get('emosi', None)
@@ -467,6 +469,35 @@ def get_adaptive_content():
     ).order_by(LearningLog.waktu.desc()).limit(5).all()
     
     previous_scores = [log.skor for log in learning_logs if log.skor > 0]
+    return user, emotion, previous_scores, None
+
+
+def _sse_event(event: str, data) -> str:
+    """Format satu event Server-Sent Events (data = JSON satu baris)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@api_bp.route('/adaptive/content', methods=['POST'])
+@token_required
+def get_adaptive_content():
+    """
+    POST /api/adaptive/content - Get adaptive learning content (Authenticated users)
+    
+    Body:
+        {
+            "user_id": int,
+            "topic": string (kubus, balok, etc),
+            "emotion": string (optional - will use latest if not provided)
+        }
+    
+    Returns:
+        Personalized learning content based on user profile, emotion, and performance
+    """
+    data = request.get_json()
+    
+    user, emotion, previous_scores, error = _adaptive_learner_context(data)
+    if error:
+        return error
     
     # Generate adaptive content using AI engine
     try:
@@ -497,6 +528,59 @@ def get_adaptive_content():
             'message': f'Error generating adaptive content: {str(e)}'
         }), 500
 
+@api_bp.route('/adaptive/content/stream', methods=['POST'])
+@token_required
+def stream_adaptive_content():
+    """
+    POST /api/adaptive/content/stream - Adaptive content dengan penjelasan LLM di-stream (Server-Sent Events)
+    
+    Body: sama dengan /api/adaptive/content (+ "user_query": string, opsional)
+    
+    Response: text/event-stream
+        event: meta   data: {"topic", "topic_name", "difficulty", "learning_style", "user_context"}
+        event: delta  data: {"text": "..."}   (berulang, potongan penjelasan yang sudah bersih dari markdown)
+        event: done   data: {...}             (konten lengkap, sama seperti data /api/adaptive/content)
+        event: error  data: {"message": "..."}
+    """
+    data = request.get_json(silent=True)
+    
+    user, emotion, previous_scores, error = _adaptive_learner_context(data)
+    if error:
+        return error
+    
+    user_context = {
+        'nama': user.nama,
+        'gaya_belajar': user.gaya_belajar,
+        'level': user.level,
+        'current_emotion': emotion,
+        'average_score': sum(previous_scores) / len(previous_scores) if previous_scores else 0
+    }
+    events = adaptive_engine.stream_content(
+        topic=data['topic'],
+        learning_style=user.gaya_belajar,
+        emotion=emotion,
+        level=user.level,
+        previous_scores=previous_scores,
+        user_query=data.get('user_query')
+    )
+    
+    def generate():
+        try:
+            for event, payload in events:
+                if event == 'meta':
+                    payload = dict(payload, user_context=user_context)
+                elif event == 'delta':
+                    payload = {'text': payload}
+                yield _sse_event(event, payload)
+        except Exception as e:
+            yield _sse_event('error', {'message': f'Error generating adaptive content: {str(e)}'})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Matikan buffering reverse proxy (nginx) supaya token langsung sampai ke client
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # ==================== TEACHER MATERIALS ENDPOINTS ====================
 # CRITICAL: Ini adalah sumber pengetahuan UTAMA sistem
 
@@ -617,10 +701,20 @@ def handle_materials():
                 created_by=created_by
             )
             
+            # Hash file; file identik yang sudah pernah diekstrak langsung 'ready'
+            needs_extraction = extraction_service.prepare_material(material)
+            
             db.session.add(material)
             db.session.commit()
             
-            print(f"✅ Material created successfully: {material.id}")
+            print(f"✅ Material created successfully: {material.id} (extraction: {material.extraction_status})")
+            
+            # Langsung bisa dicari tanpa rebuild seluruh index
+            _sync_rag_index(rag_service.add_material, material)
+            
+            # Ekstraksi teks di background, index di-update setelah selesai
+            if needs_extraction:
+                extraction_service.submit(current_app._get_current_object(), material.id)
             
             return jsonify({
                 'status': 'success',
@@ -690,6 +784,8 @@ def handle_material_detail(material_id):
         material.updated_at = datetime.utcnow()
         db.session.commit()
         
+        _sync_rag_index(rag_service.replace_material, material)
+        
         return jsonify({
             'status': 'success',
             'message': 'Material updated successfully',
@@ -719,11 +815,23 @@ def handle_material_detail(material_id):
         db.session.delete(material)
         db.session.commit()
         
+        _sync_rag_index(rag_service.remove_material, material_id)
+        
         return jsonify({
             'status': 'success',
             'message': 'Material deleted successfully'
         }), 200
 
+def _sync_rag_index(update_fn, arg):
+    """
+    Update RAG index untuk satu materi
+    Kegagalan indexing tidak boleh menggagalkan request guru
+    """
+    try:
+        update_fn(arg)
+    except Exception as e:
+        print(f"⚠️  Failed to update RAG index: {e}")
+
 @api_bp.route('/materials/<int:material_id>/download', methods=['GET'])
 def download_material(material_id):
     """
@@ -887,14 +995,24 @@ def search_materials():
     """
     GET /api/materials/search - Cari materi berdasarkan keyword
     
+    Default dilayani dari index RAG in-memory (judul + teks materi / hasil ekstraksi file),
+    diurutkan berdasarkan relevansi (BM25). MATERIAL_SEARCH_BACKEND=database memakai
+    full-text search database (MySQL FULLTEXT / SQLite FTS5, tanpa snippet).
+    
     Query params:
         - q: string (keyword untuk search)
         - topik: string (opsional filter)
         - level: string (opsional filter)
+        - page: int (default 1)
+        - per_page: int (default 10, maks 50)
+    
+    Setiap item data = materi + score, snippet dan highlights ([start, end] di snippet)
     """
     keyword = request.args.get('q', '')
     topik = request.args.get('topik')
     level = request.args.get('level')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
     
     if not keyword:
         return jsonify({
@@ -902,28 +1020,35 @@ def search_materials():
             'message': 'Missing required parameter: q (keyword)'
         }), 400
     
-    query = TeacherMaterial.query
-    
-    # Search in judul or konten
-    search_filter = db.or_(
-        TeacherMaterial.judul.contains(keyword),
-        TeacherMaterial.konten.contains(keyword)
-    )
-    query = query.filter(search_filter)
-    
-    # Apply additional filters
-    if topik:
-        query = query.filter_by(topik=topik.lower())
-    if level:
-        query = query.filter_by(level=level.lower())
-    
-    materials = query.order_by(TeacherMaterial.created_at.desc()).all()
+    if search_service.uses_index():
+        result = rag_service.search_materials(keyword, topik=topik, level=level, page=page, per_page=per_page)
+    else:
+        result = search_service.search(keyword, topik=topik, level=level, page=page, per_page=per_page)
+    
+    # Hanya materi di halaman ini yang diambil dari database
+    ids = [hit['material_id'] for hit in result['results']]
+    materials = {material.id: material for material in TeacherMaterial.query.filter(TeacherMaterial.id.in_(ids)).all()} if ids else {}
+    
+    data = []
+    for hit in result['results']:
+        material = materials.get(hit['material_id'])
+        if material is None:
+            continue
+        item = material.to_dict()
+        item['score'] = round(hit['score'], 4)
+        item['snippet'] = hit.get('snippet', '')
+        item['highlights'] = hit.get('highlights', [])
+        data.append(item)
     
     return jsonify({
         'status': 'success',
         'keyword': keyword,
-        'count': len(materials),
-        'data': [material.to_dict() for material in materials]
+        'count': len(data),
+        'total': result['total'],
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (result['total'] + per_page - 1) // per_page,
+        'data': data
     }), 200
 
 # ==================== RECOMMENDATION ENDPOINT ====================
@@ -1451,13 +1576,68 @@ def _generate_fallback_solution(topic: str, problem: str) -> dict:
 
 # ==================== QUIZ ENDPOINTS ====================
 
+QUIZ_GENERATION_FAILED = 'Failed to generate questions. Please check teacher materials exist for this topic.'
+
+
+def _generate_and_save_quiz(topik, level, num_questions):
+    """
+    Generate soal via LLM lalu simpan ke database
+    Dipakai langsung ("async": false) dan sebagai handler job 'quiz'
+    
+    Returns:
+        {'topik', 'level', 'questions'} atau None jika LLM gagal
+    """
+    questions = llm_service.generate_quiz_questions(topik, level, num_questions)
+    if not questions:
+        return None
+    
+    # Save questions to database
+    saved_questions = []
+    for q_data in questions:
+        question = QuizQuestion(
+            topik=topik,
+            level=level,
+            pertanyaan=q_data['pertanyaan'],
+            pilihan_a=q_data['pilihan_a'],
+            pilihan_b=q_data['pilihan_b'],
+            pilihan_c=q_data['pilihan_c'],
+            pilihan_d=q_data['pilihan_d'],
+            jawaban_benar=q_data['jawaban_benar'],
+            penjelasan=q_data['penjelasan']
+        )
+        db.session.add(question)
+        db.session.flush()  # Get ID before commit
+        saved_questions.append(question.to_dict_without_answer())
+    
+    db.session.commit()
+    
+    return {
+        'topik': topik,
+        'level': level,
+        'questions': saved_questions
+    }
+
+
+def _quiz_job(topik, level, num_questions):
+    result = _generate_and_save_quiz(topik, level, num_questions)
+    if result is None:
+        raise RuntimeError(QUIZ_GENERATION_FAILED)
+    return result
+
+
+job_service.register('quiz', _quiz_job)
+
+
 @api_bp.route('/quiz/generate', methods=['POST'])
 @token_required
 def generate_quiz():
     """
     Generate quiz questions for a topic (Authenticated users)
     POST /api/quiz/generate
-    Body: {"topik": "kubus", "level": "pemula", "num_questions": 5}
+    Body: {"topik": "kubus", "level": "pemula", "num_questions": 5, "async": true}
+    
+    Default asynchronous: 202 + job_id, hasil diambil lewat GET /api/jobs/<job_id>
+    "async": false -> tunggu LLM selesai, 200 + soal (perilaku lama)
     """
     try:
         data = request.get_json()
@@ -1487,43 +1667,42 @@ def generate_quiz():
                 'message': 'num_questions must be between 1 and 10'
             }), 400
         
-        # Generate questions using LLM
-        questions = llm_service.generate_quiz_questions(topik, level, num_questions)
+        if data.get('async', True):
+            try:
+                job = job_service.submit(
+                    current_app._get_current_object(), 'quiz',
+                    {'topik': topik, 'level': level, 'num_questions': num_questions},
+                    user_id=request.user_id
+                )
+            except JobQueueFull as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'{e}. Please try again shortly.'
+                }), 503, {'Retry-After': '5'}
         
-        if not questions:
             return jsonify({
-                'status': 'error',
-                'message': 'Failed to generate questions. Please check teacher materials exist for this topic.'
-            }), 500
+                'status': 'accepted',
+                'message': 'Quiz generation queued',
+                'data': {
+                    'job_id': job.id,
+                    'status': job.status,
+                    'status_url': f'/api/jobs/{job.id}'
+                }
+            }), 202
         
-        # Save questions to database
-        saved_questions = []
-        for q_data in questions:
-            question = QuizQuestion(
-                topik=topik,
-                level=level,
-                pertanyaan=q_data['pertanyaan'],
-                pilihan_a=q_data['pilihan_a'],
-                pilihan_b=q_data['pilihan_b'],
-                pilihan_c=q_data['pilihan_c'],
-                pilihan_d=q_data['pilihan_d'],
-                jawaban_benar=q_data['jawaban_benar'],
-                penjelasan=q_data['penjelasan']
-            )
-            db.session.add(question)
-            db.session.flush()  # Get ID before commit
-            saved_questions.append(question.to_dict_without_answer())
+        # Generate questions using LLM (synchronous)
+        result = _generate_and_save_quiz(topik, level, num_questions)
         
-        db.session.commit()
+        if result is None:
+            return jsonify({
+                'status': 'error',
+                'message': QUIZ_GENERATION_FAILED
+            }), 500
         
         return jsonify({
             'status': 'success',
-            'message': f'Generated {len(saved_questions)} questions',
-            'data': {
-                'topik': topik,
-                'level': level,
-                'questions': saved_questions
-            }
+            'message': f'Generated {len(result["questions"])} questions',
+            'data': result
         }), 200
         
     except Exception as e:
@@ -1534,6 +1713,28 @@ def generate_quiz():
         }), 500
 
 
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job_status(job_id):
+    """
+    Status + hasil job LLM asynchronous (Authenticated users, pemilik job atau teacher)
+    GET /api/jobs/<job_id>
+    status: queued / running / succeeded (result terisi) / failed (error terisi)
+    """
+    job = job_service.get_job(job_id)
+    if job is None or (job.user_id is not None and job.user_id != request.user_id
+                       and request.user_role != 'teacher'):
+        return jsonify({
+            'status': 'error',
+            'message': f'Job {job_id} not found'
+        }), 404
+    
+    return jsonify({
+        'status': 'success',
+        'data': job.to_dict()
+    }), 200
+
+
 @api_bp.route('/quiz/submit', methods=['POST'])
 @token_required
 def submit_quiz():
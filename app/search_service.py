@@ -0,0 +1,232 @@
+"""
+Search Service
+Full-text search materi langsung di database (alternatif index RAG in-memory)
+
+Backend dipilih dari dialect database:
+1. MySQL  -> MATCH (konten, judul) AGAINST (... IN NATURAL LANGUAGE MODE), pakai FULLTEXT idx_konten
+2. SQLite -> tabel shadow FTS5 (external content) yang di-sync trigger saat INSERT/UPDATE/DELETE
+3. Lainnya / FTS5 tidak tersedia -> LIKE '%keyword%' (perilaku lama)
+
+Semua backend mencari di judul + konten dan mengembalikan bentuk hasil yang sama
+dengan rag_service.search_materials ({'total', 'results': [{'material_id', 'score'}]}).
+
+MATERIAL_SEARCH_BACKEND: index (default, index RAG: ikut teks hasil ekstraksi file),
+database (backend di atas sesuai dialect) atau like.
+"""
+import os
+import re
+import threading
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from app.models import db, TeacherMaterial
+
+BACKENDS = ('mysql', 'fts5', 'like')
+SOURCES = ('index', 'database', 'like')
+MATCH_MODES = ('any', 'all')
+
+FTS_TABLE = 'teacher_materials_fts'
+FTS_TITLE_WEIGHT = 2.0  # bobot bm25() kolom judul vs konten (MySQL natural language tidak punya bobot kolom)
+
+_TOKEN = re.compile(r'\w+')
+
+_FTS_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON teacher_materials BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, judul, konten) VALUES (new.id, new.judul, new.konten);
+        END
+    """,
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON teacher_materials BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, judul, konten) VALUES ('delete', old.id, old.judul, old.konten);
+        END
+    """,
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF judul, konten ON teacher_materials BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, judul, konten) VALUES ('delete', old.id, old.judul, old.konten);
+            INSERT INTO {FTS_TABLE}(rowid, judul, konten) VALUES (new.id, new.judul, new.konten);
+        END
+    """,
+}
+
+
+def fts_query(keyword: str, operator: str = 'OR') -> str:
+    """
+    Keyword bebas -> query FTS5 natural language (OR antar kata, atau AND untuk semua kata;
+    tiap kata di-quote supaya karakter seperti '-', ':' atau '"' tidak dibaca sebagai sintaks FTS5)
+    """
+    return f' {operator} '.join(f'"{token}"' for token in _TOKEN.findall(keyword.lower()))
+
+
+class SearchService:
+    """
+    Pemilihan backend + pencarian materi di database
+    """
+    
+    def __init__(self):
+        self.source = os.getenv('MATERIAL_SEARCH_BACKEND', 'index').lower()
+        if self.source not in SOURCES:
+            raise ValueError(f"Unknown MATERIAL_SEARCH_BACKEND: {self.source}")
+        self._backends = {}  # url engine -> backend (schema FTS5 disiapkan sekali per database)
+        self._lock = threading.Lock()
+    
+    def uses_index(self) -> bool:
+        return self.source == 'index'
+    
+    def backend(self) -> str:
+        """
+        Backend untuk database aktif (FTS5 disiapkan saat pertama dipakai)
+        """
+        engine = db.engine
+        key = str(engine.url)
+        if key in self._backends:
+            return self._backends[key]
+        
+        with self._lock:
+            if key not in self._backends:
+                self._backends[key] = self._detect_backend(engine)
+                print(f"🔎 Material search backend: {self._backends[key]}")
+            return self._backends[key]
+    
+    def _detect_backend(self, engine) -> str:
+        dialect = engine.dialect.name
+        if self.source == 'like':
+            return 'like'
+        if dialect == 'mysql':
+            return 'mysql'
+        if dialect == 'sqlite':
+            try:
+                self.ensure_fts_schema()
+                return 'fts5'
+            except Exception as e:
+                print(f"⚠️  SQLite FTS5 not available, using LIKE search: {e}")
+        return 'like'
+    
+    def ensure_fts_schema(self):
+        """
+        Buat tabel FTS5 + trigger sync jika belum ada
+        Index di-rebuild dari teacher_materials saat trigger baru dibuat (tabel baru,
+        atau teacher_materials di-drop/dibuat ulang sehingga trigger lama ikut hilang)
+        """
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"judul, konten, content='teacher_materials', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            ))
+            existing = {
+                row[0] for row in connection.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'teacher_materials'"
+                ))
+            }
+            missing = [name for name in _FTS_TRIGGERS if name not in existing]
+            for name in missing:
+                connection.execute(text(_FTS_TRIGGERS[name]))
+            if missing:
+                connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+                print(f"🔄 Rebuilt {FTS_TABLE} from teacher_materials")
+    
+    def search(self, keyword: str, topik: str = None, level: str = None,
+               page: int = 1, per_page: int = 10, match: str = None) -> Dict[str, Any]:
+        """
+        Cari materi berdasarkan keyword
+        
+        Args:
+            keyword: Keyword (natural language, bukan sintaks boolean)
+            topik: Filter by topik (optional)
+            level: Filter by level (optional)
+            page: Halaman (mulai dari 1)
+            per_page: Jumlah materi per halaman
+            match: None = perilaku bawaan backend (LIKE: frasa utuh, full-text: salah satu kata),
+                'any' / 'all' = salah satu / semua kata di semua backend (LIKE dicek per kata),
+                supaya hasil antar backend bisa dibandingkan apple-to-apple
+        
+        Returns:
+            {'backend', 'total', 'results': [{'material_id', 'score'}]}
+            score = relevansi backend (MySQL / bm25), 0.0 untuk LIKE (urut terbaru)
+        """
+        if match is not None and match not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {match}")
+        
+        backend = self.backend()
+        params = {
+            'topik': topik.lower() if topik else None,
+            'level': level.lower() if level else None,
+            'limit': per_page,
+            'offset': (max(page, 1) - 1) * per_page
+        }
+        
+        if backend == 'like':
+            total, results = self._search_like(keyword, params, match)
+        else:
+            if backend == 'mysql':
+                if match == 'all':
+                    params['q'] = ' '.join(f'+"{token}"' for token in _TOKEN.findall(keyword.lower()))
+                else:
+                    params['q'] = keyword
+            else:
+                params['q'] = fts_query(keyword, 'AND' if match == 'all' else 'OR')
+            if not params['q']:
+                return {'backend': backend, 'total': 0, 'results': []}
+            total, results = self._search_fulltext(backend, params, boolean=match == 'all')
+        
+        return {'backend': backend, 'total': total, 'results': results}
+    
+    def _filters(self, params: Dict[str, Any], alias: str) -> str:
+        clauses = ''
+        if params['topik']:
+            clauses += f' AND {alias}.topik = :topik'
+        if params['level']:
+            clauses += f' AND {alias}.level = :level'
+        return clauses
+    
+    def _search_fulltext(self, backend: str, params: Dict[str, Any], boolean: bool = False):
+        filters = self._filters(params, 'm')
+        if backend == 'mysql':
+            mode = 'BOOLEAN' if boolean else 'NATURAL LANGUAGE'
+            match = f'MATCH (m.konten, m.judul) AGAINST (:q IN {mode} MODE)'
+            source, where, score, id_column = 'teacher_materials m', match, match, 'm.id'
+        else:
+            # bm25() FTS5 negatif (makin kecil makin relevan)
+            score = f'-bm25({FTS_TABLE}, {FTS_TITLE_WEIGHT}, 1.0)'
+            where = f'{FTS_TABLE} MATCH :q'
+            if filters:
+                source, id_column = f'{FTS_TABLE} JOIN teacher_materials m ON m.id = {FTS_TABLE}.rowid', 'm.id'
+            else:
+                # Tanpa filter: join ke teacher_materials tidak perlu (rowid = id materi), ~2x lebih cepat
+                source, id_column = FTS_TABLE, 'rowid'
+        where += filters
+        
+        total = db.session.execute(text(f'SELECT COUNT(*) FROM {source} WHERE {where}'), params).scalar()
+        rows = db.session.execute(text(
+            f'SELECT {id_column}, {score} AS score FROM {source} WHERE {where} '
+            f'ORDER BY score DESC, {id_column} DESC LIMIT :limit OFFSET :offset'
+        ), params).all()
+        return total, [{'material_id': row[0], 'score': float(row[1])} for row in rows]
+    
+    def _search_like(self, keyword: str, params: Dict[str, Any], match: str = None):
+        terms = [keyword] if match is None else _TOKEN.findall(keyword.lower())
+        if not terms:
+            return 0, []
+        conditions = [
+            db.or_(TeacherMaterial.judul.contains(term), TeacherMaterial.konten.contains(term))
+            for term in terms
+        ]
+        query = TeacherMaterial.query.filter(db.and_(*conditions) if match != 'any' else db.or_(*conditions))
+        if params['topik']:
+            query = query.filter_by(topik=params['topik'])
+        if params['level']:
+            query = query.filter_by(level=params['level'])
+        
+        total = query.count()
+        ids: List[int] = [
+            row.id for row in query.with_entities(TeacherMaterial.id)
+            .order_by(TeacherMaterial.created_at.desc(), TeacherMaterial.id.desc())
+            .limit(params['limit']).offset(params['offset'])
+        ]
+        return total, [{'material_id': material_id, 'score': 0.0} for material_id in ids]
+
+
+# Global instance
+search_service = SearchService()
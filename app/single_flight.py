@@ -0,0 +1,152 @@
+"""
+Single-flight untuk panggilan LLM
+Request identik (fingerprint prompt sama) yang datang bersamaan hanya memicu SATU panggilan model
+
+Contoh: guru memulai pelajaran, puluhan siswa minta penjelasan topik/level/gaya yang sama dalam
+satu detik. Cache response baru terisi setelah panggilan pertama selesai, jadi tanpa single-flight
+semua request itu miss dan masing-masing memanggil provider.
+
+Prinsip:
+1. Caller pertama untuk satu key = leader: memanggil model dan mem-publish hasilnya ke flight
+2. Caller berikutnya selama flight masih jalan = waiter: menunggu hasil leader (atau error-nya)
+3. Waiter streaming ikut menerima chunk leader satu per satu (tidak menunggu sampai selesai)
+4. Flight dihapus begitu leader selesai; request setelahnya dilayani cache response
+
+Cakupan per proses: antar worker gunicorn tidak berbagi flight (cache SQLite yang menjembatani).
+"""
+from typing import Any, Dict, Iterator, Optional, Tuple
+import threading
+import time
+
+
+class Flight:
+    """
+    Satu panggilan model yang sedang berjalan; hasilnya dibagikan ke semua waiter
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunks = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self.waiters = 0
+    
+    def publish(self, text: str):
+        with self._cond:
+            self._chunks.append(text)
+            self._cond.notify_all()
+    
+    def _finish(self, error: BaseException = None):
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+    
+    def result(self) -> str:
+        """
+        Tunggu leader selesai; teks lengkap atau exception dari leader
+        """
+        with self._cond:
+            while not self._done:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            return ''.join(self._chunks)
+    
+    def chunks(self) -> Iterator[str]:
+        """
+        Chunk dari leader begitu di-publish (termasuk yang sudah lewat sebelum waiter bergabung)
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                if index < len(self._chunks):
+                    pending = self._chunks[index:]
+                    index = len(self._chunks)
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield from pending
+
+
+class SingleFlight:
+    """
+    Registry flight per key + metrik per method
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Flight] = {}
+        self.max_waiters = 0
+        self.methods: Dict[str, Dict[str, Any]] = {}
+    
+    def _method_stats(self, method: str) -> Dict[str, Any]:
+        if method not in self.methods:
+            self.methods[method] = {'flights': 0, 'coalesced': 0, 'waits': 0, 'wait_ms': 0.0}
+        return self.methods[method]
+    
+    def join(self, key: str, method: str) -> Tuple[Flight, bool]:
+        """
+        Flight untuk key; True jika caller adalah leader
+        Leader WAJIB memanggil finish() (juga saat error), kalau tidak waiter menunggu selamanya
+        """
+        with self._lock:
+            stats = self._method_stats(method)
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                stats['flights'] += 1
+                return flight, True
+            
+            flight.waiters += 1
+            stats['coalesced'] += 1
+            self.max_waiters = max(self.max_waiters, flight.waiters)
+            return flight, False
+    
+    def finish(self, key: str, flight: Flight, error: BaseException = None):
+        """
+        Leader selesai: lepas key (request berikutnya membuat flight baru) lalu bangunkan waiter
+        GeneratorExit / KeyboardInterrupt milik leader (mis. client stream putus) tidak dilempar
+        apa adanya di thread waiter, diganti RuntimeError
+        """
+        if error is not None and not isinstance(error, Exception):
+            error = RuntimeError(f"In-flight LLM call was cancelled ({type(error).__name__})")
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight._finish(error)
+    
+    def wait(self, flight: Flight, method: str) -> str:
+        """
+        Waiter non-streaming: tunggu hasil leader (waktu tunggu dicatat untuk avg_wait_ms)
+        """
+        started = time.perf_counter()
+        try:
+            return flight.result()
+        finally:
+            waited = (time.perf_counter() - started) * 1000
+            with self._lock:
+                stats = self._method_stats(method)
+                stats['waits'] += 1
+                stats['wait_ms'] += waited
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {}
+            for method, counts in self.methods.items():
+                requests = counts['flights'] + counts['coalesced']
+                methods[method] = {
+                    'flights': counts['flights'],
+                    'coalesced': counts['coalesced'],
+                    'coalesced_rate': round(counts['coalesced'] / requests, 4) if requests else 0.0,
+                    'avg_wait_ms': round(counts['wait_ms'] / counts['waits'], 1) if counts['waits'] else 0.0
+                }
+            return {
+                'in_flight': len(self._flights),
+                'waiting': sum(flight.waiters for flight in self._flights.values()),
+                'max_waiters': self.max_waiters,
+                'methods': methods
+            }
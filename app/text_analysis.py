@@ -0,0 +1,168 @@
+"""
+Analisis teks Bahasa Indonesia untuk RAG index
+
+Pipeline:
+1. Lowercase + tokenisasi regex (precompiled)
+2. Buang stopword (kata fungsi: yang, dan, adalah, dengan, ...)
+3. Stemming ringan: partikel (-lah/-kah/-pun), -nya, -kan/-an, awalan me-/ber-/di-/ter-
+4. Stem per kata dan analisis string pendek (judul, topik, query) di-memoize (LRU)
+
+Stemmer sengaja konservatif (tanpa kamus): sisa kata minimal MIN_STEM_LENGTH huruf,
+token yang mengandung angka tidak di-stem. Yang penting index dan query memakai
+analyzer yang sama, sehingga "menghitung" cocok dengan "hitung" dan "rumusnya" dengan "rumus".
+Awalan pe-/per-, ke- dan se- sengaja tidak dibuang: terlalu banyak istilah matematika yang
+kata dasar (persegi, peluang, keliling, sejajar). Akhiran -i juga tidak (sisi, tinggi).
+"""
+from functools import lru_cache
+from typing import List, Tuple
+import re
+
+ANALYZERS = ('indonesian', 'simple')
+
+MIN_STEM_LENGTH = 4
+CACHE_MAX_CHARS = 256  # string lebih panjang (teks chunk) tidak di-cache
+
+_TOKEN = re.compile(r'\b\w+\b')
+
+STOPWORDS = frozenset('''
+    ada adalah agar akan aku anda antara apa apabila apakah atau bagaimana bahwa
+    beberapa belum berapa bila boleh bisa dalam dan dapat dari demikian
+    dengan di dia hal hanya harus hingga ia ialah ini itu jadi jika juga kalau
+    kami kamu kapan karena ke kenapa ketika kita lagi lain maka mana masing
+    masih melalui memang mengapa mereka merupakan namun nya oleh pada para per
+    pernah pula pun saat saja sambil sampai sangat saya se sebagai sebelum
+    secara sedang sehingga sekali seluruh semua seorang seperti serta sesudah
+    setelah setiap suatu sudah supaya tanpa tapi telah tentang tersebut tetapi
+    tiap untuk usai walaupun yaitu yakni yang
+'''.split())
+
+_PARTICLES = ('lah', 'kah', 'pun')
+_POSSESSIVES = ('nya',)
+_DERIVATIONAL = ('kan', 'an')
+
+# Peluluhan me- ambigu tanpa kamus: meng+vokal bisa dari vokal ("mengukur") atau k- ("mengalikan"),
+# mem+vokal dari m- ("memiliki") atau p- ("memakai"), men+vokal dari t- ("menulis") atau n- ("menilai").
+# Dipakai bentuk yang paling umum, kecuali kata dasar (setelah akhiran dibuang) ada di daftar ini
+_K_STEMS = frozenset('kali kenal ketahui kumpul kurang kurangi'.split())
+_P_STEMS = frozenset('pakai paham pahami pecah pilih pindah pisah potong pukul putar'.split())
+_N_STEMS = frozenset('nama namai nilai nyata'.split())
+
+# Kata dasar yang kebetulan diawali di-/ter-
+_NOT_PREFIXED = frozenset('''
+    diagonal diagram diameter digital dimensi dinding diskon distribusi
+    terapi terang teras terminal termometer ternak
+'''.split())
+
+
+def _strip_suffix(word: str, suffixes, min_length: int = MIN_STEM_LENGTH) -> str:
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_length:
+            return word[:-len(suffix)]
+    return word
+
+
+def _strip_prefix(word: str) -> str:
+    """
+    Awalan me- (meng-/meny-/mem-/men-/me-), ber- (ber-/be-/bel-), di- dan ter- dengan peluluhan sederhana
+    """
+    candidate = word
+    if word.startswith('meng'):
+        rest = word[4:]
+        candidate = 'k' + rest if 'k' + rest in _K_STEMS else rest
+    elif word.startswith('meny'):
+        candidate = 's' + word[4:]
+    elif word.startswith('mem'):
+        rest = word[3:]
+        if rest[:1] in ('b', 'f', 'v', 'p'):
+            candidate = rest
+        elif 'p' + rest in _P_STEMS:
+            candidate = 'p' + rest
+        else:
+            candidate = word[2:]
+    elif word.startswith('men'):
+        rest = word[3:]
+        if rest[:1] not in ('a', 'e', 'i', 'o', 'u'):
+            candidate = rest
+        elif word[2:] in _N_STEMS:
+            candidate = word[2:]
+        else:
+            candidate = 't' + rest
+    elif word.startswith('me') and word[2:3] in ('l', 'r', 'w', 'y', 'm', 'n'):
+        candidate = word[2:]
+    elif word.startswith('belajar'):
+        candidate = word[3:]
+    elif word.startswith('ber'):
+        candidate = word[3:]
+    elif word.startswith('be') and word[2:3] == 'r':
+        candidate = word[2:]
+    elif word.startswith('di') and word not in _NOT_PREFIXED:
+        candidate = word[2:]
+    elif word.startswith('ter') and word not in _NOT_PREFIXED:
+        candidate = word[3:]
+    
+    return candidate if len(candidate) >= MIN_STEM_LENGTH else word
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """
+    Stem satu kata (lowercase)
+    """
+    if not word.isalpha():
+        return word
+    
+    # Partikel lebih ketat: "langkah", "sekolah", "masalah" bukan kata + partikel
+    word = _strip_suffix(word, _PARTICLES, MIN_STEM_LENGTH + 1)
+    word = _strip_suffix(word, _POSSESSIVES)
+    word = _strip_suffix(word, _DERIVATIONAL)
+    return _strip_prefix(word)
+
+
+def _analyze(text: str, analyzer: str) -> List[str]:
+    tokens = _TOKEN.findall(text.lower())
+    if analyzer == 'simple':
+        return tokens
+    return [stem(token) for token in tokens if token not in STOPWORDS]
+
+
+@lru_cache(maxsize=4096)
+def _analyze_cached(text: str, analyzer: str) -> tuple:
+    return tuple(_analyze(text, analyzer))
+
+
+def analyze(text: str, analyzer: str = 'indonesian') -> List[str]:
+    """
+    Token ter-analisis dari `text`
+    
+    Args:
+        text: Teks (chunk, judul atau query)
+        analyzer: 'indonesian' (stopword + stemming) atau 'simple' (regex saja, perilaku lama)
+    """
+    if analyzer not in ANALYZERS:
+        raise ValueError(f"Unknown analyzer: {analyzer}")
+    
+    # Judul, topik dan query berulang terus: hasil analisisnya di-memoize
+    if len(text) <= CACHE_MAX_CHARS:
+        return list(_analyze_cached(text, analyzer))
+    return _analyze(text, analyzer)
+
+
+def analyze_spans(text: str, analyzer: str = 'indonesian') -> List[Tuple[str, int, int]]:
+    """
+    (token ter-analisis, start, end) dengan char offset di `text` asli (untuk highlight snippet)
+    """
+    spans = []
+    for match in _TOKEN.finditer(text):
+        token = match.group().lower()
+        if analyzer == 'simple':
+            spans.append((token, match.start(), match.end()))
+        elif token not in STOPWORDS:
+            spans.append((stem(token), match.start(), match.end()))
+    return spans
+
+
+def cache_info() -> dict:
+    return {
+        'stem': stem.cache_info()._asdict(),
+        'analyze': _analyze_cached.cache_info()._asdict()
+    }
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark strategi chunking RAG (paragraph / sentence / window)
+Membandingkan jumlah chunk, ukuran prompt konteks dan latency retrieval
+
+Usage:
+    python benchmark_chunking.py                     # corpus sintetis
+    python benchmark_chunking.py materi1.txt materi2.txt
+    python benchmark_chunking.py --materials 500 --json hasil.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+from app.rag_service import RAGService
+from app.chunking import STRATEGIES
+
+TOPIKS = ['kubus', 'balok', 'prisma', 'limas', 'tabung', 'kerucut', 'bola']
+LEVELS = ['pemula', 'menengah', 'mahir']
+QUERIES = [
+    'volume kubus', 'luas permukaan balok', 'rumus volume prisma segitiga',
+    'jaring-jaring limas', 'tinggi tabung', 'garis pelukis kerucut',
+    'jari-jari bola', 'contoh soal volume', 'rusuk dan titik sudut', 'diagonal ruang'
+]
+VOCAB = [
+    'volume', 'luas', 'permukaan', 'rusuk', 'sisi', 'alas', 'tinggi', 'jari-jari',
+    'diameter', 'rumus', 'contoh', 'soal', 'hitung', 'adalah', 'sama', 'dengan',
+    'panjang', 'lebar', 'segitiga', 'persegi', 'lingkaran', 'diagonal', 'bidang',
+    'titik', 'sudut', 'jaring-jaring', 'satuan', 'cm³', 'kali', 'dibagi'
+]
+
+
+def synthetic_text(rng: random.Random, topik: str) -> str:
+    """
+    Teks materi sintetis: campuran paragraf pendek, paragraf panjang,
+    dan blok tanpa baris kosong (seperti hasil ekstraksi PDF)
+    """
+    paragraphs = []
+    for _ in range(rng.randint(3, 12)):
+        sentences = []
+        for _ in range(rng.randint(1, 12)):
+            words = [rng.choice(VOCAB + [topik]) for _ in range(rng.randint(6, 25))]
+            sentences.append(' '.join(words).capitalize() + '.')
+        paragraphs.append(' '.join(sentences))
+    separator = '\n' if rng.random() < 0.3 else '\n\n'
+    return separator.join(paragraphs)
+
+
+def load_materials(args):
+    rng = random.Random(args.seed)
+    materials = []
+    
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8') as f:
+            materials.append((os.path.basename(path), rng.choice(TOPIKS), rng.choice(LEVELS), f.read()))
+    
+    if not args.files:
+        for i in range(args.materials):
+            topik = rng.choice(TOPIKS)
+            materials.append((f'Materi {topik.title()} {i}', topik, rng.choice(LEVELS), synthetic_text(rng, topik)))
+    
+    return [
+        SimpleNamespace(
+            id=i + 1, judul=judul, topik=topik, level=level, created_by=1,
+            file_path=None, konten=text
+        )
+        for i, (judul, topik, level, text) in enumerate(materials)
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_strategy(strategy: str, materials, args):
+    rag = RAGService()
+    rag.chunk_strategy = strategy
+    rag.result_cache.max_entries = 0  # ukur scoring, bukan cache
+    
+    started = time.perf_counter()
+    for material in materials:
+        rag._index_material(material)
+    index_seconds = time.perf_counter() - started
+    rag.is_loaded = True
+    
+    lengths = [len(rag.chunks_cache.text(chunk_id)) for chunk_id in rag.chunks_cache]
+    
+    latencies = []
+    prompt_sizes = []
+    for _ in range(args.repeat):
+        for query in QUERIES:
+            started = time.perf_counter()
+            contexts = rag.retrieve_context(query, top_k=args.top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            prompt_sizes.append(len(rag.format_context_for_llm(contexts)))
+    
+    return {
+        'strategy': strategy,
+        'chunks': len(lengths),
+        'chunk_chars_avg': round(statistics.mean(lengths), 1) if lengths else 0,
+        'chunk_chars_max': max(lengths) if lengths else 0,
+        'index_seconds': round(index_seconds, 3),
+        'prompt_chars_avg': round(statistics.mean(prompt_sizes), 1),
+        'prompt_chars_max': max(prompt_sizes),
+        'prompt_tokens_est': round(statistics.mean(prompt_sizes) / 4),
+        'retrieval_ms_p50': round(percentile(latencies, 50), 3),
+        'retrieval_ms_p95': round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chunking strategies')
+    parser.add_argument('files', nargs='*', help='File .txt materi (default: corpus sintetis)')
+    parser.add_argument('--materials', type=int, default=200, help='Jumlah materi sintetis')
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Simpan hasil ke file JSON')
+    args = parser.parse_args()
+    
+    materials = load_materials(args)
+    print(f"\nBENCHMARK CHUNKING - {len(materials)} materials, top_k={args.top_k}")
+    print("=" * 100)
+    print(f"{'strategy':<10} {'chunks':>7} {'avg chars':>10} {'max chars':>10} {'index s':>8} "
+          f"{'prompt avg':>11} {'prompt max':>11} {'~tokens':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    
+    results = []
+    for strategy in STRATEGIES:
+        result = run_strategy(strategy, materials, args)
+        results.append(result)
+        print(f"{result['strategy']:<10} {result['chunks']:>7} {result['chunk_chars_avg']:>10} "
+              f"{result['chunk_chars_max']:>10} {result['index_seconds']:>8} {result['prompt_chars_avg']:>11} "
+              f"{result['prompt_chars_max']:>11} {result['prompt_tokens_est']:>8} "
+              f"{result['retrieval_ms_p50']:>8} {result['retrieval_ms_p95']:>8}")
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'materials': len(materials), 'top_k': args.top_k, 'results': results}, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
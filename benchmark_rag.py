@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark RAGService end-to-end: build index, memory, latency retrieve_context, cache hit rate
+Corpus sintetis materi bangun ruang (Bahasa Indonesia) untuk semua kombinasi topik x level,
+disimpan di SQLite sementara lalu di-index lewat jalur asli (reload_materials + snapshot)
+
+Build dan query tiap skala dijalankan di proses terpisah (seperti worker baru yang attach snapshot)
+supaya angka memory (RSS) tidak tercampur.
+
+Usage:
+    python benchmark_rag.py                                  # 10 / 1k / 10k / 100k chunk
+    python benchmark_rag.py --scales 10,1000 --json hasil.json
+    python benchmark_rag.py --baseline baseline.json         # bandingkan dengan hasil sebelumnya
+    python benchmark_rag.py --baseline baseline.json --fail-on-regression
+
+Baseline = file --json dari run sebelumnya (mesin yang sama); tidak ada baseline bawaan.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TOPIKS = ['kubus', 'balok', 'prisma', 'limas', 'tabung', 'kerucut', 'bola']
+LEVELS = ['pemula', 'menengah', 'mahir']
+SCALES = [10, 1000, 10000, 100000]
+
+# Unsur, ukuran dan rumus per bangun ruang (bahan kalimat sintetis)
+SHAPES = {
+    'kubus': (['rusuk', 'sisi', 'titik sudut', 'diagonal ruang'], ['panjang rusuk'],
+              ['V = s × s × s', 'L = 6 × s × s']),
+    'balok': (['rusuk', 'sisi', 'diagonal bidang', 'diagonal ruang'], ['panjang', 'lebar', 'tinggi'],
+              ['V = p × l × t', 'L = 2 × (pl + pt + lt)']),
+    'prisma': (['alas', 'sisi tegak', 'rusuk tegak'], ['luas alas', 'tinggi prisma'],
+               ['V = luas alas × tinggi', 'L = 2 × luas alas + keliling alas × tinggi']),
+    'limas': (['alas', 'sisi tegak', 'titik puncak'], ['luas alas', 'tinggi limas'],
+              ['V = 1/3 × luas alas × tinggi', 'L = luas alas + jumlah luas sisi tegak']),
+    'tabung': (['alas', 'tutup', 'selimut'], ['jari-jari', 'tinggi tabung'],
+               ['V = π × r × r × t', 'L = 2 × π × r × (r + t)']),
+    'kerucut': (['alas', 'selimut', 'garis pelukis'], ['jari-jari', 'tinggi kerucut'],
+                ['V = 1/3 × π × r × r × t', 'L = π × r × (r + s)']),
+    'bola': (['pusat', 'jari-jari', 'diameter'], ['jari-jari', 'diameter'],
+             ['V = 4/3 × π × r × r × r', 'L = 4 × π × r × r']),
+}
+SENTENCES = [
+    '{Topik} memiliki {unsur} yang perlu dikenali sebelum menghitung {besaran}.',
+    'Jika {ukuran} {topik} adalah {a} cm, maka {besaran} dihitung dengan rumus {rumus}.',
+    'Contoh soal: sebuah {topik} mempunyai {ukuran} {a} cm. Hitunglah {besaran} {topik} tersebut.',
+    'Pada tingkat {level}, siswa mengerjakan soal {besaran} {topik} dengan satuan cm³ atau cm².',
+    'Perhatikan gambar {topik} berikut, lalu tentukan {unsur} dan {ukuran} yang diketahui.',
+    'Langkah penyelesaian: tulis rumus {rumus}, substitusi {ukuran} = {a}, kemudian hitung hasilnya.',
+]
+QUERY_TEMPLATES = [
+    'volume {topik}', 'luas permukaan {topik}', 'rumus {besaran} {topik}',
+    'contoh soal {topik}', '{unsur} {topik}', 'cara menghitung {ukuran} {topik}',
+]
+FILLER_WORDS = 5000  # kosakata umum (Zipf) supaya document frequency realistis
+SYLLABLES = ['ba', 'ka', 'la', 'ma', 'na', 'pa', 'ra', 'sa', 'ta', 'ri', 'ku', 'me', 'ng', 'di', 'an', 'lu']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def pseudo_word(rank: int) -> str:
+    """
+    Kata semu deterministik dari suku kata (mis. 'kamari'), dipakai sebagai kosakata umum
+    """
+    syllables = []
+    rank += len(SYLLABLES)
+    while rank:
+        rank, digit = divmod(rank, len(SYLLABLES))
+        syllables.append(SYLLABLES[digit])
+    return ''.join(syllables)
+
+
+class CorpusGenerator:
+    """
+    Materi sintetis: paragraf ~300-480 karakter (satu paragraf ~ satu chunk strategi paragraph),
+    topik x level bergiliran supaya semua partisi terisi
+    """
+    
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.filler = [pseudo_word(rank) for rank in range(FILLER_WORDS)]
+        self.cumulative = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(FILLER_WORDS)))
+        self.combinations = [(topik, level) for topik in TOPIKS for level in LEVELS]
+    
+    def _fields(self, topik: str, level: str) -> dict:
+        unsur, ukuran, rumus = SHAPES[topik]
+        return {
+            'topik': topik, 'Topik': topik.title(), 'level': level,
+            'unsur': self.rng.choice(unsur), 'ukuran': self.rng.choice(ukuran),
+            'rumus': self.rng.choice(rumus), 'besaran': self.rng.choice(['volume', 'luas permukaan']),
+            'a': self.rng.randint(2, 30)
+        }
+    
+    def paragraph(self, topik: str, level: str) -> str:
+        sentences = []
+        length = 0
+        target = self.rng.randint(300, 480)
+        while length < target:
+            if self.rng.random() < 0.6:
+                sentence = self.rng.choice(SENTENCES).format(**self._fields(topik, level))
+            else:
+                words = self.rng.choices(self.filler, cum_weights=self.cumulative, k=self.rng.randint(6, 14))
+                sentence = ' '.join(words).capitalize() + '.'
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        return ' '.join(sentences)
+    
+    def materials(self, target_chunks: int):
+        """
+        Materi sampai estimasi jumlah chunk mencapai target_chunks
+        """
+        per_material = 1 if target_chunks < 100 else 5
+        produced = 0
+        for number in itertools.count():
+            if produced >= target_chunks:
+                return
+            topik, level = self.combinations[number % len(self.combinations)]
+            paragraphs = min(per_material, target_chunks - produced)
+            produced += paragraphs
+            yield {
+                'judul': f'{topik.title()} {level.title()}: {self.rng.choice(SHAPES[topik][1]).title()} {number}',
+                'topik': topik,
+                'level': level,
+                'konten': '\n\n'.join(self.paragraph(topik, level) for _ in range(paragraphs)),
+                'created_by': 'Benchmark'
+            }
+    
+    def queries(self, count: int):
+        """
+        Workload query: pool query x filter (tanpa filter / topik / topik + level), dipilih Zipf
+        sehingga query populer berulang (seperti query=topik dari quiz dan step-by-step)
+        """
+        pool = []
+        for template in QUERY_TEMPLATES:
+            for topik in TOPIKS:
+                text = template.format(**self._fields(topik, 'pemula'))
+                pool.append((text, None, None))
+                pool.append((text, topik, None))
+                pool.extend((text, topik, level) for level in LEVELS)
+        self.rng.shuffle(pool)
+        weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(pool))))
+        return self.rng.choices(pool, cum_weights=weights, k=count)
+
+
+def peak_rss() -> int:
+    if resource is None:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def measure_queries(rag, queries, top_k: int):
+    latencies = []
+    for query, topik, level in queries:
+        started = time.perf_counter()
+        rag.retrieve_context(query, topik, level, top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def _create_app(work_dir: str):
+    """
+    App Flask dengan SQLite + snapshot di work_dir (env harus di-set sebelum modul app di-import)
+    """
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench_rag.db')}"
+    os.environ['RAG_SNAPSHOT_PATH'] = os.path.join(work_dir, 'rag_index.snapshot')
+    from app import create_app
+    return create_app()
+
+
+def build_phase(target_chunks: int, args, work_dir: str) -> dict:
+    """
+    Proses 1: seed materi ke SQLite lalu build index dari DB (cold start tanpa snapshot)
+    """
+    app = _create_app(work_dir)
+    from app.models import db, TeacherMaterial
+    from app.rag_service import RAGService
+    
+    with app.app_context():
+        started = time.perf_counter()
+        batch = []
+        for row in CorpusGenerator(args.seed).materials(target_chunks):
+            batch.append(row)
+            if len(batch) == 2000:
+                db.session.execute(db.insert(TeacherMaterial), batch)
+                batch = []
+        if batch:
+            db.session.execute(db.insert(TeacherMaterial), batch)
+        db.session.commit()
+        seed_seconds = time.perf_counter() - started
+        
+        # DB -> chunk -> index -> snapshot
+        rag = RAGService()
+        base_rss = rag.get_memory_stats()['process_rss_bytes']
+        started = time.perf_counter()
+        rag.reload_materials()
+        build_seconds = time.perf_counter() - started
+        stats = rag.get_memory_stats()
+        db.session.remove()
+    
+    return {
+        'target_chunks': target_chunks,
+        'materials': stats['materials'],
+        'chunks': stats['chunks'],
+        'partitions': stats['partitions'],
+        'seed_seconds': round(seed_seconds, 3),
+        'build_seconds': round(build_seconds, 3),
+        'build_peak_rss_mb': round((peak_rss() - base_rss) / 2**20, 1),
+        'snapshot_bytes': os.path.getsize(os.environ['RAG_SNAPSHOT_PATH']),
+    }
+
+
+def serve_phase(args, work_dir: str) -> dict:
+    """
+    Proses 2 (seperti worker baru): attach snapshot, lalu workload query tanpa dan dengan cache
+    """
+    app = _create_app(work_dir)
+    from app.models import db
+    from app.rag_service import RAGService, RetrievalCache
+    
+    with app.app_context():
+        rag = RAGService()
+        base_rss = rag.get_memory_stats()['process_rss_bytes']
+        started = time.perf_counter()
+        rag._ensure_loaded()
+        attach_seconds = time.perf_counter() - started
+        
+        queries = CorpusGenerator(args.seed).queries(args.queries)
+        rag.result_cache.max_entries = 0
+        uncached = measure_queries(rag, queries, args.top_k)
+        
+        rag.result_cache = RetrievalCache(args.cache_entries, 32 * 1024 * 1024)
+        cached = measure_queries(rag, queries, args.top_k)
+        stats = rag.get_memory_stats()
+        hit_rate = rag.get_cache_stats()['hit_rate']
+        db.session.remove()
+    
+    return {
+        'attach_seconds': round(attach_seconds, 4),
+        'rss_mb': round((stats['process_rss_bytes'] - base_rss) / 2**20, 1),
+        'resident_partition_mb': round(stats['partition_cache']['resident_bytes'] / 2**20, 1),
+        'queries': len(queries),
+        'uncached_ms_p50': round(percentile(uncached, 50), 3),
+        'uncached_ms_p99': round(percentile(uncached, 99), 3),
+        'ms_p50': round(percentile(cached, 50), 3),
+        'ms_p99': round(percentile(cached, 99), 3),
+        'ms_mean': round(statistics.mean(cached), 3),
+        'cache_hit_rate': hit_rate,
+    }
+
+
+def run_child(phase: str, scale: int, work_dir: str, args) -> dict:
+    output = os.path.join(work_dir, f'{phase}.json')
+    command = [
+        sys.executable, os.path.abspath(__file__), '--child', phase, '--child-scale', str(scale),
+        '--child-dir', work_dir, '--queries', str(args.queries), '--top-k', str(args.top_k),
+        '--cache-entries', str(args.cache_entries), '--seed', str(args.seed)
+    ]
+    completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{phase} phase failed:\n{completed.stderr}")
+    with open(output, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Metrik yang dibandingkan dengan baseline (semua: makin kecil makin baik)
+COMPARE_METRICS = ['build_seconds', 'build_peak_rss_mb', 'attach_seconds', 'rss_mb', 'uncached_ms_p50', 'uncached_ms_p99', 'ms_p99']
+
+
+def compare_baseline(results, baseline, threshold: float):
+    """
+    Cetak perubahan relatif per skala; return daftar (skala, metrik, perubahan) yang melewati threshold
+    """
+    previous = {result['target_chunks']: result for result in baseline.get('results', [])}
+    regressions = []
+    print(f"\nBASELINE COMPARISON (regression > {threshold:.0%})")
+    print("=" * 70)
+    print(f"{'chunks':>8} {'metric':<17} {'baseline':>10} {'current':>10} {'change':>9}")
+    for result in results:
+        old = previous.get(result['target_chunks'])
+        if old is None:
+            print(f"{result['target_chunks']:>8} (not in baseline)")
+            continue
+        for metric in COMPARE_METRICS:
+            if metric not in old:
+                continue
+            before, after = old[metric], result[metric]
+            change = (after - before) / before if before else 0.0
+            flag = ''
+            if change > threshold:
+                flag = ' ⚠️'
+                regressions.append((result['target_chunks'], metric, change))
+            print(f"{result['target_chunks']:>8} {metric:<17} {before:>10} {after:>10} {change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark RAG retrieval (synthetic corpus, SQLite)')
+    parser.add_argument('--scales', default=','.join(str(scale) for scale in SCALES),
+                        help='Target jumlah chunk, dipisah koma')
+    parser.add_argument('--queries', type=int, default=1000, help='Jumlah query per skala')
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--cache-entries', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Simpan hasil ke file JSON (bisa dipakai sebagai baseline)')
+    parser.add_argument('--baseline', help='File JSON hasil run sebelumnya untuk dibandingkan')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Batas regresi relatif (0.25 = +25%%)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit code 1 jika ada regresi')
+    parser.add_argument('--child', choices=['build', 'serve'], help=argparse.SUPPRESS)
+    parser.add_argument('--child-scale', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--child-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        if args.child == 'build':
+            result = build_phase(args.child_scale, args, args.child_dir)
+        else:
+            result = serve_phase(args, args.child_dir)
+        with open(os.path.join(args.child_dir, f'{args.child}.json'), 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return 0
+    
+    scales = [int(scale) for scale in args.scales.split(',') if scale.strip()]
+    print(f"\nBENCHMARK RAG - scales {scales}, {args.queries} queries/scale, top_k={args.top_k}")
+    print("=" * 120)
+    print(f"{'chunks':>8} {'materials':>9} {'build s':>8} {'build MB':>9} {'attach s':>9} {'rss MB':>7} "
+          f"{'nocache p50':>12} {'nocache p99':>12} {'p50 ms':>8} {'p99 ms':>8} {'hit rate':>9}")
+    
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as work_dir:
+            try:
+                result = run_child('build', scale, work_dir, args)
+                result.update(run_child('serve', scale, work_dir, args))
+            except RuntimeError as e:
+                print(f"❌ Scale {scale}: {e}")
+                return 1
+        
+        results.append(result)
+        print(f"{result['chunks']:>8} {result['materials']:>9} {result['build_seconds']:>8} "
+              f"{result['build_peak_rss_mb']:>9} {result['attach_seconds']:>9} {result['rss_mb']:>7} "
+              f"{result['uncached_ms_p50']:>12} {result['uncached_ms_p99']:>12} "
+              f"{result['ms_p50']:>8} {result['ms_p99']:>8} {result['cache_hit_rate']:>9}")
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'benchmark': 'rag',
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'params': {'queries': args.queries, 'top_k': args.top_k,
+                           'cache_entries': args.cache_entries, 'seed': args.seed},
+                'results': results
+            }, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_baseline(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} metric(s) regressed more than {args.threshold:.0%}")
+            if args.fail_on_regression:
+                return 1
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
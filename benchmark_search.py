@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark search materi: LIKE '%kata%' vs full-text database (SQLite FTS5 / MySQL FULLTEXT)
+Tabel teacher_materials diisi materi sintetis, lalu latency tiap query diukur per backend
+
+Kedua backend dijalankan dengan semantik yang sama (--match all: semua kata harus ada,
+--match any: salah satu kata; LIKE dicek per kata), dan kesamaan himpunan hasilnya
+(materi yang cocok) dilaporkan di samping latency. LIKE mencocokkan substring sedangkan
+full-text mencocokkan token utuh, jadi kesamaan tidak selalu 100%.
+
+Usage:
+    python benchmark_search.py                              # 100k materi, SQLite file sementara
+    python benchmark_search.py --materials 10000 --json hasil.json
+    python benchmark_search.py --match any
+    python benchmark_search.py --database-url mysql+pymysql://root:pw@localhost/bench_search
+
+PERINGATAN: tabel teacher_materials di --database-url dikosongkan dan diisi ulang.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+TOPIKS = ['kubus', 'balok', 'prisma', 'limas', 'tabung', 'kerucut', 'bola']
+LEVELS = ['pemula', 'menengah', 'mahir']
+QUERIES = [
+    'volume kubus', 'luas permukaan balok', 'rumus volume prisma segitiga',
+    'jaring-jaring limas', 'tinggi tabung', 'garis pelukis kerucut',
+    'jari-jari bola', 'contoh soal volume', 'rusuk dan titik sudut', 'diagonal ruang'
+]
+VOCAB = [
+    'volume', 'luas', 'permukaan', 'rusuk', 'sisi', 'alas', 'tinggi', 'jari-jari',
+    'diameter', 'rumus', 'contoh', 'soal', 'hitung', 'adalah', 'sama', 'dengan',
+    'panjang', 'lebar', 'segitiga', 'persegi', 'lingkaran', 'diagonal', 'bidang',
+    'titik', 'sudut', 'jaring-jaring', 'satuan', 'cm³', 'kali', 'dibagi', 'garis', 'pelukis'
+]
+FILLER_WORDS = 20000
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def synthetic_rows(count: int, seed: int):
+    """
+    Materi sintetis: kata umum dari kosakata Zipf (FILLER_WORDS kata) + istilah bangun ruang,
+    supaya kata kunci query tidak muncul di semua materi
+    """
+    rng = random.Random(seed)
+    filler = [f'kata{rank}' for rank in range(FILLER_WORDS)]
+    cumulative = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(FILLER_WORDS)))
+    for i in range(count):
+        topik = rng.choice(TOPIKS)
+        length = rng.randint(60, 200)
+        words = rng.choices(filler, cum_weights=cumulative, k=length)
+        for position in rng.sample(range(length), length // 10):
+            words[position] = rng.choice(VOCAB + [topik])
+        yield {
+            'judul': f'Materi {topik.title()} {rng.choice(VOCAB).title()} {i}',
+            'topik': topik,
+            'level': rng.choice(LEVELS),
+            'konten': ' '.join(words).capitalize() + '.',
+            'created_by': 'Benchmark'
+        }
+
+
+def seed_materials(db, TeacherMaterial, count: int, seed: int) -> float:
+    started = time.perf_counter()
+    db.session.query(TeacherMaterial).delete()
+    db.session.commit()
+    
+    batch = []
+    for row in synthetic_rows(count, seed):
+        batch.append(row)
+        if len(batch) == 5000:
+            db.session.execute(db.insert(TeacherMaterial), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(TeacherMaterial), batch)
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+def run_backend(name: str, service, args):
+    latencies = []
+    totals = {}
+    for _ in range(args.repeat):
+        for query in QUERIES:
+            started = time.perf_counter()
+            result = service.search(query, per_page=args.per_page, match=args.match)
+            latencies.append((time.perf_counter() - started) * 1000)
+            totals[query] = result['total']
+    
+    return {
+        'backend': name,
+        'queries': len(latencies),
+        'matches_avg': round(statistics.mean(totals.values()), 1),
+        'ms_p50': round(percentile(latencies, 50), 3),
+        'ms_p95': round(percentile(latencies, 95), 3),
+        'ms_max': round(max(latencies), 3),
+    }
+
+
+def matching_ids(service, query: str, args) -> set:
+    """
+    Semua id materi yang cocok (di luar pengukuran latency)
+    """
+    return {hit['material_id'] for hit in service.search(query, per_page=args.materials, match=args.match)['results']}
+
+
+def agreement(like, fulltext, args):
+    """
+    Kesamaan himpunan hasil per query: Jaccard |A ∩ B| / |A ∪ B| (1.0 jika keduanya kosong)
+    """
+    per_query = {}
+    for query in QUERIES:
+        like_ids = matching_ids(like, query, args)
+        fulltext_ids = matching_ids(fulltext, query, args)
+        union = like_ids | fulltext_ids
+        per_query[query] = {
+            'like': len(like_ids),
+            'fulltext': len(fulltext_ids),
+            'both': len(like_ids & fulltext_ids),
+            'jaccard': round(len(like_ids & fulltext_ids) / len(union), 4) if union else 1.0
+        }
+    return {
+        'identical_queries': sum(1 for item in per_query.values() if item['jaccard'] == 1.0),
+        'jaccard_avg': round(statistics.mean(item['jaccard'] for item in per_query.values()), 4),
+        'queries': per_query
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LIKE vs full-text material search')
+    parser.add_argument('--materials', type=int, default=100000, help='Jumlah materi sintetis')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--match', choices=('all', 'any'), default='all',
+                        help='Semantik query untuk kedua backend: semua kata (default) atau salah satu kata')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='Default: file SQLite sementara')
+    parser.add_argument('--json', help='Simpan hasil ke file JSON')
+    args = parser.parse_args()
+    
+    temp_dir = None
+    if not args.database_url:
+        temp_dir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(temp_dir.name, 'bench_search.db')}"
+    os.environ['DATABASE_URL'] = args.database_url
+    
+    from app import create_app
+    from app.models import db, TeacherMaterial
+    from app.search_service import SearchService
+    
+    app = create_app()
+    with app.app_context():
+        seed_seconds = seed_materials(db, TeacherMaterial, args.materials, args.seed)
+        print(f"\nBENCHMARK SEARCH - {args.materials} materials ({db.engine.dialect.name}), seeded in {seed_seconds:.1f}s")
+        
+        like = SearchService()
+        like.source = 'like'
+        fulltext = SearchService()
+        fulltext.source = 'database'
+        
+        # Setup FTS5 (tabel + trigger + rebuild) dihitung terpisah dari latency query
+        started = time.perf_counter()
+        fulltext_backend = fulltext.backend()
+        setup_seconds = time.perf_counter() - started
+        print(f"Full-text backend: {fulltext_backend} (setup {setup_seconds:.1f}s)")
+        
+        print(f"Match mode: {args.match} (same semantics on both backends)")
+        print("=" * 70)
+        print(f"{'backend':<10} {'queries':>8} {'matches avg':>12} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        
+        results = []
+        for name, service in (('like', like), (fulltext_backend, fulltext)):
+            result = run_backend(name, service, args)
+            results.append(result)
+            print(f"{result['backend']:<10} {result['queries']:>8} {result['matches_avg']:>12} "
+                  f"{result['ms_p50']:>10} {result['ms_p95']:>10} {result['ms_max']:>10}")
+        
+        agree = agreement(like, fulltext, args)
+        print("=" * 70)
+        print(f"Result-set agreement: {agree['identical_queries']}/{len(QUERIES)} queries identical, "
+              f"mean Jaccard {agree['jaccard_avg']}")
+        for query, item in agree['queries'].items():
+            if item['jaccard'] < 1.0:
+                print(f"  {query!r}: like {item['like']}, {fulltext_backend} {item['fulltext']}, "
+                      f"both {item['both']} (Jaccard {item['jaccard']})")
+        
+        dialect = db.engine.dialect.name
+        db.session.remove()
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'materials': args.materials,
+                'dialect': dialect,
+                'match': args.match,
+                'seed_seconds': round(seed_seconds, 3),
+                'fulltext_setup_seconds': round(setup_seconds, 3),
+                'results': results,
+                'agreement': agree
+            }, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+    
+    if temp_dir is not None:
+        temp_dir.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+-- =========================================
+-- Migration: Upload-time Text Extraction
+-- Date: 2026-10-16
+-- Purpose: Simpan teks hasil ekstraksi file sekali saat upload (key SHA-256)
+-- =========================================
+
+USE `emotiva_math`;
+
+-- Hash file dan status ekstraksi per materi
+ALTER TABLE teacher_materials
+  ADD COLUMN file_hash VARCHAR(64) NULL COMMENT 'SHA-256 isi file' AFTER file_type,
+  ADD COLUMN extraction_status VARCHAR(20) NULL COMMENT 'extracting / ready / failed' AFTER file_hash;
+
+CREATE INDEX ix_teacher_materials_file_hash ON teacher_materials(file_hash);
+
+-- Cache teks hasil ekstraksi (dibagi oleh file yang identik)
+CREATE TABLE IF NOT EXISTS extracted_texts (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    text LONGTEXT NOT NULL COMMENT 'Plain text hasil ekstraksi',
+    char_count INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Setelah migration, jalankan backfill untuk materi file yang sudah ada:
+--   python migrate_extraction.py
+
+SELECT 'Migration completed successfully!' as status;
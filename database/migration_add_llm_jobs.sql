@@ -0,0 +1,23 @@
+-- =========================================
+-- Migration: Asynchronous LLM Jobs
+-- Date: 2026-10-17
+-- Purpose: Job generate quiz (dan LLM lain) dijalankan di background, client polling status
+-- =========================================
+
+USE `emotiva_math`;
+
+CREATE TABLE IF NOT EXISTS llm_jobs (
+    id VARCHAR(36) PRIMARY KEY COMMENT 'uuid4',
+    kind VARCHAR(50) NOT NULL COMMENT 'Jenis job, mis. quiz',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' COMMENT 'queued / running / succeeded / failed',
+    user_id INT NULL,
+    params TEXT NOT NULL COMMENT 'JSON parameter job',
+    result LONGTEXT NULL COMMENT 'JSON hasil job',
+    error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    INDEX idx_status (status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+SELECT 'Migration completed successfully!' as status;
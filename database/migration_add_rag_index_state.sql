@@ -0,0 +1,16 @@
+-- =========================================
+-- Migration: Shared RAG Index (multi-worker)
+-- Date: 2026-10-16
+-- Purpose: Versi index RAG bersama; worker re-attach ke snapshot baru saat versi berubah
+-- =========================================
+
+USE `emotiva_math`;
+
+CREATE TABLE IF NOT EXISTS rag_index_state (
+    id INT PRIMARY KEY,
+    version INT NOT NULL DEFAULT 0 COMMENT 'Naik setiap snapshot index baru ditulis',
+    materials_version VARCHAR(100) NULL COMMENT 'Versi materi di DB saat snapshot ditulis',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+SELECT 'Migration completed successfully!' as status;
@@ -0,0 +1,73 @@
+"""
+Migration script untuk upload-time text extraction
+- Tambah kolom file_hash & extraction_status di teacher_materials
+- Buat tabel extracted_texts
+- Ekstrak teks semua materi file yang sudah ada (backfill)
+
+Run this with: python migrate_extraction.py
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app import create_app
+from app.models import db, TeacherMaterial, ExtractedText
+from app.extraction_service import extraction_service
+
+def migrate_extraction():
+    """Add extraction columns/table and backfill extracted texts"""
+    print("🔄 Starting extraction migration...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            # Add new columns if not exist
+            inspector = db.inspect(db.engine)
+            existing_columns = [col['name'] for col in inspector.get_columns('teacher_materials')]
+            
+            new_columns = {
+                'file_hash': 'VARCHAR(64) NULL',
+                'extraction_status': 'VARCHAR(20) NULL'
+            }
+            
+            with db.engine.begin() as conn:
+                for name, ddl in new_columns.items():
+                    if name not in existing_columns:
+                        print(f"   Adding column: {name}")
+                        conn.execute(db.text(f"ALTER TABLE teacher_materials ADD COLUMN {name} {ddl}"))
+                    else:
+                        print(f"   Column {name} already exists, skipping...")
+                
+                if 'file_hash' not in existing_columns:
+                    conn.execute(db.text("CREATE INDEX ix_teacher_materials_file_hash ON teacher_materials (file_hash)"))
+            
+            print("📦 Creating extracted_texts table...")
+            ExtractedText.__table__.create(db.engine, checkfirst=True)
+            
+            # Backfill: ekstrak materi file yang belum punya teks
+            pending = TeacherMaterial.query.filter(
+                TeacherMaterial.file_path.isnot(None),
+                db.or_(TeacherMaterial.extraction_status.is_(None), TeacherMaterial.extraction_status != 'ready')
+            ).all()
+            
+            print(f"📄 Extracting {len(pending)} existing file materials...")
+            for material in pending:
+                if not os.path.exists(material.file_path):
+                    print(f"   ⚠️  File not found, skipping: {material.file_path}")
+                    continue
+                status = extraction_service.extract_material(material.id)
+                print(f"   - [{status}] {material.judul}")
+            
+            print("✅ Extraction migration completed successfully!")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Migration failed: {e}")
+            return False
+
+if __name__ == '__main__':
+    success = migrate_extraction()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,156 @@
+"""
+Test lifecycle job LLM asynchronous (job_service) - tanpa API key, tanpa server
+queued -> running -> succeeded/failed, timeout antrian vs timeout jalan, job basi dilewati
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Database SQLite sementara supaya tidak menyentuh database development
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_jobs.db')
+os.environ['USE_LLM'] = 'False'
+
+from app import create_app
+from app.models import db, LLMJob
+from app.job_service import JobService, STATUS_QUEUED, STATUS_RUNNING, STATUS_SUCCEEDED, STATUS_FAILED
+
+app = create_app()
+app.app_context().push()
+
+calls = []
+
+
+def echo_job(text, fail=False):
+    calls.append(text)
+    if fail:
+        raise RuntimeError(f"boom: {text}")
+    return {'echo': text}
+
+
+def make_service(**limits):
+    service = JobService()
+    for name, value in limits.items():
+        setattr(service, name, value)
+    service.register('echo', echo_job)
+    return service
+
+
+def queued_job(**params):
+    # Tanpa executor: job dibuat langsung di DB lalu dijalankan manual lewat run_job()
+    job = LLMJob(id=f"job-{len(calls)}-{datetime.utcnow().timestamp()}", kind='echo',
+                 status=STATUS_QUEUED, params=json.dumps(params))
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_success_clears_error():
+    service = make_service()
+    job_id = queued_job(text='halo')
+    LLMJob.query.get(job_id).error = 'stale error'
+    db.session.commit()
+    
+    assert service.run_job(job_id) == STATUS_SUCCEEDED
+    job = service.get_job(job_id)
+    assert job.status == STATUS_SUCCEEDED
+    assert job.to_dict()['result'] == {'echo': 'halo'}
+    assert job.error is None
+    assert job.started_at and job.finished_at
+    print("✅ succeeded job has result and no error")
+
+
+def test_failure_recorded():
+    service = make_service()
+    job_id = queued_job(text='gagal', fail=True)
+    
+    assert service.run_job(job_id) == STATUS_FAILED
+    job = service.get_job(job_id)
+    assert job.status == STATUS_FAILED and 'boom' in job.error
+    print("✅ handler exception -> failed with error")
+
+
+def test_queued_job_uses_queue_timeout():
+    service = make_service(job_timeout=60, queue_timeout=3600)
+    job_id = queued_job(text='antri')
+    # Sudah antri 10 menit: lewat job_timeout tapi belum lewat queue_timeout
+    LLMJob.query.get(job_id).created_at = datetime.utcnow() - timedelta(minutes=10)
+    db.session.commit()
+    
+    assert service.get_job(job_id).status == STATUS_QUEUED
+    assert service.run_job(job_id) == STATUS_SUCCEEDED
+    print("✅ queued job is not failed by the running timeout")
+
+
+def test_expired_queued_job_is_skipped():
+    service = make_service(queue_timeout=60)
+    job_id = queued_job(text='basi')
+    LLMJob.query.get(job_id).created_at = datetime.utcnow() - timedelta(minutes=5)
+    db.session.commit()
+    
+    job = service.get_job(job_id)
+    assert job.status == STATUS_FAILED and 'start' in job.error
+    
+    before = len(calls)
+    assert service.run_job(job_id) is None
+    assert len(calls) == before, "handler must not run for a job that is no longer queued"
+    job = service.get_job(job_id)
+    assert job.status == STATUS_FAILED and job.result is None
+    print("✅ job failed while queued is never run")
+
+
+def test_running_timeout_from_started_at():
+    service = make_service(job_timeout=60, queue_timeout=3600)
+    job_id = queued_job(text='lama')
+    job = LLMJob.query.get(job_id)
+    job.status = STATUS_RUNNING
+    job.created_at = datetime.utcnow() - timedelta(minutes=30)
+    job.started_at = datetime.utcnow() - timedelta(seconds=10)
+    db.session.commit()
+    assert service.get_job(job_id).status == STATUS_RUNNING
+    
+    LLMJob.query.get(job_id).started_at = datetime.utcnow() - timedelta(minutes=2)
+    db.session.commit()
+    job = service.get_job(job_id)
+    assert job.status == STATUS_FAILED and 'finish' in job.error
+    print("✅ running timeout is measured from started_at")
+
+
+def test_late_finish_keeps_failed():
+    service = make_service(job_timeout=60)
+    job_id = queued_job(text='telat')
+    
+    def slow_then_expire(text, fail=False):
+        # Selama handler jalan, poller melihat job sudah lewat job_timeout
+        LLMJob.query.get(job_id).started_at = datetime.utcnow() - timedelta(minutes=5)
+        db.session.commit()
+        assert service.get_job(job_id).status == STATUS_FAILED
+        return {'echo': text}
+    
+    service.register('echo', slow_then_expire)
+    assert service.run_job(job_id) == STATUS_FAILED
+    job = service.get_job(job_id)
+    assert job.status == STATUS_FAILED and job.result is None
+    print("✅ job reported failed stays failed when the handler finishes late")
+
+
+def main():
+    print("\n" + "="*60)
+    print("🧪 TEST: LLM job lifecycle")
+    print("="*60)
+    
+    test_success_clears_error()
+    test_failure_recorded()
+    test_queued_job_uses_queue_timeout()
+    test_expired_queued_job_is_skipped()
+    test_running_timeout_from_started_at()
+    test_late_finish_keeps_failed()
+    
+    print("\n✅ ALL JOB LIFECYCLE TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
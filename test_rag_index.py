@@ -0,0 +1,331 @@
+"""
+Test update incremental RAG index (add/replace/remove materi) - tanpa API key, tanpa server
+Index hasil update harus sama dengan rebuild penuh, dan query tidak menunggu update yang sedang jalan
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# Database + snapshot sementara supaya tidak menyentuh data development
+WORK_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORK_DIR, 'test_rag_index.db')
+os.environ['USE_LLM'] = 'False'
+
+from app import create_app
+from app.models import db, TeacherMaterial
+from app import rag_snapshot
+from app import llm_service as llm_module
+from app.rag_service import RAGService
+
+app = create_app()
+app.app_context().push()
+
+VOCAB = {
+    'kubus': ['kubus', 'rusuk', 'sisi', 'volume', 'diagonal', 'sisi', 'persegi', 'pangkat'],
+    'balok': ['balok', 'panjang', 'lebar', 'tinggi', 'volume', 'permukaan', 'persegi', 'panjang'],
+    'tabung': ['tabung', 'jari', 'lingkaran', 'selimut', 'tinggi', 'volume', 'alas', 'tutup'],
+}
+COMMON = ['menghitung', 'rumus', 'luas', 'contoh', 'soal', 'bangun', 'ruang', 'satuan', 'hasil']
+LEVELS = ['pemula', 'menengah', 'mahir']
+QUERIES = [
+    ('volume kubus', None, None),
+    ('luas permukaan balok', 'balok', None),
+    ('jari jari tabung', 'tabung', 'mahir'),
+    ('menghitung rumus', None, 'pemula'),
+    ('zebrakuda', None, None),
+]
+
+
+def synthetic_text(rng: random.Random, topik: str) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(2, 5)):
+        words = [rng.choice(VOCAB[topik] + COMMON) for _ in range(rng.randint(30, 80))]
+        paragraphs.append(' '.join(words).capitalize() + '.')
+    return '\n\n'.join(paragraphs)
+
+
+def seed_materials(count: int = 60):
+    rng = random.Random(3)
+    db.session.query(TeacherMaterial).delete()
+    for i in range(count):
+        topik = rng.choice(list(VOCAB))
+        db.session.add(TeacherMaterial(
+            judul=f'Materi {topik} {i}', topik=topik, level=rng.choice(LEVELS),
+            konten=synthetic_text(rng, topik), created_by='guru'
+        ))
+    db.session.commit()
+
+
+def make_service(name: str, compact_delay: float = 60) -> RAGService:
+    service = RAGService()
+    service.snapshot_path = os.path.join(WORK_DIR, f'{name}.snapshot')
+    service.result_cache.max_entries = 0
+    service.compact_delay = compact_delay  # snapshot hanya ditulis saat flush() kecuali test mengatur lain
+    return service
+
+
+def snapshot_version(service: RAGService) -> str:
+    return rag_snapshot.load_snapshot(service.snapshot_path).meta.get('materials_version')
+
+
+def score_map(service: RAGService, query: str, topik: str = None, level: str = None, state=None) -> Counter:
+    """
+    Skor BM25 semua chunk di scope query, per (material_id, teks chunk) - tidak bergantung chunk id
+    """
+    state = state or service._current_state()
+    partitions = service._use_partitions(state, service._select_partitions(state, topik, level))
+    doc_ids, scores = service._score_matrix(partitions, [Counter(service._tokenize(query))], state=state)
+    return Counter(
+        (state.chunks.material_id(int(chunk_id)), state.chunks.text(int(chunk_id)), round(float(score), 6))
+        for chunk_id, score in zip(doc_ids, scores[0])
+    )
+
+
+def assert_same_as_rebuild(service: RAGService, what: str):
+    rebuilt = make_service(f'rebuild-{what}')
+    rebuilt.reload_materials()
+    for query, topik, level in QUERIES:
+        assert score_map(service, query, topik, level) == score_map(rebuilt, query, topik, level), \
+            f"{what}: scores differ from a full rebuild for {query!r} ({topik}, {level})"
+    assert set(service.material_meta) == set(rebuilt.material_meta)
+
+
+def test_updates_match_rebuild():
+    seed_materials()
+    service = make_service('incremental')
+    service._ensure_loaded()
+    assert service._current_state().snapshot is not None, "index should be served from the snapshot"
+    
+    material = TeacherMaterial(judul='Materi Zebrakuda', topik='kubus', level='pemula',
+                               konten='Zebrakuda adalah kata unik. Volume kubus zebrakuda.', created_by='guru')
+    db.session.add(material)
+    db.session.commit()
+    service.add_material(material)
+    assert_same_as_rebuild(service, 'add')
+    assert service.retrieve_context('zebrakuda', top_k=1)[0]['metadata']['material_id'] == material.id
+    
+    # Pindah partisi: topik + konten berubah
+    moved = TeacherMaterial.query.filter_by(topik='balok').first()
+    moved.topik = 'tabung'
+    moved.konten = synthetic_text(random.Random(9), 'tabung')
+    db.session.commit()
+    service.replace_material(moved)
+    assert_same_as_rebuild(service, 'replace')
+    
+    removed = TeacherMaterial.query.filter_by(topik='kubus').first()
+    db.session.delete(removed)
+    db.session.commit()
+    service.remove_material(removed.id)
+    assert_same_as_rebuild(service, 'remove')
+    assert all(result['metadata']['material_id'] != removed.id
+               for result in service.retrieve_context('volume kubus', top_k=10))
+    print("✅ add / replace / remove give the same scores as a full rebuild")
+
+
+def test_published_state_is_not_modified():
+    seed_materials()
+    service = make_service('cow')
+    service._ensure_loaded()
+    old_state = service._current_state()
+    before = {query: score_map(service, query, topik, level, old_state) for query, topik, level in QUERIES}
+    
+    material = TeacherMaterial.query.filter_by(topik='kubus').first()
+    material.konten = 'Volume kubus volume kubus rumus baru.'
+    db.session.commit()
+    service.replace_material(material)
+    service.remove_material(TeacherMaterial.query.filter_by(topik='tabung').first().id)
+    
+    assert service._current_state() is not old_state
+    for query, topik, level in QUERIES:
+        assert score_map(service, query, topik, level, old_state) == before[query], \
+            f"update changed the index an in-flight query was using ({query!r})"
+    print("✅ update builds a new index version, the old one stays intact")
+
+
+def test_queries_do_not_wait_for_updates():
+    seed_materials()
+    service = make_service('readers')
+    service._ensure_loaded()
+    finished = threading.Event()
+    errors = []
+    
+    def query():
+        try:
+            service.retrieve_context('volume kubus', top_k=3)
+            service.search_materials('luas balok')
+        except Exception as e:
+            errors.append(e)
+        finished.set()
+    
+    # Update yang sedang berjalan memegang _update_lock selama membangun index baru
+    with service._update_lock:
+        reader = threading.Thread(target=query)
+        reader.start()
+        assert finished.wait(10), "query blocked behind a running index update"
+    reader.join()
+    assert not errors, errors
+    print("✅ queries run while an update holds the update lock")
+
+
+def test_concurrent_queries_during_updates():
+    seed_materials()
+    service = make_service('concurrent')
+    service._ensure_loaded()
+    service.memory_budget = 1  # evict setelah setiap query: load/evict ikut berjalan bersamaan
+    stop = threading.Event()
+    errors = []
+    counts = []
+    
+    def reader():
+        done = 0
+        while not stop.is_set():
+            try:
+                for query, topik, level in QUERIES:
+                    results = service.retrieve_context(query, topik, level, top_k=3)
+                    assert all(result['text'] for result in results)
+                done += 1
+            except Exception as e:
+                errors.append(e)
+                return
+        counts.append(done)
+    
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    rng = random.Random(5)
+    for i in range(10):
+        material = TeacherMaterial(judul=f'Materi baru {i}', topik=rng.choice(list(VOCAB)), level=rng.choice(LEVELS),
+                                   konten=synthetic_text(rng, 'kubus'), created_by='guru')
+        db.session.add(material)
+        db.session.commit()
+        service.add_material(material)
+        if i % 3 == 2:
+            db.session.delete(material)
+            db.session.commit()
+            service.remove_material(material.id)
+    stop.set()
+    for thread in readers:
+        thread.join()
+    
+    assert not errors, errors
+    assert all(counts), "every reader should complete queries while updates run"
+    assert_same_as_rebuild(service, 'concurrent')
+    print(f"✅ {sum(counts)} query rounds ran alongside 13 updates without errors")
+
+
+def test_updates_persist_in_background():
+    seed_materials()
+    service = make_service('background', compact_delay=0.2)
+    service._ensure_loaded()
+    written = snapshot_version(service)
+    
+    # Duplikat persis materi di snapshot: cluster dedup ditemukan tanpa mengubah snapshot
+    original = TeacherMaterial.query.filter_by(topik='kubus').first()
+    copy = TeacherMaterial(judul=original.judul, topik=original.topik, level=original.level,
+                           konten=original.konten, created_by='guru')
+    db.session.add(copy)
+    db.session.commit()
+    service.add_material(copy)
+    
+    state = service._current_state()
+    assert state.dirty == {copy.id} and state.snapshot is not None, "update should overlay the mmap snapshot"
+    assert snapshot_version(service) == written, "add_material must not rewrite the snapshot itself"
+    copy_chunks = set(state.material_chunks[copy.id])
+    original_chunks = set(state.material_chunks[original.id])
+    assert all(state.clusters.get(chunk_id) in original_chunks for chunk_id in copy_chunks), \
+        "copied chunks should cluster with the snapshot chunks they duplicate"
+    
+    deadline = time.monotonic() + 10
+    while service._current_state().dirty and time.monotonic() < deadline:
+        time.sleep(0.05)
+    state = service._current_state()
+    assert not state.dirty, "snapshot was not written in the background"
+    assert snapshot_version(service) == state.materials_version
+    assert state.snapshot is not None and state.snapshot.path == service.snapshot_path
+    assert_same_as_rebuild(service, 'background')
+    print("✅ updates overlay the snapshot, snapshot is rewritten in the background")
+
+
+def test_flush_writes_pending_updates():
+    seed_materials()
+    service = make_service('flush')
+    service._ensure_loaded()
+    written = snapshot_version(service)
+    
+    rng = random.Random(11)
+    for i in range(3):
+        material = TeacherMaterial(judul=f'Materi flush {i}', topik='balok', level='menengah',
+                                   konten=synthetic_text(rng, 'balok'), created_by='guru')
+        db.session.add(material)
+        db.session.commit()
+        service.add_material(material)
+    removed = TeacherMaterial.query.filter_by(topik='tabung').first()
+    db.session.delete(removed)
+    db.session.commit()
+    service.remove_material(removed.id)
+    assert snapshot_version(service) == written
+    assert len(service._current_state().dirty) == 4
+    
+    service.flush()
+    assert service._persist_timer is None
+    assert not service._current_state().dirty
+    assert snapshot_version(service) == service._current_state().materials_version
+    
+    # Worker baru / restart memakai snapshot yang sudah ditulis
+    restarted = make_service('flush')
+    restarted._ensure_loaded()
+    assert restarted._current_state().snapshot is not None
+    assert_same_as_rebuild(restarted, 'flush')
+    print("✅ flush() writes pending updates; a restart uses the new snapshot")
+
+
+def test_quiz_contexts_use_one_batch():
+    seed_materials()
+    service = make_service('quiz')
+    service._ensure_loaded()
+    original = llm_module.rag_service
+    llm_module.rag_service = service
+    batches = []
+    retrieve_batch = service.retrieve_context_batch
+    service.retrieve_context_batch = lambda queries, **kwargs: batches.append(queries) or retrieve_batch(queries, **kwargs)
+    try:
+        contexts = llm_module.LLMService()._quiz_contexts('kubus', 'pemula', 5)
+    finally:
+        llm_module.rag_service = original
+    
+    assert len(batches) == 1 and batches[0][0] == 'kubus', "quiz context should come from one batch call"
+    expected = [
+        service.retrieve_context(query, 'kubus', 'pemula', top_k=llm_module.QUIZ_CONTEXTS_PER_QUERY)
+        for query in batches[0]
+    ]
+    assert contexts[0] == expected[0][0], "best chunk for the topic query comes first"
+    keys = [(ctx['metadata']['material_id'], ctx['text']) for ctx in contexts]
+    assert len(keys) == len(set(keys)) and 3 <= len(contexts) <= 5
+    assert all(ctx in [result for results in expected for result in results] for ctx in contexts)
+    print(f"✅ quiz context: {len(batches[0])} queries in one batch, {len(contexts)} distinct chunks")
+
+
+def main():
+    print("\n" + "="*60)
+    print("🧪 TEST: RAG index incremental updates")
+    print("="*60)
+    
+    test_updates_match_rebuild()
+    test_published_state_is_not_modified()
+    test_queries_do_not_wait_for_updates()
+    test_concurrent_queries_during_updates()
+    test_updates_persist_in_background()
+    test_flush_writes_pending_updates()
+    test_quiz_contexts_use_one_batch()
+    
+    print("\n✅ ALL RAG INDEX TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Test stemmer + analyzer Bahasa Indonesia (app/text_analysis.py) terhadap tabel kata -> stem
+Tidak butuh database atau server
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app.text_analysis import analyze, stem
+
+STEM_TABLE = [
+    # me- + peluluhan
+    ('menghitung', 'hitung'),
+    ('mengukur', 'ukur'),
+    ('mengalikan', 'kali'),
+    ('mengurangi', 'kurangi'),
+    ('mengetahui', 'ketahui'),
+    ('menyusun', 'susun'),
+    ('membuat', 'buat'),
+    ('mempelajari', 'pelajari'),
+    ('memiliki', 'miliki'),
+    ('memasukkan', 'masuk'),
+    ('memakai', 'pakai'),
+    ('memotong', 'potong'),
+    ('memisahkan', 'pisah'),
+    ('menentukan', 'tentu'),
+    ('menulis', 'tulis'),
+    ('menilai', 'nilai'),
+    ('mencari', 'cari'),
+    ('menjumlahkan', 'jumlah'),
+    ('melipat', 'lipat'),
+    # ber-
+    ('bersisi', 'sisi'),
+    ('berbentuk', 'bentuk'),
+    ('belajar', 'ajar'),
+    ('berat', 'berat'),
+    # di- / ter-
+    ('diketahui', 'ketahui'),
+    ('dihitung', 'hitung'),
+    ('dikalikan', 'kali'),
+    ('digunakan', 'guna'),
+    ('terdiri', 'diri'),
+    ('terbesar', 'besar'),
+    ('diagonal', 'diagonal'),
+    ('diameter', 'diameter'),
+    ('dimensi', 'dimensi'),
+    ('termometer', 'termometer'),
+    # akhiran
+    ('rumusnya', 'rumus'),
+    ('hitunglah', 'hitung'),
+    ('sisinya', 'sisi'),
+    ('langkah', 'langkah'),
+    ('masalah', 'masalah'),
+    # awalan yang sengaja tidak dibuang
+    ('persegi', 'persegi'),
+    ('peluang', 'peluang'),
+    ('keliling', 'keliling'),
+    ('sisi', 'sisi'),
+    ('tinggi', 'tinggi'),
+    ('kubus', 'kubus'),
+    ('x2', 'x2'),
+]
+
+# Pasangan yang harus bertemu di index: bentuk berimbuhan di teks, kata dasar di query
+MATCHING_PAIRS = [
+    ('volume kubus dihitung dengan rumus', 'menghitung rumusnya'),
+    ('hasil perkalian dikalikan lagi', 'mengalikan'),
+    ('siswa menilai hasil', 'nilai'),
+    ('memakai jangka', 'pakai'),
+    ('yang diketahui pada soal', 'mengetahui'),
+]
+
+
+def test_stem_table():
+    failures = []
+    for word, expected in STEM_TABLE:
+        actual = stem(word)
+        if actual != expected:
+            failures.append(f"{word}: expected {expected}, got {actual}")
+    assert not failures, "\n".join(failures)
+    print(f"✅ {len(STEM_TABLE)} stems match the table")
+
+
+def test_stopwords_removed():
+    assert analyze('volume kubus adalah sisi dikali sisi dikali sisi') == ['volume', 'kubus', 'sisi', 'kali', 'sisi', 'kali', 'sisi']
+    assert analyze('Limas Segi Empat', 'simple') == ['limas', 'segi', 'empat']
+    print("✅ stopwords removed, 'simple' analyzer unchanged")
+
+
+def test_matching_pairs():
+    for text, query in MATCHING_PAIRS:
+        text_terms = set(analyze(text))
+        query_terms = set(analyze(query))
+        assert query_terms <= text_terms, f"{query!r} -> {query_terms} not in {text!r} -> {text_terms}"
+    print(f"✅ {len(MATCHING_PAIRS)} text/query pairs share stems")
+
+
+def main():
+    print("\n" + "="*60)
+    print("🧪 TEST: Indonesian stemmer")
+    print("="*60)
+    
+    test_stem_table()
+    test_stopwords_removed()
+    test_matching_pairs()
+    
+    print("\n✅ ALL TEXT ANALYSIS TESTS PASSED")
+
+
+if __name__ == "__main__":
+    main()